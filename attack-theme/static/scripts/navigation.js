@@ -1,4 +1,24 @@
-$(document).ready(function () { 
+// Remove index.html from the end of a path, add / at the beginning and end
+function clean_sidenav_path(path) {
+    path = path.split("index.html")[0];
+    if (!path.startsWith("/")) path = "/" + path;
+    if (!path.endsWith("/")) path += "/";
+    return path;
+}
+
+// Mark the entries of a loaded side navigation that link to the current page
+function mark_active_sidenav(fragment) {
+    let current_path = clean_sidenav_path(window.location.pathname);
+
+    fragment.find(".sidenav-head").each(function () {
+        let link = $(this).children("a").first();
+        if (link.length && link.attr("href") === current_path) {
+            $(this).addClass("active");
+        }
+    });
+}
+
+function init_sidenav() {
 
     let active_id = ""
 
@@ -85,4 +105,33 @@ $(document).ready(function () {
         console.log("removed class");
     });
 
+}
+
+$(document).ready(function () {
+
+    // Side navigations shared by the pages of a section are rendered once
+    // into sidenav/<key>.html, load them before opening the active panes
+    let fragments = $(".sidenav-fragment[data-sidenav]");
+    let remaining = fragments.length;
+
+    if (remaining === 0) {
+        init_sidenav();
+        return;
+    }
+
+    let sidenav_base_url = (typeof base_url !== "undefined" ? base_url : "").replace(/\/$/, "");
+
+    fragments.each(function () {
+        let fragment = $(this);
+        let url = sidenav_base_url + "/sidenav/" + fragment.attr("data-sidenav") + ".html";
+
+        fragment.load(url + " .sidenav-fragment > *", function () {
+            mark_active_sidenav(fragment);
+            remaining -= 1;
+            if (remaining === 0) {
+                init_sidenav();
+            }
+        });
+    });
+
 });
\ No newline at end of file
@@ -63,7 +63,7 @@ function _instanceof(left, right) {
     (function() {
       "use strict";
   
-      function IndexHelper(documents) {
+      function IndexHelper(manifest) {
         _classCallCheck(this, IndexHelper);
   
         this.indexes = {
@@ -82,69 +82,227 @@ function _instanceof(left, right) {
               id: "id",
               field: "title"
             }
-          }),
-          content: new FlexSearch({
-            encode: "simple",
-            //phonetic normalizations
-            tokenize: "strict",
-            //match substring beginning of word
-            threshold: 2,
-            //exclude scores below this number
-            resolution: 9,
-            //how many steps in the scoring algorithm
-            depth: 4,
-            //how far around words to search for adjacent matches. Disabled for title
-            doc: {
-              id: "id",
-              field: "content"
-            }
           })
-        }; // console.log("adding pages to index");
+        }; // shard name => {file, documents}
+  
+        this.shards = manifest.shards; // shard name => promise of the content of the shard being loaded
+  
+        this.loadedShards = {}; // term prefix => file of the term shard
+  
+        this.termShards = manifest.terms;
+        this.termPrefixLength = manifest.term_prefix_length; // term prefix => promise of the terms of the term shard being loaded
+  
+        this.loadedTermShards = {}; // term prefix => term => flat list of document id, score
   
-        this.indexes.title.add(documents);
-        this.indexes.content.add(documents); // console.log("done adding pages to index");
+        this.terms = {}; // id => document, its content is added once its shard is loaded
   
+        this.documents = {};
+        var self = this;
+        manifest.documents.forEach(function(doc) {
+          self.documents[doc.id] = doc;
+        }); // the title index only needs the manifest
+  
+        this.indexes.title.add(manifest.documents);
         this.setQuery("");
       }
+      /**
+       * Load the content of the documents of shards of the index
+       * @param {str[]} names the names of the shards to load
+       * @returns a promise resolved once all the shards are loaded
+       */
   
       _createClass(IndexHelper, [
+        {
+          key: "loadShards",
+          value: function loadShards(names) {
+            var self = this;
+            var loading = names.map(function(name) {
+              if (!self.loadedShards[name]) {
+                self.loadedShards[name] = $.ajax({
+                  url: base_url + "/search/" + self.shards[name].file,
+                  dataType: "json"
+                }).then(
+                  function(shardDocuments) {
+                    shardDocuments.forEach(function(shardDocument) {
+                      self.documents[shardDocument.id].content =
+                        shardDocument.content;
+                    });
+                  },
+                  function(error) {
+                    delete self.loadedShards[name]; //try again on the next search
+  
+                    return $.Deferred().reject(error);
+                  }
+                );
+              }
+  
+              return self.loadedShards[name];
+            });
+            return $.when.apply($, loading);
+          }
+          /**
+           * Load the term shards of term prefixes
+           * @param {str[]} prefixes the prefixes of the term shards to load
+           * @returns a promise resolved once all the term shards are loaded
+           */
+        },
+        {
+          key: "loadTermShards",
+          value: function loadTermShards(prefixes) {
+            var self = this;
+            var loading = prefixes.map(function(prefix) {
+              if (!self.loadedTermShards[prefix]) {
+                self.loadedTermShards[prefix] = $.ajax({
+                  url: base_url + "/search/" + self.termShards[prefix],
+                  dataType: "json"
+                }).then(
+                  function(terms) {
+                    self.terms[prefix] = terms;
+                  },
+                  function(error) {
+                    delete self.loadedTermShards[prefix]; //try again on the next search
+  
+                    return $.Deferred().reject(error);
+                  }
+                );
+              }
+  
+              return self.loadedTermShards[prefix];
+            });
+            return $.when.apply($, loading);
+          }
+          /**
+           * Get the terms of the query, the same way the build gets the terms of the pages
+           * @returns {str[]} the distinct terms of the query
+           */
+        },
+        {
+          key: "getQueryTerms",
+          value: function getQueryTerms() {
+            var terms =
+              this.query
+                .toLowerCase()
+                .replace(/att&ck/g, "attack")
+                .match(/[a-z0-9]+/g) || [];
+            return terms.filter(function(term, i) {
+              return terms.indexOf(term) === i;
+            });
+          }
+          /**
+           * Rank the documents that have every term of the query, by the sum of the
+           * scores of the terms then in page order. Only the term shards of the terms
+           * of the query are loaded
+           * @returns a promise resolved once the content results are ranked
+           */
+        },
+        {
+          key: "loadContentResults",
+          value: function loadContentResults() {
+            var self = this;
+            var terms = this.getQueryTerms();
+            var prefixes = terms.map(function(term) {
+              return term.substring(0, self.termPrefixLength);
+            }); // no page has a term without a term shard
+  
+            var loadable = prefixes.every(function(prefix) {
+              return self.termShards[prefix];
+            });
+            return this.loadTermShards(loadable ? prefixes : []).then(function() {
+              // id => sum of the scores of the terms found so far
+              var scores = {};
+              terms.forEach(function(term, i) {
+                var postings = (loadable && self.terms[prefixes[i]][term]) || [];
+                var termScores = {};
+  
+                for (var j = 0; j < postings.length; j += 2) {
+                  if (i == 0 || postings[j] in scores)
+                    termScores[postings[j]] =
+                      (scores[postings[j]] || 0) + postings[j + 1];
+                }
+  
+                scores = termScores;
+              });
+              var ids = Object.keys(scores).map(Number);
+              ids.sort(function(a, b) {
+                return scores[b] - scores[a] || a - b;
+              });
+              self.contentResults = ids;
+            });
+          }
+        },
         {
           key: "setQuery",
           value: function setQuery(query) {
             this.query = query;
+            this.queryId = (this.queryId || 0) + 1; //tells apart the results of successive queries
+  
             this.nextPageRef = true;
             this.titleStage = true;
             this.seenPaths = new Set();
+            this.contentResults = null; //ids of the documents found by the content stage
+  
+            this.contentOffset = 0;
           }
         },
+        /**
+         * Get the next page of results. The term shards of the query are loaded before
+         * the content stage and the content of the results before they are returned
+         * @returns a promise of the results, or of null if the query changed meanwhile
+         */
         {
           key: "nextPage",
           value: function nextPage() {
-            var results = this.nextPageHelper();
             var self = this;
-            results = results.filter(function(result) {
-              return !self.seenPaths.has(result.path);
-            });
-            results.forEach(function(result) {
-              self.seenPaths.add(result.path);
-            }); // keep fetching until we have no more results or we have enough results
+            var queryId = this.queryId;
+            var results = [];
+            var first = true;
+            var deferred = $.Deferred();
+  
+            var fill = function fill() {
+              if (self.queryId !== queryId) return deferred.resolve(null); // keep fetching until we have no more results or we have enough results
+  
+              while (first || results.length < page_limit) {
+                // the content stage searches the terms of the query
+                if (!self.titleStage && self.contentResults === null) {
+                  self.loadContentResults().then(fill, function() {
+                    deferred.resolve(null);
+                  });
+                  return;
+                }
   
-            while (results.length < page_limit) {
-              var newResults = this.nextPageHelper(page_limit - results.length);
-              if (newResults.length == 0) break; //ran out of results
-              // cull duplicates
+                var newResults = self.nextPageHelper(page_limit - results.length);
+                if (newResults.length == 0 && !first) break; //ran out of results
   
-              newResults = newResults.filter(function(result) {
-                return !self.seenPaths.has(result.path);
-              });
-              newResults.forEach(function(result) {
-                self.seenPaths.add(result.path);
-              }); // append to master list
+                first = false; // cull duplicates
   
-              results = results.concat(newResults);
-            }
+                newResults = newResults.filter(function(result) {
+                  return !self.seenPaths.has(result.path);
+                });
+                newResults.forEach(function(result) {
+                  self.seenPaths.add(result.path);
+                }); // append to master list
+  
+                results = results.concat(newResults);
+              } // previews are made from the content of the results
+  
+              self
+                .loadShards(
+                  results.map(function(result) {
+                    return result.shard;
+                  })
+                )
+                .then(
+                  function() {
+                    deferred.resolve(self.queryId === queryId ? results : null);
+                  },
+                  function() {
+                    deferred.resolve(null);
+                  }
+                );
+            };
   
-            return results;
+            fill();
+            return deferred.promise();
           }
           /**
            * Get the next page of results, or null if no more pages
@@ -188,13 +346,15 @@ function _instanceof(left, right) {
             } else {
               //content stage
               // console.log("fetching next content page")
-              var _response = this.indexes.content.search(this.query, {
-                limit: limit,
-                page: this.nextPageRef
-              });
-  
-              this.nextPageRef = _response.next;
-              return _response.result.map(function(result) {
+              var self = this;
+              var ids = this.contentResults.slice(
+                this.contentOffset,
+                this.contentOffset + limit
+              );
+              this.contentOffset += ids.length;
+              this.nextPageRef = this.contentOffset < this.contentResults.length;
+              return ids.map(function(id) {
+                var result = self.documents[id];
                 result.source = "content";
                 return result;
               });
@@ -211,11 +371,11 @@ function _instanceof(left, right) {
     (function() {
       "use strict";
   
-      function SearchService(tag, documents) {
+      function SearchService(tag, manifest) {
         _classCallCheck(this, SearchService);
   
         // init indexes
-        this.index = new IndexHelper(documents);
+        this.index = new IndexHelper(manifest);
         this.current_query = {
           clean: "",
           words: [
@@ -467,32 +627,37 @@ function _instanceof(left, right) {
         {
           key: "nextPage",
           value: function nextPage() {
-            var results = this.index.nextPage();
-            if (results.length > 0) this.hasResults = true;
+            var self = this;
+            search_parsing_icon.show();
+            this.index.nextPage().then(function(results) {
+              if (results === null) return; //results of a previous query
   
-            if (this.hasResults) {
-              search_body.show();
-              var self = this;
-              var resultHTML = results.map(function(result) {
-                return self.result_to_html(result);
-              });
-              resultHTML = resultHTML.join("");
-              this.render_container.append(resultHTML);
-              if (this.index.nextPageRef) load_more_results.show();
-              else load_more_results.hide();
-            } else {
-              if (this.current_query.clean !== "") {
-                //search with no results
+              search_parsing_icon.hide();
+              if (results.length > 0) self.hasResults = true;
+  
+              if (self.hasResults) {
                 search_body.show();
-                this.render_container.html(
-                  '\n                    <div class="search-result">no results</div>\n                '
-                );
-                load_more_results.hide();
+                var resultHTML = results.map(function(result) {
+                  return self.result_to_html(result);
+                });
+                resultHTML = resultHTML.join("");
+                self.render_container.append(resultHTML);
+                if (self.index.nextPageRef) load_more_results.show();
+                else load_more_results.hide();
               } else {
-                // query for empty string
-                search_body.hide();
+                if (self.current_query.clean !== "") {
+                  //search with no results
+                  search_body.show();
+                  self.render_container.html(
+                    '\n                        <div class="search-result">no results</div>\n                    '
+                  );
+                  load_more_results.hide();
+                } else {
+                  // query for empty string
+                  search_body.hide();
+                }
               }
-            }
+            });
           }
         }
       ]);
@@ -522,13 +687,12 @@ function _instanceof(left, right) {
       search_parsing_icon.show(); // console.log("initializing search service")
   
       $.ajax({
-        //if docs have not yet been loaded
-        url: base_url + "/index.json",
+        //if the manifest of the index has not yet been loaded
+        url: base_url + "/search/manifest.json",
         dataType: "json",
-        success: function success(data) {
-          search_service = new SearchService("search-results", data);
+        success: function success(manifest) {
+          search_service = new SearchService("search-results", manifest);
           search_service.query(query);
-          search_parsing_icon.hide();
         }
       });
     } else {
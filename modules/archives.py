@@ -6,6 +6,7 @@ import json
 import stat
 from datetime import datetime
 from . import config
+from . import outputwriter
 
 # Error handler for windows by:
 # https://stackoverflow.com/questions/2656322/shutil-rmtree-fails-on-windows-with-access-is-denied
@@ -88,8 +89,7 @@ def deploy():
             shutil.copytree(os.path.join(config.archives_directory, version), os.path.join(prev_versions_deploy_folder, version))
     
     # write robots.txt to disallow crawlers
-    with open(os.path.join(config.web_directory, "robots.txt"), "w", encoding='utf8') as robots:
-        robots.write(f"User-agent: *\nDisallow: /{config.subdirectory}/previous/")
+    outputwriter.write_file(os.path.join(config.web_directory, "robots.txt"), f"User-agent: *\nDisallow: /{config.subdirectory}/previous/")
 
 def build_markdown():
     # import archives data
@@ -98,5 +98,4 @@ def build_markdown():
     
     # build previous-versions page markdown
     subs = config.previous_md + json.dumps(archives_data)
-    with open(os.path.join(config.previous_markdown_path, "previous.md"), "w", encoding='utf8') as md_file:
-        md_file.write(subs)
\ No newline at end of file
+    outputwriter.write_file(os.path.join(config.previous_markdown_path, "previous.md"), subs)
\ No newline at end of file
@@ -1,41 +1,54 @@
 import re
 import os
 from . import config
+from . import postbuild
 
 potential_issues_list = ['\(Citation: ?[^)]+\)?']
 
-def citations_check():
-    """Check for broken citations: (Citation: *) in HTML pages"""
+potential_issues_regexes = [re.compile(issue) for issue in potential_issues_list]
+
+def is_checked(path):
+    """Given a path of the output tree, return True if it is a file of the
+       web directory the citation check visits. Previous instances of the
+       code are skipped, see config.post_build_directories
+    """
+
+    return postbuild.is_in_web_directory(path) and postbuild.is_visited("Citations", path)
+
+def accepts_page(path):
+    """Given a path of the output tree, return True if it is a page to check"""
+
+    return path.endswith('.html') and is_checked(path)
+
+def visit_page(filepath, data):
+    """Given a page and its html, return the broken citations of the html"""
+
+    problems = []
+    for p in potential_issues_regexes:
+        check = p.findall(data)
+        for entry in check:
+            if not entry in problems:   
+                problems.append(entry)
+
+    return problems
+
+def finish(files):
+    """Write the broken citations report of the visited pages"""
 
     # Hold broken pages information
     broken_pages = []
 
-    okay_files = 0
-
-    for directory, _, files in os.walk(config.web_directory):
-        # skip previous instances of the code to speed this up
-        if 'previous' in directory or 'versions' in directory: 
-            continue
-        for filename in files:
-            problems = []
-            if filename.endswith('.html'):
-                filepath = os.path.join(directory,filename)
-                with open(
-                        filepath,'r', 
-                        encoding='utf8') as f_handle:
-                    data = f_handle.read()
-                    for issue in potential_issues_list:
-                        p = re.compile(issue)
-                        check = p.findall(data)
-                        for entry in check:
-                            if not entry in problems:   
-                                problems.append(entry)
-            if not problems:
-                okay_files += 1
-            else:
-                if config.web_directory in filepath:
-                    filepath = filepath.split(config.web_directory)[1]
-                broken_pages.append({"path": filepath, "problems": problems})
+    # Files that are not pages have no citations, including the files
+    # written once the output was walked
+    okay_files = len([filepath for filepath in postbuild.tree['files'] if not filepath.endswith('.html') and is_checked(filepath)])
+
+    for filepath, problems in files:
+        if not problems:
+            okay_files += 1
+        else:
+            if config.web_directory in filepath:
+                filepath = filepath.split(config.web_directory)[1]
+            broken_pages.append({"path": filepath, "problems": problems})
     
     if broken_pages:
         if not (os.path.isdir(config.test_report_directory)):
@@ -52,4 +65,19 @@ def citations_check():
 
     # Return exit code and file information
     files_info = (okay_files, len(broken_pages))
-    return exit_code, files_info
\ No newline at end of file
+    return exit_code, files_info
+
+def get_visitor():
+    """Return the post-build visitor that checks for broken citations"""
+
+    return {
+        "name": "Citations",
+        "accepts": accepts_page,
+        "visit": visit_page,
+        "finish": finish
+    }
+
+def citations_check():
+    """Check for broken citations: (Citation: *) in HTML pages"""
+
+    return postbuild.get_result(get_visitor())
@@ -0,0 +1,85 @@
+import os
+import re
+from . import config
+
+# Module that rewrites the (Citation: source name) markers of descriptions
+# in a single scan of the text
+
+citation_pattern = re.compile(r"\(Citation: (.*?)\)")
+
+# source name => number of citations that could not be resolved
+unresolved_citations = {}
+
+def find_citations(text):
+    """Given a text, return the source names of its citations in order"""
+
+    return citation_pattern.findall(text)
+
+def rewrite_citations(text, resolve):
+    """Given a text and a function that maps a source name to the text that
+       replaces its citation, rewrite every citation of the text in one
+       scan. Citations that resolve to None are kept and reported as
+       unresolved
+    """
+
+    def replace_citation(match):
+        replacement = resolve(match.group(1))
+        if replacement is None:
+            unresolved_citations[match.group(1)] = unresolved_citations.get(match.group(1), 0) + 1
+            return match.group(0)
+        return replacement
+
+    return citation_pattern.sub(replace_citation, text)
+
+def replace_citations(text, citations, references):
+    """Given a text, the source names cited in it and the page references,
+       replace the citations with their reference markers. References are
+       numbered in the order of the given source names
+    """
+
+    # source name => reference marker
+    markers = {}
+
+    for source_name in citations:
+        if source_name not in markers:
+            marker = references.get_html(source_name)
+            if marker:
+                markers[source_name] = marker
+
+    return rewrite_citations(text, markers.get)
+
+def strip_citations(text, source_names=None):
+    """Given a text, remove its citations. If a list of source names is
+       given, only citations of those sources are removed
+    """
+
+    if source_names is None:
+        return rewrite_citations(text, lambda source_name: "")
+
+    source_names = set(source_names)
+
+    def resolve(source_name):
+        if source_name in source_names:
+            return ""
+        return None
+
+    return rewrite_citations(text, resolve)
+
+def write_unresolved_report():
+    """Write the citations that could not be resolved while generating
+       the pages to the reports directory. Return the number of source
+       names that could not be resolved
+    """
+
+    if not unresolved_citations:
+        return 0
+
+    if not os.path.isdir(config.test_report_directory):
+        os.mkdir(config.test_report_directory)
+
+    with open(os.path.join(config.test_report_directory, config.unresolved_citations_report_filename), 'w') as f:
+        f.write("Unresolved Citations Report:\n\n")
+        for source_name in sorted(unresolved_citations):
+            f.write("\t- {} ({})\n".format(source_name, unresolved_citations[source_name]))
+
+    return len(unresolved_citations)
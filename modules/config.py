@@ -1,9 +1,9 @@
 import colorama
 import json
-import multiprocessing
 import os
 import shutil
 from string import Template
+from . import incremental
 from . import relationshiphelpers as rsh
 from . import stixhelpers
 from . import util
@@ -227,6 +227,9 @@ test_defaults = list(filter(lambda t: t != "external_links", test_choices))
 # parsed arguments 
 args = []
 
+# index between stix ids and ATT&CK IDs, built by init_shared_data
+attack_id_index = {}
+
 # directory for data used in site builds
 data_directory = "data"
 # directory for STIX data
@@ -238,6 +241,31 @@ attack_path = {
     'pre-attack': stix_directory + "/pre-attack.json"
 }
 
+# directory for the cache of parsed STIX bundles
+stix_cache_directory = "cache/stix"
+# maximum size of the STIX cache in MB, least recently used entries are
+# removed when it is exceeded
+stix_cache_max_size = 500
+
+# directory for the state of incremental builds
+incremental_cache_directory = "cache/incremental"
+
+# directory for the results of the external link checks
+links_cache_directory = "cache/links"
+# seconds the result of an external link check is reused for. Broken links
+# are checked again sooner, they may have been unreachable for a while
+links_cache_ttl = 7 * 24 * 60 * 60
+links_cache_broken_ttl = 24 * 60 * 60
+# maximum number of external links checked at the same time, in total and
+# per host
+links_concurrency = 32
+links_host_concurrency = 4
+# seconds an external link check waits for an answer
+links_timeout = 5
+
+# maximum number of rendered Markdown texts kept in memory
+markdown_cache_size = 20000
+
 # Link to instance of the ATT&CK Navigator; change for to a custom location
 navigator_link_enterprise = "https://mitre-attack.github.io/attack-navigator/enterprise"
 navigator_link_mobile = "https://mitre-attack.github.io/attack-navigator/mobile"
@@ -669,10 +697,77 @@ other_column_space = int(float(column_space)*1.10)
 # Declare file location of web pages
 web_directory = "output"
 
+# Pelican settings file of the website
+pelican_settings_path = "pelicanconf.py"
+
+# Templates of the theme, also used by the native renderer
+theme_templates_directory = "attack-theme/templates"
+
+# Directory of the search index in the web directory
+search_directory = "search"
+
+# Most documents in a shard of the search index, larger sections are split
+search_shard_size = 50
+
+# Length of the term prefixes the term shards of the search index are split
+# by, a query only loads the term shards of its words
+search_term_prefix_length = 2
+
+# Number of scores a term gets in a document, by how early it first occurs
+search_term_resolution = 9
+
+# Keys of the data of the generated pages indexed for search, the data the
+# templates of the pages show as text
+search_data_keys = {
+    "group": ["name", "descr", "attack_id", "aliases_list", "contributors_list", "alias_descriptions", "technique_table_data", "software_data", "bottom_ref"],
+    "group_index": ["groups_table"],
+    "software": ["name", "descr", "attack_id", "type", "platform_list", "aliases_list", "contributors_list", "alias_descriptions", "technique_table_data", "groups", "bottom_ref"],
+    "software_index": ["software_table"],
+    "technique": ["name", "descr", "attack_id", "subtechniques", "tactic_type", "tactics", "platforms", "sysreqs", "perms", "eff_perms", "def_bypass", "network_reqs", "supports_remote", "impact_type", "data_sources", "capecs", "mtcs", "contributors", "examples_table", "mitigation_table", "detection", "diff_for_adv_exp", "detectable_exp", "rel_techniques_table", "bottom_ref"],
+    "technique_domain": ["technique_table"],
+    "mitigation": ["name", "descr", "attack_id", "techniques_addressed_data", "bottom_ref"],
+    "mitigation_domain": ["mitigation_table"],
+    "tactic": ["name", "descr", "attack_id", "techniques_table"],
+    "tactic_domain": ["tactics_table"],
+    "matrix": ["descr", "matrices"]
+}
+
+# Directory of the side navigation trees shared by the pages of a section
+side_nav_directory = "content/nav"
+
+# Markdown path for the side navigation fragments
+side_nav_markdown_path = "content/pages/sidenav/"
+
+# String template for a side navigation fragment, rendered once per section
+# and loaded by the pages of the section
+side_nav_md = Template("Title: ${key} navigation\n"
+                       "Template: general/sidenav\n"
+                       "save_as: sidenav/${key}.html\n"
+                       "data: ")
+
 # Parent web directory name
 # leave parent directory name to first level for link tests
 parent_web_directory = "output"
 
+# Directories of the web directory visited by each post-build stage, glob
+# patterns of the directory paths relative to the web directory. A stage
+# visits the directories matching one of its include patterns, and their
+# subdirectories, unless they match one of its exclude patterns. Excluded
+# directories are pruned with their subdirectories, directories that no
+# stage of a pass visits are not walked at all. Stages that are not listed
+# visit every directory
+post_build_directories = {
+    "Search Index": {"include": ["*"], "exclude": ["previous*", "versions*"]},
+    "Citations": {"include": ["*"], "exclude": ["*previous*", "*versions*"]},
+    # Pages are rendered with the links of the subdirectory, only archived
+    # versions built before are rewritten
+    "Subdirectory": {"include": ["previous/*", "versions/*"]}
+}
+
+# Rewrite the links of the archived versions in the web directory with the
+# subdirectory, pages rendered by the build already link to it
+subdirectory_rewrite_archives = True
+
 javascript_path = "attack-theme/static/scripts/"
 
 js_dir_settings = Template("let base_url = \"${web_directory}\";\n")
@@ -690,16 +785,18 @@ def set_subdirectory(subdirectory_str):
     subdirectory = subdirectory_str
 
     # Verify if website directory exists
-    if not os.path.isdir(web_directory):
-        os.makedirs(web_directory)
+    if not os.path.isdir(parent_web_directory):
+        os.makedirs(parent_web_directory)
 
-    # Add subdirectory to web directory
-    web_directory = os.path.join(web_directory, subdirectory)
+    # Add subdirectory to web directory. Setting it again gives the same
+    # web directory
+    web_directory = os.path.join(parent_web_directory, subdirectory)
 
 test_report_directory = "reports"
 # Constants used by citationschecker.py
 # ----------------------------------------------------------------------------
 citations_report_filename = "broken-citations-report.txt"
+unresolved_citations_report_filename = "unresolved-citations-report.txt"
 
 # Constants used by linkchecker.py
 # ----------------------------------------------------------------------------
@@ -715,11 +812,6 @@ FAILED_STATUS = colorama.Fore.RED + "FAILED" + RESET + \
 WARNING_STATUS = colorama.Fore.YELLOW + "WARNING" + RESET + \
                                         " " * (status_space - len("WARNING"))   
 
-def run_function(ptr):
-    """Given a pointer to a function, run function and return output"""
-
-    return ptr
-
 def init_shared_data():
     """Resposible for initializing shared data between modules"""
 
@@ -734,12 +826,14 @@ def init_shared_data():
     global groups_using_tool
     global groups_using_malware
     global technique_to_domain
+    global attack_id_index
     global custom_alphabet
     global relationships
     global technique_list
     global software_list
     global group_list
     global mitigation_list
+    global object_domains
     global mitigates_techniques
     global technique_mitigated
     global related_techniques
@@ -749,13 +843,15 @@ def init_shared_data():
     global subtechniques_of
     global parent_technique_of
     global ms
+    global stix_load_stats
 
     domains = settings_dict["domains"]
     domain_aliases = settings_dict["domain_aliases"]
     source_names = settings_dict["source_names"]
 
-    # Global memory store of all domains
-    ms = stixhelpers.get_stix_memory_stores()
+    # Global memory store of all domains, loaded once and shared by
+    # every module
+    ms, stix_load_stats = stixhelpers.get_stix_memory_stores()
 
     # Grab resources
     resources = stixhelpers.grab_resources(ms)
@@ -767,10 +863,14 @@ def init_shared_data():
     technique_list = resources['techniques']
     mitigation_list = resources['mitigations']
 
-    # Technique to domain dict 
-    technique_to_domain = stixhelpers.get_technique_id_domain_map(ms)
+    # stix id => domains that contain the object
+    object_domains = resources['domains']
 
-    stix_array = []
+    # Index between stix ids and ATT&CK IDs
+    attack_id_index = stixhelpers.get_attack_id_index(ms)
+
+    # Technique to domain dict 
+    technique_to_domain = stixhelpers.get_technique_id_domain_map(attack_id_index)
 
     # Custom_alphabet used to sort list of dictionaries by domain name 
     # depending on domain ordering
@@ -786,69 +886,46 @@ def init_shared_data():
 
         # Add rest of characters, doesn't matter if it is repeated
         rest_of_alphabet += short_domain.lower()[1:]
-
-        # Append domain to stix
-        stix_array.append(attack_path[domain])
     
     custom_alphabet += rest_of_alphabet
 
-    # Source list of domains
-    srcs = list(map(lambda url: rsh.load(url), stix_array))
-
-    ptrs = [
-        rsh.malware_used_by_groups(srcs),
-        rsh.tools_used_by_groups(srcs),
-        rsh.techniques_used_by_malware(srcs),
-        rsh.techniques_used_by_tools(srcs),
-        rsh.techniques_used_by_groups(srcs),
-        rsh.groups_using_tool(srcs),
-        rsh.groups_using_malware(srcs),
-        rsh.mitigation_mitigates_techniques(srcs),
-        rsh.technique_mitigated_by_mitigation(srcs),
-        rsh.technique_related_to_technique(srcs),
-        rsh.tools_using_technique(srcs),
-        rsh.malware_using_technique(srcs),
-        rsh.groups_using_technique(srcs),
-        rsh.subtechniques_of(srcs),
-        rsh.parent_technique_of(srcs)
-    ]
-
-    number_of_workers = multiprocessing.cpu_count()
+    # Source list of domains, reuses the already loaded memory stores
+    srcs = [ms[domain] for domain in domains]
 
-    with multiprocessing.Pool(number_of_workers) as p:
-        data = p.map(run_function, ptrs)
-    
     # Get software used by groups
-    malware_used_by_groups = data[0]
-    tools_used_by_groups = data[1]
+    malware_used_by_groups = rsh.malware_used_by_groups(srcs)
+    tools_used_by_groups = rsh.tools_used_by_groups(srcs)
 
     # Get techniques used by software
-    techniques_used_by_malware = data[2]
-    techniques_used_by_tools = data[3]
+    techniques_used_by_malware = rsh.techniques_used_by_malware(srcs)
+    techniques_used_by_tools = rsh.techniques_used_by_tools(srcs)
 
     # Get techniques used by groups
-    techniques_used_by_groups = data[4]
+    techniques_used_by_groups = rsh.techniques_used_by_groups(srcs)
 
     # Groups using software
-    groups_using_tool = data[5]
-    groups_using_malware = data[6]
+    groups_using_tool = rsh.groups_using_tool(srcs)
+    groups_using_malware = rsh.groups_using_malware(srcs)
 
     # Mitigations mitigate techniques
-    mitigates_techniques = data[7]
+    mitigates_techniques = rsh.mitigation_mitigates_techniques(srcs)
 
     # Technique mitigated by mitigation
-    technique_mitigated = data[8]
+    technique_mitigated = rsh.technique_mitigated_by_mitigation(srcs)
 
     # Related techniques
-    related_techniques = data[9]
+    related_techniques = rsh.technique_related_to_technique(srcs)
 
     # Software using technique
-    tools_using_technique = data[10]
-    malware_using_technique = data[11]
+    tools_using_technique = rsh.tools_using_technique(srcs)
+    malware_using_technique = rsh.malware_using_technique(srcs)
 
     # Group using technique
-    groups_using_technique = data[12]
+    groups_using_technique = rsh.groups_using_technique(srcs)
 
     # subtechniques
-    subtechniques_of = data[13]
-    parent_technique_of = data[14]
\ No newline at end of file
+    subtechniques_of = rsh.subtechniques_of(srcs)
+    parent_technique_of = rsh.parent_technique_of(srcs)
+
+    # Load the state of the previous incremental build
+    incremental.load()
\ No newline at end of file
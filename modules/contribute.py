@@ -2,6 +2,7 @@ import math
 import json
 import os
 from . import config
+from . import outputwriter
 from . import stixhelpers
 
 def generate():
@@ -31,5 +32,4 @@ def generate():
     subs = config.contribute_index_md + json.dumps(data)
 
     #Open markdown file for the contribute page
-    with open(os.path.join(config.contribute_markdown_path, "contribute.md"), "w", encoding='utf8') as md_file:
-        md_file.write(subs)
\ No newline at end of file
+    outputwriter.write_file(os.path.join(config.contribute_markdown_path, "contribute.md"), subs)
\ No newline at end of file
@@ -0,0 +1,168 @@
+import asyncio
+import concurrent.futures
+import json
+import os
+import time
+import urllib.parse
+import requests
+from . import config
+
+# Module that checks external links. Links are checked concurrently by an
+# asyncio event loop, with a limit of checks in total and per host. Requests
+# go through one requests session whose connection pools are kept per host,
+# so the connections to a host are reused. Results are kept on disk and
+# reused by the next runs until they expire
+
+# Bump this whenever the format of the cached results changes
+CACHE_FORMAT_VERSION = 1
+
+# Google Chrome headers
+headers = {
+    "pragma":"no-cache",
+    "cache-control":"no-cache",
+    "user-agent":"Mozilla/5.0 "
+                "(Windows NT 10.0; Win64; x64) "
+                "AppleWebKit/537.36 (KHTML, like Gecko) "
+                "Chrome/76.0.3809.100 Safari/537.36",
+    "sec-fetch-mode":"navigate",
+    "accept":"text/html,application/xhtml+xml,application/xml;"
+             "q=0.9,image/webp,image/apng,"
+             "*/*;q=0.8,application/signed-exchange;v=b3",
+    "sec-fetch-site":"none",
+    "accept-encoding":"gzip, deflate, br",
+    "accept-language":"en-US,en;q=0.9",
+}
+
+stats = {
+    # Number of links checked and taken from the cache by the last run
+    "checked": 0,
+    "cached": 0
+}
+
+def get_cache_path():
+    """Return the path of the external link results"""
+
+    return os.path.join(config.links_cache_directory, "external-links.json")
+
+def load_cache():
+    """Return link => {broken, checked} of the saved results"""
+
+    if not os.path.isfile(get_cache_path()):
+        return {}
+
+    try:
+        with open(get_cache_path(), "r", encoding='utf8') as cache_file:
+            cache = json.load(cache_file)
+    except ValueError:
+        return {}
+
+    if cache.get('version') != CACHE_FORMAT_VERSION:
+        return {}
+
+    return cache['links']
+
+def save_cache(links):
+    """Given link => {broken, checked}, save the results for the next runs"""
+
+    if not os.path.isdir(config.links_cache_directory):
+        os.makedirs(config.links_cache_directory)
+
+    tmp_path = get_cache_path() + ".tmp"
+    with open(tmp_path, "w", encoding='utf8') as cache_file:
+        json.dump({"version": CACHE_FORMAT_VERSION, "links": links}, cache_file)
+
+    # Rename so that an interrupted run never leaves a partial cache file
+    os.replace(tmp_path, get_cache_path())
+
+def is_expired(result, now):
+    """Given a cached result, return True if the link has to be checked
+       again
+    """
+
+    ttl = config.links_cache_broken_ttl if result['broken'] else config.links_cache_ttl
+
+    return now - result['checked'] > ttl
+
+def get_session():
+    """Return a requests session that keeps a pool of connections per host"""
+
+    session = requests.Session()
+    session.headers.update(headers)
+
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=config.links_concurrency,
+        pool_maxsize=config.links_host_concurrency)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    return session
+
+def head(session, link):
+    """Given a link, return True if it is broken. Status 404 and unreachable
+       links are considered broken
+    """
+
+    # Unreachable will be triggered by the except clause
+    try:
+        r = session.head(link, verify=False, timeout=config.links_timeout)
+        return r.status_code == 404
+    except:
+        return True
+
+async def check_link(link, session, executor, semaphore, host_semaphores):
+    """Given a link, check it once a check and a check of its host are
+       available. Return True if it is broken
+    """
+
+    host = urllib.parse.urlsplit(link).netloc.lower()
+
+    if host not in host_semaphores:
+        host_semaphores[host] = asyncio.Semaphore(config.links_host_concurrency)
+
+    async with semaphore:
+        async with host_semaphores[host]:
+            return await asyncio.get_event_loop().run_in_executor(executor, head, session, link)
+
+async def check_all(links):
+    """Given a list of links, check them concurrently. Return the list of
+       whether each link is broken
+    """
+
+    semaphore = asyncio.Semaphore(config.links_concurrency)
+    host_semaphores = {}
+
+    with get_session() as session:
+        with concurrent.futures.ThreadPoolExecutor(config.links_concurrency) as executor:
+            return await asyncio.gather(*[check_link(link, session, executor, semaphore, host_semaphores) for link in links])
+
+def check_links(links):
+    """Given a list of external links, return link => True if broken. Links
+       checked recently are taken from the cache, the others are checked and
+       cached
+    """
+
+    now = time.time()
+
+    cache = load_cache()
+
+    to_check = [link for link in dict.fromkeys(links) if link not in cache or is_expired(cache[link], now)]
+
+    stats['checked'] = len(to_check)
+    stats['cached'] = len(set(links)) - len(to_check)
+
+    if to_check:
+        loop = asyncio.new_event_loop()
+        try:
+            results = loop.run_until_complete(check_all(to_check))
+        finally:
+            loop.close()
+
+        for link, broken in zip(to_check, results):
+            cache[link] = {"broken": broken, "checked": now}
+
+        # Results that expired long ago are not kept
+        cache = {link: result for link, result in cache.items() if now - result['checked'] <= config.links_cache_ttl}
+
+        save_cache(cache)
+
+    return {link: cache[link]['broken'] for link in links}
@@ -1,15 +1,18 @@
 # Module that holds all the ATT&CK update build wrappers
 
 import time
-import subprocess
 import os
 import shutil
 from modules import clean
 from modules import config
 from modules import contribute
 from modules import group
+from modules import markdownrenderer
 from modules import matrix
 from modules import mitigation
+from modules import outputwriter
+from modules import pelicanrunner
+from modules import postbuild
 from modules import redirects
 from modules import resources
 from modules import search
@@ -22,6 +25,7 @@ from string import Template
 from modules import tests
 from modules import tour
 from modules import util
+from modules import incremental
 from modules import index
 from modules import versions
 
@@ -32,9 +36,11 @@ def grab_resources():
     config.init_shared_data()
     end_time = time.time()
     util.progress_bar("Initializing Data", end_time - start_time)    
+    util.progress_bar("Loading STIX Data", config.stix_load_stats['time'], config.stix_load_stats['memory'])
 
 def index_md_gen():
     util.progress_bar("Index Page")
+    outputwriter.start_stage("Index Page")
     start_time = time.time()
     index.javascript_settings()
     index.generate()
@@ -50,6 +56,7 @@ def tour_gen():
 
 def group_md_gen():
     util.progress_bar("Group Pages")
+    outputwriter.start_stage("Group Pages")
     start_time = time.time()
     group.generate()
     end_time = time.time()
@@ -57,6 +64,7 @@ def group_md_gen():
 
 def software_md_gen():
     util.progress_bar("Software Pages")
+    outputwriter.start_stage("Software Pages")
     start_time = time.time()
     software.generate()
     end_time = time.time()
@@ -64,6 +72,7 @@ def software_md_gen():
 
 def technique_md_gen():
     util.progress_bar("Technique Pages")
+    outputwriter.start_stage("Technique Pages")
     start_time = time.time()
     technique.generate()
     end_time = time.time()
@@ -71,6 +80,7 @@ def technique_md_gen():
 
 def matrix_md_gen():
     util.progress_bar("Matrix Pages")
+    outputwriter.start_stage("Matrix Pages")
     start_time = time.time()
     matrix.generate()
     end_time = time.time()
@@ -78,6 +88,7 @@ def matrix_md_gen():
 
 def tactic_md_gen():
     util.progress_bar("Tactic Pages")
+    outputwriter.start_stage("Tactic Pages")
     start_time = time.time()
     tactic.generate()
     end_time = time.time()
@@ -85,6 +96,7 @@ def tactic_md_gen():
 
 def mitigation_md_gen():
     util.progress_bar("Mitigation Pages")
+    outputwriter.start_stage("Mitigation Pages")
     start_time = time.time()
     mitigation.generate()
     end_time = time.time()
@@ -92,6 +104,7 @@ def mitigation_md_gen():
 
 def contribute_md_gen():
     util.progress_bar("Contribute Page")
+    outputwriter.start_stage("Contribute Page")
     start_time = time.time()
     contribute.generate()
     end_time = time.time()
@@ -99,6 +112,7 @@ def contribute_md_gen():
 
 def resources_md_gen():
     util.progress_bar("Resources Pages")
+    outputwriter.start_stage("Resources Pages")
     start_time = time.time()
     resources.generate()
     end_time = time.time()
@@ -106,30 +120,86 @@ def resources_md_gen():
 
 def redirects_md_gen():
     util.progress_bar("Redirection Pages")
+    outputwriter.start_stage("Redirection Pages")
     start_time = time.time()
     redirects.generate()
     end_time = time.time()
     util.progress_bar("Redirection Pages", end_time - start_time)
 
+def markdown_cache_stats():
+    """Print the hits and misses of the Markdown rendering cache"""
+
+    stats = markdownrenderer.get_stats()
+    util.progress_message("Markdown Cache", f"{stats['hits']} hits {stats['misses']} misses")
+
+def output_writer_stats():
+    """Print how many files every stage wrote and left unchanged"""
+
+    outputwriter.flush()
+
+    for stage, counters in outputwriter.stats.items():
+        util.progress_message(stage, f"{counters['written']} written {counters['skipped']} skipped")
+
+def save_incremental_state():
+    """Remove the pages this build no longer generates, save the pages
+       generated by this build for the next incremental build and print how
+       many pages were generated and skipped
+    """
+
+    if not incremental.is_enabled():
+        return
+
+    incremental.remove_stale_files()
+    incremental.save()
+    util.progress_message("Incremental Build", f"{incremental.state['generated']} generated {incremental.state['skipped']} skipped")
+
 def pelican_content():
     util.progress_bar("Pelican Content")
+    stats = pelicanrunner.run()
+    util.progress_bar("Pelican Content", stats['time'])
+    util.progress_message("Pelican Pages", f"{stats['pages']} pages {stats['hidden_pages']} hidden pages {stats['articles']} articles {stats['drafts']} drafts")
+
+def post_build_gen(args):
+    """Build the search index, replace the local hyperlinks with the
+       subdirectory and gather the data of the tests in one pass over the
+       output directory. Return the time the visitors of the tests took
+    """
+
+    visitors = []
 
-    # Run pelican with limited output, -q is for quiet
-    if config.subdirectory:
-        returned_out = subprocess.check_output(f"pelican content -q -o {config.web_directory}", shell=True)
-    else:
-        returned_out = subprocess.check_output("pelican content -q", shell=True)
-    util.progress_bar("Pelican Content", float(str(returned_out).split(" ")[13]))
+    if args.subdirectory and config.subdirectory_rewrite_archives:
+        visitors.append(subdirectory.get_visitor())
 
-def generate_search_index():
-    util.progress_bar("Search Index")
+    if args.build and 'search' in args.build:
+        visitors.append(search.get_visitor())
+        # The permalink of the current version is deployed before the pass
+        if 'versions' in args.build:
+            visitors.append(versions.get_search_index_visitor())
+
+    test_visitors = tests.get_visitors(args)
+    visitors += test_visitors
+
+    if not visitors:
+        return 0
+
+    util.progress_bar("Post-build Pass")
     start_time = time.time()
-    search.generate_index()
+    stats = postbuild.run(visitors)
     end_time = time.time()
-    util.progress_bar("Search Index", end_time - start_time)
+    util.progress_bar("Post-build Pass", end_time - start_time)
+
+    visitor_times = " ".join(f"{name} {visitor_time:.2f}s" for name, visitor_time in stats['visitors'].items())
+    util.progress_message("Post-build Visitors", f"walk {stats['walk']:.2f}s {visitor_times}")
+
+    if "Search Index" in postbuild.results:
+        search_stats = postbuild.results["Search Index"]
+        util.progress_message("Search Index Pages", f"{search_stats['indexed']} indexed {search_stats['skipped']} skipped {search_stats['documents']} from page data {search_stats['shards']} shards {search_stats['term_shards']} term shards")
+
+    return sum(stats['visitors'][visitor['name']] for visitor in test_visitors)
 
 def previous_versions_gen():
     util.progress_bar("Previous Versions")
+    outputwriter.start_stage("Previous Versions")
     start_time = time.time()
     versions.deploy()
     end_time = time.time()
@@ -142,13 +212,6 @@ def deploy_current_version():
     end_time = time.time()
     util.progress_bar("Current version permalink", end_time - start_time)
 
-def subdirectory_gen():
-    util.progress_bar("Subdirectory")
-    start_time = time.time()
-    subdirectory.replace()
-    end_time = time.time()
-    util.progress_bar("Subdirectory", end_time - start_time)  
-
 def clean_website():
     util.progress_bar("Clean Build")
     start_time = time.time()
@@ -1,11 +1,15 @@
 import os
-import json
 import collections
-import re
-import markdown
+from . import citationrewriter
 from . import config
+from . import markdownrenderer
+from . import pagerenderer
+from . import parallel
+from . import search
+from . import sidenav
 from . import stixhelpers
 from . import relationshiphelpers
+from . import referenceregistry
 from . import util
 
 def generate():
@@ -30,23 +34,20 @@ def generate_markdown_files():
     # Amount of characters per category
     group_by = 2
 
-    side_menu_data = util.get_side_menu_data("Groups", "/groups/", config.group_list)
+    side_menu_data = sidenav.add_side_nav("groups", util.get_side_menu_data("Groups", "/groups/", config.group_list))
     data['side_menu_data'] = side_menu_data
 
-    side_menu_mobile_view_data = util.get_side_menu_mobile_view_data("groups", "/groups/", config.group_list, group_by)
+    side_menu_mobile_view_data = sidenav.add_side_nav("groups-mobile", util.get_side_menu_mobile_view_data("groups", "/groups/", config.group_list, group_by))
     data['side_menu_mobile_view_data'] = side_menu_mobile_view_data
 
     data['groups_table'] = get_groups_table_data()
     data['groups_list_len'] = str(len(config.group_list))
     
-    subs = config.group_index_md + json.dumps(data)
-
-    with open(os.path.join(config.group_markdown_path, "overview.md"), "w", encoding='utf8') as md_file:
-        md_file.write(subs)
+    pagerenderer.write_page(os.path.join(config.group_markdown_path, "overview.md"), config.group_index_md, data)
+    search.add_page(config.group_index_md, "Groups", data, config.search_data_keys['group_index'])
 
     #Create the markdown for the enterprise groups in the STIX
-    for group in config.group_list:
-        generate_group_md(group, side_menu_data, side_menu_mobile_view_data)
+    parallel.generate_pages(generate_group_md, config.group_list, side_menu_data, side_menu_mobile_view_data)
 
 def generate_group_md(group, side_menu_data, side_menu_mobile_view_data):
     """Responsible for generating markdown of all groups"""
@@ -81,24 +82,21 @@ def generate_group_md(group, side_menu_data, side_menu_mobile_view_data):
         if isinstance(group.get("x_mitre_contributors"),collections.Iterable):
             data['contributors_list'] = group["x_mitre_contributors"]
 
-        # Get initial reference list
-        reference_list = []
-        # Decleared as an object to be able to pass by reference
-        next_reference_number = {}
-        next_reference_number['value'] = 1
-        reference_list = util.update_reference_list(reference_list, group)
+        # Get initial references
+        references = referenceregistry.ReferenceRegistry()
+        references.add_external_references(group)
 
         if group.get("description"):
             citations_from_descr = util.get_citations_from_descr(group['description'])
-            data['descr'] = markdown.markdown(group["description"])
+            data['descr'] = markdownrenderer.render(group["description"])
             data['descr'] = util.filter_urls(data['descr'])
-            data['descr'] = util.get_descr_reference_sect(citations_from_descr, reference_list, next_reference_number, data['descr'])
+            data['descr'] = util.get_descr_reference_sect(citations_from_descr, references, data['descr'])
         
         if group.get('x_mitre_deprecated'):
             data['deprecated'] = True
 
         # Get technique data for techniques used table
-        data['technique_table_data'] = get_techniques_used_by_group_data(group, reference_list, next_reference_number)
+        data['technique_table_data'] = get_techniques_used_by_group_data(group, references)
 
         # Get navigator layers for this group
         layers = util.get_navigator_layers(
@@ -111,14 +109,12 @@ def generate_group_md(group, side_menu_data, side_menu_mobile_view_data):
 
         data["layers"] = []
         for layer in layers:
-            with open(os.path.join(config.group_markdown_path, "-".join([data['attack_id'], "techniques", layer["domain"]]) + ".md"), "w", encoding='utf8') as layer_json:
-                subs = config.layer_md.substitute({
-                    "attack_id": data["attack_id"],
-                    "path": "groups/" + data["attack_id"],
-                    "domain": layer["domain"]
-                })
-                subs = subs + layer["layer"]
-                layer_json.write(subs)
+            subs = config.layer_md.substitute({
+                "attack_id": data["attack_id"],
+                "path": "groups/" + data["attack_id"],
+                "domain": layer["domain"]
+            })
+            pagerenderer.write_page(os.path.join(config.group_markdown_path, "-".join([data['attack_id'], "techniques", layer["domain"]]) + ".md"), subs, layer["layer"])
             data["layers"].append({
                 "domain": layer["domain"],
                 "filename": "-".join([data["attack_id"], layer["domain"], "layer"]) + ".json",
@@ -127,21 +123,20 @@ def generate_group_md(group, side_menu_data, side_menu_mobile_view_data):
             })
 
         # Grab software data for Software table
-        data['software_data'], data['add_software_ref'] = get_software_table_data(group, reference_list, next_reference_number)
+        data['software_data'], data['add_software_ref'] = get_software_table_data(group, references)
 
-        data['alias_descriptions'] = util.get_alias_data(group.get("aliases")[1:], ext_ref, reference_list, next_reference_number)
+        data['alias_descriptions'] = util.get_alias_data(group.get("aliases")[1:], ext_ref, references)
 
-        data['bottom_ref'] = util.sort_reference_list(reference_list)
+        data['bottom_ref'] = references.get_cited_references()
                 
         if isinstance(group.get("aliases"), collections.Iterable):
             data['aliases_list'] = group["aliases"][1:]
 
         subs = config.group_md.substitute(data)
-        subs = subs + json.dumps(data)
 
-        # Write out the markdown file
-        with open(os.path.join(config.group_markdown_path, data['attack_id'] + ".md"), "w", encoding='utf8') as md_file:
-            md_file.write(subs)
+        # Write out the page
+        pagerenderer.write_page(os.path.join(config.group_markdown_path, data['attack_id'] + ".md"), subs, data)
+        search.add_page(subs, ", ".join([data['name']] + data.get('aliases_list', [])) + ", Group " + data['attack_id'], data, config.search_data_keys['group'])
 
 def get_groups_table_data():
     """Responsible for generating group table data for the group index page"""
@@ -163,20 +158,15 @@ def get_groups_table_data():
 
             if group.get("description"):
                 row['descr'] = group["description"]
-                row['descr'] = markdown.markdown(row['descr'])
+                row['descr'] = markdownrenderer.render(row['descr'])
                 row['descr'] = util.filter_urls(row['descr'])
                 row['descr'] = util.remove_html_paragraph(row['descr'])
 
                 if group.get('x_mitre_deprecated'):
                     row['deprecated'] = True
 
-                citation_temp = "(Citation: {})"
-                p = re.compile("\(Citation: (.*?)\)")
-                found_citations = p.findall(row['descr'])
-
                 # Remove citation
-                for citation in found_citations:
-                    row['descr'] = row['descr'].replace(citation_temp.format(citation), "")
+                row['descr'] = citationrewriter.strip_citations(row['descr'])
 
             if isinstance(group.get("aliases"), collections.Iterable):
                 row['aliases_list'] = group["aliases"][1:]
@@ -185,7 +175,7 @@ def get_groups_table_data():
     
     return groups_table_data
 
-def get_techniques_used_by_group_data(group, reference_list, next_reference_number):
+def get_techniques_used_by_group_data(group, references):
     """Given a group and its reference list, get the techniques used by the
        group. Check the reference list for citations, if not found
        in list, add it.
@@ -197,7 +187,7 @@ def get_techniques_used_by_group_data(group, reference_list, next_reference_numb
         for technique in config.techniques_used_by_groups[group['id']]:
             # Do not add if technique is deprecated
             if not technique['object'].get('x_mitre_deprecated'):
-                technique_list = util.technique_used_helper(technique_list, technique, reference_list, next_reference_number)
+                technique_list = util.technique_used_helper(technique_list, technique, references)
 
     technique_data = []
     for item in technique_list:
@@ -209,7 +199,7 @@ def get_techniques_used_by_group_data(group, reference_list, next_reference_numb
     technique_data = sorted(technique_data, key=lambda k: [config.custom_alphabet.index(c) for c in k['domain'].lower()])
     return technique_data
 
-def get_software_table_data(group, reference_list, next_reference_number):
+def get_software_table_data(group, references):
     """Given a group, get software table data"""
 
     software_list = {}
@@ -250,13 +240,13 @@ def get_software_table_data(group, reference_list, next_reference_number):
                                 reference = True
 
                             # Get filtered description
-                            software_list[software_id]['descr'] = util.get_filtered_description(reference_list, next_reference_number, software)
+                            software_list[software_id]['descr'] = util.get_filtered_description(references, software)
     
                         elif software['relationship'].get('external_references'):
                             if reference == False:
                                 reference = True
-                            # Update reference list
-                            reference_list = util.update_reference_list(reference_list, software['relationship'])
+                            # Update references
+                            references.add_external_references(software['relationship'])
 
                             software_list[software_id]['refs'] = []
 
@@ -264,7 +254,7 @@ def get_software_table_data(group, reference_list, next_reference_number):
                                 if ext_ref.get('source_name'):
                                     row = {}
                                     row['url'] = ext_ref.get('url')
-                                    row['number'] = util.find_reference_number(reference_list, next_reference_number, ext_ref['source_name'])                                   
+                                    row['number'] = references.get_number(ext_ref['source_name'])                                   
 
                                 software_list[software_id]['refs'].append(row) 
 
@@ -0,0 +1,431 @@
+import hashlib
+import json
+import os
+from stix2.base import STIXJSONEncoder
+from . import config
+from . import outputwriter
+from . import stixcache
+from . import stixindex
+
+# Module that records which STIX objects each generated page depends on, so
+# that incremental builds only regenerate the pages of the objects that
+# changed since the previous build. Pages are tracked per page module
+# (group, software, technique, mitigation, tactic), each module keeps the
+# bundles it was last generated from. The fingerprints of the objects and
+# the direct dependencies of the objects reached by the pages are saved once
+# per set of bundles, the dependencies of a page are expanded from them.
+# Files that a page module no longer generates are removed
+
+# Bump this whenever the format of the saved state changes
+STATE_FORMAT_VERSION = 2
+
+# Number of relationship hops followed from the object of a page. Two hops
+# reach e.g. the techniques of the software used by a group
+dependency_hops = 2
+
+state = {
+    # State saved by the previous build, None until loaded
+    "previous": None,
+    # State of this build, saved for the next one
+    "current": None,
+    # stix id => fingerprint of the objects in the current STIX data
+    "fingerprints": None,
+    # page module => stix ids changed since the module was last generated,
+    # None when every page of the module has to be generated
+    "changed": {},
+    # page module => files of its pages in the previous build, whatever the
+    # build fingerprint of the previous build
+    "previous_files": {},
+    # Number of pages generated and skipped in this build
+    "generated": 0,
+    "skipped": 0
+}
+
+def is_enabled():
+    """Return True if pages are tracked for incremental builds"""
+
+    return bool(getattr(config.args, 'incremental', False))
+
+def get_state_path():
+    """Return the path of the saved incremental build state"""
+
+    return os.path.join(config.incremental_cache_directory, "state.json")
+
+def get_hash(data):
+    """Given a string, return a short hash of it"""
+
+    return hashlib.sha256(data.encode('utf8')).hexdigest()[:16]
+
+def get_build_fingerprint():
+    """Return the fingerprint of everything besides the STIX data that
+       changes the generated pages: settings, arguments and the code of
+       the page modules. Pages of a different build fingerprint are always
+       generated again
+    """
+
+    sha256 = hashlib.sha256()
+
+    sha256.update(json.dumps(config.settings_dict, sort_keys=True).encode('utf8'))
+    sha256.update(str(config.args.no_stix_link_replacement).encode('utf8'))
+    sha256.update(str(config.args.subdirectory).encode('utf8'))
+    sha256.update(str(getattr(config.args, 'native_render', False)).encode('utf8'))
+
+    modules_directory = os.path.dirname(os.path.abspath(__file__))
+    for filename in sorted(os.listdir(modules_directory)):
+        if filename.endswith(".py"):
+            with open(os.path.join(modules_directory, filename), "rb") as module_file:
+                sha256.update(module_file.read())
+
+    # Natively rendered pages are html, they also change with the templates
+    if getattr(config.args, 'native_render', False):
+        for root, dirs, files in sorted(os.walk(config.theme_templates_directory)):
+            for filename in sorted(files):
+                with open(os.path.join(root, filename), "rb") as template_file:
+                    sha256.update(template_file.read())
+
+    return sha256.hexdigest()
+
+def get_bundle_hashes():
+    """Return the hash of the STIX bundle of every domain"""
+
+    return {domain: stixcache.get_bundle_hash(config.attack_path[domain]) for domain in config.domains}
+
+def get_fingerprints():
+    """Return stix id => fingerprint of every object of every domain"""
+
+    if state['fingerprints'] is None:
+
+        serialized = {}
+        for domain in config.domains:
+            for obj in stixindex.get_all_objects(config.ms[domain]):
+                serialized.setdefault(obj['id'], []).append(domain + json.dumps(obj, sort_keys=True, cls=STIXJSONEncoder))
+
+        state['fingerprints'] = {stix_id: get_hash("".join(data)) for stix_id, data in serialized.items()}
+
+    return state['fingerprints']
+
+def get_changed_objects(previous_fingerprints):
+    """Given the fingerprints of a previous build, return the stix ids of
+       objects added, removed or changed since then. Both ends of changed
+       relationships are considered changed
+    """
+
+    fingerprints = get_fingerprints()
+
+    changed = set()
+    for stix_id in set(fingerprints) | set(previous_fingerprints):
+        if fingerprints.get(stix_id) != previous_fingerprints.get(stix_id):
+            changed.add(stix_id)
+
+    for stix_id in list(changed):
+        if stix_id.startswith("relationship--"):
+            for domain in config.domains:
+                relationship = stixindex.get_object(config.ms[domain], stix_id)
+                if relationship is not None:
+                    changed.add(relationship['source_ref'])
+                    changed.add(relationship['target_ref'])
+
+    # Removed relationships are no longer in the STIX data, they were
+    # recorded as dependencies of the pages of their ends
+    return changed
+
+def get_bundles_key(bundles):
+    """Given the bundle hashes of a page module, return the key of the STIX
+       data they were generated from in the saved state
+    """
+
+    return get_hash(json.dumps(bundles, sort_keys=True))
+
+def get_module_files(module):
+    """Given the state of a page module, return the files of its pages"""
+
+    return {path for page in module['pages'].values() for path in page['files']}
+
+def load():
+    """Load the state of the previous build. Called once the STIX data is
+       loaded
+    """
+
+    if not is_enabled():
+        return
+
+    state['previous'] = {}
+
+    # Cleaned content directory, the pages of the previous build are gone
+    if not config.args.clean and os.path.isfile(get_state_path()):
+        with open(get_state_path(), "r", encoding='utf8') as state_file:
+            previous = json.load(state_file)
+
+        if previous.get('version') == STATE_FORMAT_VERSION:
+            # Pages of any previous build are removed if this build does not
+            # generate them again
+            for module_name, module in previous['modules'].items():
+                state['previous_files'][module_name] = get_module_files(module)
+
+            if previous['build'] == get_build_fingerprint():
+                state['previous'] = previous
+
+    bundles = get_bundle_hashes()
+
+    state['current'] = {
+        "version": STATE_FORMAT_VERSION,
+        "build": get_build_fingerprint(),
+        "bundles": bundles,
+        "modules": dict(state['previous'].get('modules', {})),
+        # Key of the STIX data => fingerprints of its objects and the direct
+        # dependencies of the objects reached by the pages
+        "data": {
+            get_bundles_key(bundles): {
+                "fingerprints": None,
+                "relationships": {},
+                "extra": {}
+            }
+        }
+    }
+
+def get_data(bundles, saved=False):
+    """Given the bundle hashes of a page module, return the fingerprints
+       and dependencies of the STIX data, from the previous build if saved
+    """
+
+    if saved:
+        return state['previous']['data'][get_bundles_key(bundles)]
+    return state['current']['data'][get_bundles_key(bundles)]
+
+def start_module(module_name):
+    """Given the name of a page module, find the objects that changed since
+       the module was last generated
+    """
+
+    if module_name in state['changed']:
+        return
+
+    previous_module = state['previous'].get('modules', {}).get(module_name)
+
+    if previous_module is None:
+        state['changed'][module_name] = None
+    elif previous_module['bundles'] == state['current']['bundles']:
+        state['changed'][module_name] = set()
+    else:
+        state['changed'][module_name] = get_changed_objects(get_data(previous_module['bundles'], saved=True)['fingerprints'])
+
+    # Pages of the module are recorded again while they are generated
+    state['current']['modules'][module_name] = {
+        "bundles": state['current']['bundles'],
+        "pages": {}
+    }
+
+def get_relationships(stix_id):
+    """Given a stix id, return [id, source_ref, target_ref] of the
+       relationships of the object in the current STIX data
+    """
+
+    graph = get_data(state['current']['bundles'])['relationships']
+
+    if stix_id not in graph:
+        relationships = {}
+        for domain in config.domains:
+            for relationship in stixindex.get_all_relationships(config.ms[domain], stix_id):
+                relationships[relationship['id']] = [relationship['id'], relationship['source_ref'], relationship['target_ref']]
+        graph[stix_id] = list(relationships.values())
+
+    return graph[stix_id]
+
+def get_extra_dependencies(stix_id):
+    """Given a stix id, return the stix ids besides its relationships that
+       the pages showing the object depend on in the current STIX data
+    """
+
+    graph = get_data(state['current']['bundles'])['extra']
+
+    if stix_id not in graph:
+        extra = set()
+
+        if not stix_id.startswith("relationship--"):
+            for domain in config.domains:
+                obj = stixindex.get_object(config.ms[domain], stix_id)
+                if obj is None:
+                    continue
+
+                # Sub-techniques are shown with the name of their parent
+                if obj.get('x_mitre_is_subtechnique'):
+                    for relationship in stixindex.get_relationships(config.ms[domain], stix_id, 'subtechnique-of', source_only=True):
+                        extra.add(relationship['id'])
+                        extra.add(relationship['target_ref'])
+
+                # Tactic pages list the techniques of the tactic
+                if obj['type'] == 'x-mitre-tactic':
+                    for technique in stixindex.get_objects_in_kill_chain_phase(config.ms[domain], obj['x_mitre_shortname']):
+                        extra.add(technique['id'])
+
+        graph[stix_id] = sorted(extra)
+
+    return graph[stix_id]
+
+def get_dependencies(stix_id, data=None):
+    """Given the stix id of the object of a page, return the stix ids of
+       the objects and relationships the page is generated from. Expanded
+       from the saved direct dependencies if data is given, from the
+       current STIX data otherwise
+    """
+
+    if data is None:
+        relationships_of = get_relationships
+        extra_of = get_extra_dependencies
+    else:
+        relationships_of = lambda dependency_id: data['relationships'].get(dependency_id, [])
+        extra_of = lambda dependency_id: data['extra'].get(dependency_id, [])
+
+    dependencies = {stix_id}
+    frontier = {stix_id}
+
+    for _ in range(dependency_hops):
+        next_frontier = set()
+        for frontier_id in frontier:
+            for relationship_id, source_ref, target_ref in relationships_of(frontier_id):
+                dependencies.add(relationship_id)
+                for ref in (source_ref, target_ref):
+                    if ref not in dependencies:
+                        dependencies.add(ref)
+                        next_frontier.add(ref)
+        frontier = next_frontier
+
+    for dependency_id in list(dependencies):
+        dependencies.update(extra_of(dependency_id))
+
+    return dependencies
+
+def get_page_key(function, obj, args):
+    """Return the key a page is recorded with"""
+
+    key = [function.__name__, obj['id']]
+    key += [arg for arg in args if isinstance(arg, str)]
+    return ":".join(key)
+
+def get_args_fingerprint(args):
+    """Return the fingerprint of the data shared by the pages of a call"""
+
+    return get_hash(json.dumps(args, sort_keys=True, cls=STIXJSONEncoder))
+
+def filter_pages(function, objects, args):
+    """Given a page function, its objects and shared arguments, record the
+       pages and return the objects whose page has to be generated
+    """
+
+    if not is_enabled():
+        return objects
+
+    module_name = function.__module__.split(".")[-1]
+    start_module(module_name)
+
+    changed = state['changed'][module_name]
+    previous_module = state['previous'].get('modules', {}).get(module_name)
+    previous_pages = previous_module['pages'] if previous_module else {}
+    pages = state['current']['modules'][module_name]['pages']
+
+    args_fingerprint = get_args_fingerprint(args)
+
+    to_generate = []
+
+    for obj in objects:
+        page_key = get_page_key(function, obj, args)
+
+        # Also records the dependencies of the page for the next build
+        dependencies = get_dependencies(obj['id'])
+
+        previous_page = previous_pages.get(page_key)
+
+        if changed is None or previous_page is None or \
+                previous_page['args'] != args_fingerprint or \
+                not changed.isdisjoint(dependencies) or \
+                (changed and not changed.isdisjoint(get_dependencies(obj['id'], get_data(previous_module['bundles'], saved=True)))):
+            to_generate.append(obj)
+            state['generated'] += 1
+            files = []
+        else:
+            state['skipped'] += 1
+            files = previous_page['files']
+
+        pages[page_key] = {
+            "args": args_fingerprint,
+            "object": obj['id'],
+            "files": files
+        }
+
+    return to_generate
+
+def set_page_files(function, obj, args, paths):
+    """Given a page function, its object, shared arguments and the paths
+       the page was written to, record the files of the page
+    """
+
+    if not is_enabled():
+        return
+
+    module_name = function.__module__.split(".")[-1]
+    page = state['current']['modules'][module_name]['pages'][get_page_key(function, obj, args)]
+    page['files'] = sorted(set(paths))
+
+def remove_file(path):
+    """Given the path of a page that is no longer generated, remove it and,
+       for markdown, the html Pelican rendered it to
+    """
+
+    if path.endswith(".md") and os.path.isfile(path):
+        with open(path, "r", encoding='utf8') as markdown_file:
+            for line in markdown_file:
+                if line.lower().startswith("save_as:"):
+                    outputwriter.discard(os.path.join(config.web_directory, line.split(":", 1)[1].strip()))
+                    break
+
+    outputwriter.discard(path)
+
+def remove_stale_files():
+    """Remove the pages of the previous build that the page modules of this
+       build no longer generate, e.g. of removed, revoked or deprecated
+       objects. Called before Pelican renders the content
+    """
+
+    if not is_enabled():
+        return
+
+    for module_name in state['changed']:
+        files = get_module_files(state['current']['modules'][module_name])
+
+        for path in sorted(state['previous_files'].get(module_name, set()) - files):
+            remove_file(path)
+
+def save():
+    """Save the state of this build for the next incremental build"""
+
+    if not is_enabled():
+        return
+
+    current = state['current']
+    current_key = get_bundles_key(current['bundles'])
+
+    # Modules not generated by this build keep the data they were
+    # generated from
+    for module_name, module in current['modules'].items():
+        key = get_bundles_key(module['bundles'])
+
+        if key not in current['data']:
+            current['data'][key] = get_data(module['bundles'], saved=True)
+        elif key == current_key and module_name not in state['changed']:
+            for page in module['pages'].values():
+                get_dependencies(page['object'])
+
+    data = current['data'][current_key]
+    data['fingerprints'] = get_fingerprints()
+    data['relationships'] = {stix_id: relationships for stix_id, relationships in data['relationships'].items() if relationships}
+    data['extra'] = {stix_id: extra for stix_id, extra in data['extra'].items() if extra}
+
+    if not os.path.isdir(config.incremental_cache_directory):
+        os.makedirs(config.incremental_cache_directory)
+
+    tmp_path = get_state_path() + ".tmp"
+    with open(tmp_path, "w", encoding='utf8') as state_file:
+        json.dump(current, state_file)
+
+    # Rename so that an interrupted build never leaves a partial state file
+    os.replace(tmp_path, get_state_path())
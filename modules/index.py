@@ -1,6 +1,7 @@
-import json
 import os
 from . import config
+from . import pagerenderer
+from . import siteurl
 from . import stixhelpers
 from . import util
 from . import matrix as matrixhelpers
@@ -20,10 +21,7 @@ def generate():
     data['logo_landingpage'] = config.settings_dict['logo_landingpage']
 
     # substitute into template
-    subs = config.attack_index_md + json.dumps(data)
-
-    with open(config.attack_index_path, "w", encoding='utf8') as md_file:
-        md_file.write(subs)
+    pagerenderer.write_page(config.attack_index_path, config.attack_index_md, data)
 
 def javascript_settings():
     """Creates javascript settings file that will be used to other javascript files"""
@@ -32,15 +30,9 @@ def javascript_settings():
 
     with open(javascript_settings_file, "w", encoding='utf8') as js_f:
         # Get subdirectory path, will be empty if it was not declared
-        web_dir = config.subdirectory
+        web_dir = siteurl.get_site_url()
         if web_dir:
-            if not web_dir.startswith("/"):
-                web_dir = "/" + web_dir
-            
-            web_dir = web_dir.replace("\\", "/")
-
-            if not web_dir.endswith("/"):
-                web_dir = web_dir + "/"
+            web_dir = web_dir + "/"
 
         js_data = config.js_dir_settings.substitute({"web_directory": web_dir})
         js_f.write(js_data)
\ No newline at end of file
@@ -1,8 +1,9 @@
 import os
 import re
-import requests
 import json
 from . import config
+from . import externallinks
+from . import postbuild
 
 # STATIC PROPERTIES
 # I'm doing spaces here for readability with symbol characters. 
@@ -38,28 +39,23 @@ allowed_in_link = "".join(list(map(lambda s: s.strip(), [
     "   /    ",
 ])))
 
+# Link regular expressions, compiled once: (prefix, external links,
+# ignore data-test-ignore links) => regex
+link_regexes = {}
+
+for prefix in ["href", "src"]:
+    for external_links, allowed in [(False, allowed_in_link), (True, allowed_in_link_with_external_links)]:
+        linkregex = f"{prefix}\s?=\s?[\"']([{allowed}]+)[\"']"
+        link_regexes[(prefix, external_links, False)] = re.compile(linkregex)
+        link_regexes[(prefix, external_links, True)] = re.compile(linkregex + "(?! ?data-test-ignore=\"true\")")
+
+css_suffix_regex = re.compile("\.css\?[\w\d]+")
+
 links_list = {}
 in_use_links = {}
 
 internal_problem = False
 
-# Google Chrome headers
-headers = {
-    "pragma":"no-cache", 
-    "cache-control":"no-cache", 
-    "user-agent":"Mozilla/5.0 "
-                "(Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/76.0.3809.100 Safari/537.36", 
-    "sec-fetch-mode":"navigate", 
-    "accept":"text/html,application/xhtml+xml,application/xml;"
-             "q=0.9,image/webp,image/apng,"
-             "*/*;q=0.8,application/signed-exchange;v=b3", 
-    "sec-fetch-site":"none", 
-    "accept-encoding":"gzip, deflate, br",
-    "accept-language":"en-US,en;q=0.9",
-}
-
 def remove_extra_from_path(filepath):
     """Given a path, remove unwanted path from a website link"""
 
@@ -93,16 +89,15 @@ def get_correct_link(path):
         path += "index.html"
     # check for cache-disabling query string suffix, 
     # e.g style.min.css?f8be4c06
-    if re.search("\.css\?[\w\d]+", path):
+    if css_suffix_regex.search(path):
         path = path.split("?")[0] # remove suffix
     
     return path
 
 def check_if_link_in_use(filepath, link):
-    """Given a filepath and a link, check if the link is 
-       already linked by another page. If not, verify that the 
-       link is not the same as the filepath and add it to the 
-       in use links map
+    """Given a filepath and a link, return True if the link makes
+       another page in use: the link is not to a previous version and
+       is not the same as the filepath
     """
 
     if not "previous" in link and not "versions" in link:
@@ -113,7 +108,9 @@ def check_if_link_in_use(filepath, link):
                 new_file_name = new_file_name.replace("\\", "/")
 
             if new_file_name != link:
-                in_use_links[link] = True
+                return True
+
+    return False
 
 def remove_subdirectory_from_web_directory():
 
@@ -122,6 +119,17 @@ def remove_subdirectory_from_web_directory():
     else:
         return config.web_directory
 
+def path_exists(path):
+    """Given a path, return True if it is in the output tree walked by the
+       post-build pass
+    """
+
+    # Parent references resolve differently through missing directories
+    if ".." in path:
+        return os.path.exists(path)
+
+    return postbuild.path_exists(path)
+
 def internal_link_test(link):
     """Given a link, make sure that that it exists on the file system
     """
@@ -143,7 +151,7 @@ def internal_link_test(link):
         from_index_path = path.split("/index.html")
         from_index_path = from_index_path[0] + ".html"
 
-    if os.path.exists(path) or os.path.exists(to_index_path) or os.path.exists(from_index_path):
+    if path_exists(path) or path_exists(to_index_path) or path_exists(from_index_path):
         return False
     else:
         return True
@@ -156,24 +164,25 @@ def check_if_relative_link(link):
             return True
     return False
     
-def internal_external_link_checker(filepath, html_str):
-    """Check internal and external links"""
-
-    # Flag to determine if internal link is broken
-    internal_link_error = False
+def page_link_checker(filepath, html_str, external_links):
+    """Given an html page as a string, check its internal links. External
+       links are only matched if asked, they are left unchecked (None) for
+       externallinks to check them all at once
+    """
 
-    # Array to store problems found
-    problems = []
     relative_links = []
-    
+
+    # link => True if broken, for every link of the page
+    page_links = {}
+    # links of the page that make other pages in use
+    page_in_use_links = []
+
+    # don't check links with data-test-ignore attribute after the href when on previous versions
+    ignore_test_links = "/versions/" in filepath
+
     # find all links
     for prefix in ["href", "src"]:
-        # Regular expression includes http: and https:
-        if "/versions/" in filepath: # don't check links with data-test-ignore attribute after the href when on previous versions
-            linkregex = f"{prefix}\s?=\s?[\"']([{allowed_in_link_with_external_links}]+)[\"'](?! ?data-test-ignore=\"true\")"
-        else:
-            linkregex = f"{prefix}\s?=\s?[\"']([{allowed_in_link_with_external_links}]+)[\"']"
-        links = re.findall(linkregex, html_str)
+        links = link_regexes[(prefix, external_links, ignore_test_links)].findall(html_str)
 
         # check if link has a dest
         for link in links:
@@ -188,111 +197,51 @@ def internal_external_link_checker(filepath, html_str):
 
             # Get correct path
             link = get_correct_link(link)
+
             # Check if link is in use
-            check_if_link_in_use(filepath, link)
+            if check_if_link_in_use(filepath, link):
+                page_in_use_links.append(link)
 
             if link in links_list:
-                # If problem detected, add to problem list
-                if links_list[link]:
-                    if link not in problems:
-                        problems.append(link)
+                broken = links_list[link]
             elif link.startswith("http"):
-                # Consider status 404 and unreachable as broken.
-                # Unreachable will be triggered by the except clause
-                try:
-                    r = requests.head(
-                        link, headers=headers, 
-                        verify=False, timeout=5)
-                    if r.status_code == 404:
-                        links_list[link] = True
-                        problems.append(link)
-                    else:
-                        links_list[link] = False
-                except:
-                    links_list[link] = True
-                    problems.append(link)
+                broken = None
             else:
-                if internal_link_test(link):
-                    problems.append(link)
-                    links_list[link] = True
+                broken = internal_link_test(link)
+                links_list[link] = broken
 
-                    if not internal_link_error:
-                        internal_link_error = True
-                else:
-                    links_list[link] = False
+            page_links[link] = broken
 
-    return problems, relative_links, internal_link_error
+    return relative_links, page_links, page_in_use_links
 
-def internal_link_checker(filepath, html_str):
-    """Given an html page as a string, check if there are broken 
-       internal links
+def get_problems(page_links):
+    """Given link => True if broken of a page, return its broken links and
+       whether an internal link is broken
     """
 
-    # Flag to determine if internal link is broken
-    internal_link_error = False
+    problems = [link for link, broken in page_links.items() if broken]
 
-    # 
+    internal_link_error = any(not link.startswith("http") for link in problems)
 
-    problems = []
-    relative_links = []
-
-    # find all links
-    for prefix in ["href", "src"]:
-        if "/versions/" in filepath: # don't check links with data-test-ignore attribute after the href when on previous versions
-            linkregex = f"{prefix}\s?=\s?[\"']([{allowed_in_link}]+)[\"'](?! ?data-test-ignore=\"true\")"
-        else:
-            linkregex = f"{prefix}\s?=\s?[\"']([{allowed_in_link}]+)[\"']"
-        links = re.findall(linkregex, html_str)
-        # check if link has a dest
-        for link in links:
-
-            # Check if link is relative path
-            is_relative = check_if_relative_link(link)
-
-            # Add to relative links list if relative
-            if is_relative:
-                if not link in relative_links:
-                    relative_links.append(link)
-
-            # Get correct path
-            link = get_correct_link(link)
+    return problems, internal_link_error
 
-            # Check if link is in use
-            check_if_link_in_use(filepath, link)
-
-            if link in links_list:
-                if links_list[link]:
-                    if link not in problems:
-                        problems.append(link) 
-            else:
-                if internal_link_test(link):
-                    problems.append(link)
-                    links_list[link] = True
-
-                    if not internal_link_error:
-                        internal_link_error = True
-                else:
-                    links_list[link] = False
+def check_external_links(page_links):
+    """Given link => True if broken of pages, check their unchecked external
+       links
+    """
 
-    return problems, relative_links, internal_link_error
+    unchecked = [link for link, broken in page_links.items() if broken is None]
 
+    if unchecked:
+        links_list.update(externallinks.check_links(unchecked))
 
-def check_if_file_is_deprecated(filename):
-    """ Given a filename, verify if it is deprecated 
-        Return True if it is deprecated, False if not
-    """
-  
-    with open(filename, "r", encoding="utf8") as f:
-        lines = f.readlines()
-        for line in lines:
-            if '<meta name="robots" content="noindex, nofollow">' in line:
-                return True
-    return False
+    for link in unchecked:
+        page_links[link] = links_list[link]
 
-def check_unlinked_pages(filenames):
-    """Given a list of filenames, check if they where linked from
-       another page. Add the files that are not linked to a list a return 
-       the list
+def check_unlinked_pages(filenames, deprecated_files):
+    """Given a list of filenames and the set of deprecated files, check if
+       they where linked from another page. Add the files that are not
+       linked to a list a return the list
     """
 
     unlinked_pages = []
@@ -300,7 +249,7 @@ def check_unlinked_pages(filenames):
         if not "previous" in filename and not "versions" in filename:
 
             # Check if it is deprecated
-            if check_if_file_is_deprecated(filename):
+            if filename in deprecated_files:
                continue 
 
             # Remove unused filepath from filename
@@ -330,37 +279,57 @@ def check_unlinked_pages(filenames):
 
     return unlinked_pages
 
-def check_links_on_page(filepath, check_external_links=False):
-    """return whether the links on the given file are all valid"""
+def check_links_on_page(filepath, html_str, check_external_links=False):
+    """return the links on the given page and whether they are valid.
+       External links are left unchecked
+    """
 
-    # Declare just in case there is a problem opening the file
-    problems = []
-    relative_links = []
-    internal_problem = False
+    in_use = []
 
-    with open(filepath, mode="r", encoding='utf8') as html:
-        html_str = html.read()
+    if not "previous" in filepath and not "versions" in filepath:
+        # Add redirects to in-use to avoid false positives
+        if html_str.startswith("<meta http-equiv=\"refresh\""):
+            corrected_path = remove_extra_from_path(filepath)
 
-        if not "previous" in filepath and not "versions" in filepath:
-            # Add redirects to in-use to avoid false positives
-            if html_str.startswith("<meta http-equiv=\"refresh\""):
-                corrected_path = remove_extra_from_path(filepath)
+            if corrected_path.startswith("\\"):
+                corrected_path = corrected_path.replace("\\", "/")
 
-                if corrected_path.startswith("\\"):
-                    corrected_path = corrected_path.replace("\\", "/")
+            in_use.append(corrected_path)
 
-                if not in_use_links.get(corrected_path):
-                    in_use_links[corrected_path] = True
+    relative_links, links, page_in_use_links = page_link_checker(filepath, html_str, check_external_links)
 
-        if check_external_links:
-            problems, relative_links, internal_problem = internal_external_link_checker(filepath, html_str)
-        else:
-            problems, relative_links, internal_problem = internal_link_checker(filepath, html_str)
+    deprecated = '<meta name="robots" content="noindex, nofollow">' in html_str
         
     filepath = remove_extra_from_path(filepath)
-    return {"path": filepath, "problems": problems, 
-            "relative_links": relative_links, "internal_problem": internal_problem}
+    return {"path": filepath, "relative_links": relative_links,
+            "links": links, "in_use": in_use + page_in_use_links, "deprecated": deprecated}
+
+def accepts_page(path):
+    """Given a path of the output tree, return True if it is a page of the
+       web directory
+    """
+
+    return path.endswith(".html") and postbuild.is_in_web_directory(path)
+
+def get_visitor(external_links=False):
+    """Return the post-build visitor that checks that all links on the site
+       have a valid destination
+    """
 
+    def visit_page(filepath, html_str):
+        # Do not check previous dir with external links
+        directory = os.path.dirname(filepath)
+        return check_links_on_page(filepath, html_str, external_links and not 'previous' in directory and not 'versions' in directory)
+
+    def finish(pages):
+        return check_pages(pages, external_links)
+
+    return {
+        "name": "Links",
+        "accepts": accepts_page,
+        "visit": visit_page,
+        "finish": finish
+    }
 
 def get_amount_of_broken_links():
     """Return the number of broken links"""
@@ -371,49 +340,61 @@ def get_amount_of_broken_links():
             count += 1
     return count
 
-def check_links(external_links = False):
-    """checks all links on the site to make sure that they have a valid 
-       destination
+def check_pages(pages, external_links):
+    """Given the list of (filepath, report) of the pages of the site, write
+       the link reports
     """
 
     broken_pages = []
     relative_links = []
 
-    filenames = []
+    filenames = [filepath for filepath, _ in pages]
+    reports = [report for _, report in pages]
+
+    deprecated_files = set()
 
     internal_problem = False
-    
-    for directory, _, files in os.walk(config.web_directory):
-        for filename in filter(lambda f: f.endswith(".html"), files):
-                   
-            filepath = os.path.join(directory, filename)
 
-            filenames.append(filepath)
+    for filepath, report in pages:
+        links_list.update({link: broken for link, broken in report["links"].items() if broken is not None})
+        for link in report["in_use"]:
+            in_use_links[link] = True
 
-            # Do not check previous dir with external links
-            if external_links and not 'previous' in directory and not 'versions' in directory:
-                report = check_links_on_page(filepath, True)
-            else:
-                report = check_links_on_page(filepath)
+        if report["deprecated"]:
+            deprecated_files.add(filepath)
+
+    # External links of every page are checked at once
+    if external_links:
+        external_links_list = {}
+        for report in reports:
+            external_links_list.update(report["links"])
+        check_external_links(external_links_list)
 
-            # Set internal problem flag to true if internal
-            # problem is found. We want to exit out on error if an internal
-            # link is broken
-            if not internal_problem:
-                if report.get("internal_problem"):
-                    internal_problem = True
+    for report in reports:
+        for link, broken in report["links"].items():
+            if broken is None:
+                report["links"][link] = links_list[link]
 
-            if report.get("problems"):
-                broken_pages.append(report)
+        report["problems"], report["internal_problem"] = get_problems(report["links"])
 
-            if report.get("relative_links"):
-                relative_links_report = {}
-                relative_links_report['path'] = report["path"]
-                relative_links_report['relative_links'] = report["relative_links"]
-                relative_links.append(relative_links_report)
+        # Set internal problem flag to true if internal
+        # problem is found. We want to exit out on error if an internal
+        # link is broken
+        if not internal_problem:
+            if report.get("internal_problem"):
+                internal_problem = True
+
+        if report.get("problems"):
+            broken_pages.append(report)
+
+        if report.get("relative_links"):
+            relative_links_report = {}
+            relative_links_report['path'] = report["path"]
+            relative_links_report['relative_links'] = report["relative_links"]
+            relative_links.append(relative_links_report)
 
     # Get unlinked pages list
-    unlinked_pages = check_unlinked_pages(filenames)
+    unlinked_pages = check_unlinked_pages(filenames, deprecated_files)
 
     # Write unlinked pages report
     if unlinked_pages:
@@ -469,4 +450,11 @@ def check_links(external_links = False):
     if not exit_codes:
         exit_codes.append(config.SUCCESS)
 
-    return exit_codes, links, len(unlinked_pages), len(relative_links)
\ No newline at end of file
+    return exit_codes, links, len(unlinked_pages), len(relative_links)
+
+def check_links(external_links = False):
+    """checks all links on the site to make sure that they have a valid 
+       destination
+    """
+
+    return postbuild.get_result(get_visitor(external_links))
@@ -0,0 +1,53 @@
+import collections
+import hashlib
+import markdown
+from . import config
+from . import siteurl
+
+# Module that renders Markdown for every page module with a single Markdown
+# instance and remembers the html of the texts it already rendered
+
+# Markdown instance reused for every text, reset before each conversion
+md = markdown.Markdown()
+
+# hash of text => html, least recently used first
+cache = collections.OrderedDict()
+
+# Number of texts found in and missing from the cache
+stats = {
+    'hits': 0,
+    'misses': 0
+}
+
+def get_text_hash(text):
+    """Given a text, return the hash used as its cache key"""
+
+    return hashlib.sha256(text.encode('utf8')).digest()
+
+def render(text):
+    """Given a Markdown text, return its html. Same output as
+       markdown.markdown(text), with the site absolute links prefixed with
+       the site url
+    """
+
+    key = get_text_hash(text)
+
+    if key in cache:
+        stats['hits'] += 1
+        cache.move_to_end(key)
+        return cache[key]
+
+    stats['misses'] += 1
+
+    html = siteurl.prefix_links(md.reset().convert(text))
+
+    cache[key] = html
+    if len(cache) > config.markdown_cache_size:
+        cache.popitem(last=False)
+
+    return html
+
+def get_stats():
+    """Return the hits and misses of the cache"""
+
+    return dict(stats)
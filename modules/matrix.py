@@ -1,4 +1,3 @@
-import json
 import os
 import requests
 import collections
@@ -7,6 +6,9 @@ import urllib3
 import stix2
 import datetime
 from . import config
+from . import pagerenderer
+from . import search
+from . import sidenav
 from . import stixhelpers
 from . import  util
 
@@ -23,10 +25,9 @@ def generate():
         os.mkdir(config.matrix_markdown_path)
     
     # Write the matrix index.html page
-    with open(os.path.join(config.matrix_markdown_path, "overview.md"), "w", encoding='utf8') as md_file:
-        md_file.write(config.matrix_overview_md)
+    pagerenderer.write_page(os.path.join(config.matrix_markdown_path, "overview.md"), config.matrix_overview_md)
 
-    side_menu_data = util.get_side_menu_matrices(config.matrices)
+    side_menu_data = sidenav.add_side_nav("matrices", util.get_side_menu_matrices(config.matrices))
 
     for matrix in config.matrices:
         if matrix["type"] == "external": continue # link to externally hosted matrix, don't create a page for it
@@ -50,10 +51,9 @@ def generate_platform_matrices(matrix, side_menu_data=None):
     data['path'] = matrix['path']
     
     subs = config.matrix_md.substitute(data)
-    subs = subs + json.dumps(data)
 
-    with open(os.path.join(config.matrix_markdown_path, data['domain'] + "-" + matrix['name'] + ".md"), "w", encoding='utf8') as md_file:
-        md_file.write(subs)
+    pagerenderer.write_page(os.path.join(config.matrix_markdown_path, data['domain'] + "-" + matrix['name'] + ".md"), subs, data)
+    search.add_page(subs, "Matrix - " + util.get_domain_alias(data['domain']), data, config.search_data_keys['matrix'])
 
     for subtype in matrix['subtypes']:
         generate_platform_matrices(subtype, side_menu_data)
@@ -90,7 +90,7 @@ def get_sub_matrices(matrix):
             "id": technique["id"],
             "name": technique["name"],
             "url": technique["external_references"][0]["url"].split("attack.mitre.org")[1],
-            "x_mitre_platforms": technique.get("x_mitre_platforms"),
+            "x_mitre_platforms": sorted(technique["x_mitre_platforms"]) if technique.get("x_mitre_platforms") else technique.get("x_mitre_platforms"),
             "external_id": technique["external_references"][0]["external_id"]
         }
 
@@ -1,10 +1,14 @@
-import json
 import os
 import urllib3
 import re
-import markdown
 from . import config
+from . import markdownrenderer
+from . import pagerenderer
+from . import parallel
+from . import search
+from . import sidenav
 from . import stixhelpers
+from . import referenceregistry
 from . import util
 
 def generate():
@@ -17,8 +21,7 @@ def generate():
         os.mkdir(config.mitigation_markdown_path)
 
     # Create the mitigation index markdown
-    with open(os.path.join(config.mitigation_markdown_path, "overview.md"), "w", encoding='utf8') as md_file:
-        md_file.write(config.mitigation_overview_md)
+    pagerenderer.write_page(os.path.join(config.mitigation_markdown_path, "overview.md"), config.mitigation_overview_md)
 
     mitigations = {}
 
@@ -29,8 +32,8 @@ def generate():
     # Amount of characters per category
     group_by = 3
 
-    side_nav_data = util.get_side_nav_domains_data("mitigations", mitigations)
-    side_nav_mobile_data = util.get_side_nav_domains_mobile_view_data("mitigations", mitigations, group_by)
+    side_nav_data = sidenav.add_side_nav("mitigations", util.get_side_nav_domains_data("mitigations", mitigations))
+    side_nav_mobile_data = sidenav.add_side_nav("mitigations-mobile", util.get_side_nav_domains_mobile_view_data("mitigations", mitigations, group_by))
     
     for domain in config.domains:
         generate_markdown_files(domain, mitigations[domain], side_nav_data, side_nav_mobile_data)
@@ -52,14 +55,12 @@ def generate_markdown_files(domain, mitigations, side_nav_data, side_nav_mobile_
         data['mitigation_table'] = get_mitigation_table_data(mitigations)
 
         subs = config.mitigation_domain_md.substitute(data)
-        subs = subs + json.dumps(data)
 
-        with open(os.path.join(config.mitigation_markdown_path, data['domain'] + "-mitigations.md"), "w", encoding='utf8') as md_file:
-            md_file.write(subs)
+        pagerenderer.write_page(os.path.join(config.mitigation_markdown_path, data['domain'] + "-mitigations.md"), subs, data)
+        search.add_page(subs, "Mitigations - " + util.get_domain_alias(data['domain']), data, config.search_data_keys['mitigation_domain'])
 
         # Generates the markdown files to be used for page generation
-        for mitigation in mitigations:
-            generate_mitigation_md(mitigation, domain, side_nav_data, side_nav_mobile_data)
+        parallel.generate_pages(generate_mitigation_md, mitigations, domain, side_nav_data, side_nav_mobile_data)
 
 def generate_mitigation_md(mitigation, domain, side_menu_data, \
                                                        side_menu_mobile_data):
@@ -85,17 +86,14 @@ def generate_mitigation_md(mitigation, domain, side_menu_data, \
         if dates.get('modified'):
             data['modified'] = dates['modified']
 
-        # Get initial reference list
-        reference_list = []
-        # Decleared as an object to be able to pass by reference
-        next_reference_number = {}
-        next_reference_number['value'] = 1
-        reference_list = util.update_reference_list(reference_list, mitigation)
+        # Get initial references
+        references = referenceregistry.ReferenceRegistry()
+        references.add_external_references(mitigation)
 
         if mitigation.get('description'):
             citations_from_descr = util.get_citations_from_descr(mitigation['description'])
 
-            data['descr'] = markdown.markdown(mitigation['description'])\
+            data['descr'] = markdownrenderer.render(mitigation['description'])\
                                         .replace("\n", "<br>")\
                                         .replace("{", "{{")\
                                         .replace("}", "}}")\
@@ -103,23 +101,22 @@ def generate_mitigation_md(mitigation, domain, side_menu_data, \
                                         .replace("“","\"")
 
             data['descr'] = util.filter_urls(data['descr'])
-            data['descr'] = util.get_descr_reference_sect(citations_from_descr, reference_list, next_reference_number, data['descr'])
+            data['descr'] = util.get_descr_reference_sect(citations_from_descr, references, data['descr'])
 
         if mitigation.get('x_mitre_deprecated'):
             data['deprecated'] = True
         if mitigation.get('x_mitre_version'):
             data['version'] = mitigation["x_mitre_version"]
 
-        data['techniques_addressed_data'] = get_techniques_addressed_data(mitigation, reference_list, next_reference_number)
+        data['techniques_addressed_data'] = get_techniques_addressed_data(mitigation, references)
     
-        if reference_list:
-            data['bottom_ref'] = util.sort_reference_list(reference_list)
+        if references.references:
+            data['bottom_ref'] = references.get_cited_references()
 
         subs = config.mitigation_md.substitute(data)
-        subs = subs + json.dumps(data)
 
-        with open(os.path.join(config.mitigation_markdown_path, data['attack_id'] + ".md"), "w", encoding='utf8') as md_file:
-            md_file.write(subs)
+        pagerenderer.write_page(os.path.join(config.mitigation_markdown_path, data['attack_id'] + ".md"), subs, data)
+        search.add_page(subs, data['name'] + ", Mitigation " + data['attack_id'] + " - " + util.get_domain_alias(data['domain']), data, config.search_data_keys['mitigation'])
 
 def get_mitigation_table_data(mitigation_list):
     """Given a list of mitigations, returns the data to build
@@ -142,9 +139,9 @@ def get_mitigation_table_data(mitigation_list):
             descr = re.sub(' \((Citation:.*?)\)', '', mitigation['description'], flags=re.MULTILINE)
             descr = re.sub('\((Citation:.*?)\)', '', descr, flags=re.MULTILINE)
             if descr.split("\n")[0] == '### Windows':
-                descr = markdown.markdown(descr.split("\n")[2])
+                descr = markdownrenderer.render(descr.split("\n")[2])
             else:
-                descr = markdown.markdown(descr.split("\n")[0])
+                descr = markdownrenderer.render(descr.split("\n")[0])
             row['descr'] = util.filter_urls(descr)
 
             if mitigation.get('x_mitre_deprecated'):
@@ -154,7 +151,7 @@ def get_mitigation_table_data(mitigation_list):
                 
     return mitigation_data
     
-def get_techniques_addressed_data(mitigation, reference_list, next_reference_number):
+def get_techniques_addressed_data(mitigation, references):
     """Given a mitigation, returns a list of techniques addressed by 
        the mitigation
     """
@@ -164,7 +161,7 @@ def get_techniques_addressed_data(mitigation, reference_list, next_reference_num
         for technique in config.mitigates_techniques.get(mitigation['id']):
             # Do not add if technique is deprecated
             if not technique['object'].get('x_mitre_deprecated'):
-                technique_list = util.technique_used_helper(technique_list, technique, reference_list, next_reference_number)           
+                technique_list = util.technique_used_helper(technique_list, technique, references)           
     
     technique_data = []
     for item in technique_list:
@@ -0,0 +1,144 @@
+import hashlib
+import os
+
+# Module that writes the generated pages. A page is only written when its
+# content differs from the file on disk, so unchanged pages keep their mtime
+# and Pelican's content cache and rsync deploys can skip them. Files are
+# compared and written as soon as they are generated. Some pages are
+# generated once per domain and the last one wins, so only the digests of
+# such files are kept for the stage: a file that ends up with the content it
+# had before the stage gets its mtime back and is counted as skipped
+
+# Stage the written files are counted under, set by the build wrappers
+stage = {
+    "name": "Other"
+}
+
+# stage name => number of files written and skipped, in order of stages
+stats = {}
+
+# path => {original, mtime, current} of the files generated by the current
+# stage: digest of the file before the stage (None if it did not exist), its
+# mtime in ns and the digest of the file now
+generated = {}
+
+# Paths generated since the last call of clear_touched, kept by the page
+# workers to send the records of their files to the parent process
+touched = []
+
+def start_stage(name):
+    """Given the name of a build stage, count the files of the previous
+       stage and count the files written from now on under the new one
+    """
+
+    flush()
+
+    stage['name'] = name
+    get_stage_stats()
+
+def get_stage_stats():
+    """Return the written and skipped counters of the current stage"""
+
+    return stats.setdefault(stage['name'], {'written': 0, 'skipped': 0})
+
+def get_file_digest(path):
+    """Given a path, return the sha256 digest of the file"""
+
+    sha256 = hashlib.sha256()
+
+    with open(path, "rb") as existing_file:
+        for chunk in iter(lambda: existing_file.read(1024 * 1024), b""):
+            sha256.update(chunk)
+
+    return sha256.digest()
+
+def get_record(path):
+    """Given a path generated for the first time in the stage, return the
+       record of the file before the stage
+    """
+
+    if not os.path.isfile(path):
+        return {"original": None, "mtime": None, "current": None}
+
+    original = get_file_digest(path)
+
+    return {"original": original, "mtime": os.stat(path).st_mtime_ns, "current": original}
+
+def write_file(path, content, encoding='utf8'):
+    """Given a path and text, write the text to the path unless the file
+       already has this content. Same output as open(path, "w").write(text)
+    """
+
+    # Text mode translates newlines, do the same for the bytes compared
+    if os.linesep != "\n":
+        content = content.replace("\n", os.linesep)
+
+    data = content.encode(encoding)
+    digest = hashlib.sha256(data).digest()
+
+    if path not in generated:
+        generated[path] = get_record(path)
+    touched.append(path)
+
+    record = generated[path]
+
+    if record['current'] == digest:
+        return
+
+    # Natively rendered pages go straight to the output directory
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    with open(path, "wb") as output_file:
+        output_file.write(data)
+
+    record['current'] = digest
+
+    # An earlier domain changed the file, the last one gave it back
+    if digest == record['original']:
+        os.utime(path, ns=(os.stat(path).st_atime_ns, record['mtime']))
+
+def discard(path):
+    """Given the path of a file generated by this build that is no longer
+       part of it, remove it
+    """
+
+    generated.pop(path, None)
+
+    if os.path.isfile(path):
+        os.remove(path)
+
+        # Remove the directories created for the file only
+        directory = os.path.dirname(path)
+        if directory and not os.listdir(directory):
+            os.removedirs(directory)
+
+def clear_touched():
+    """Forget the paths generated so far, called by the page workers before
+       generating a page
+    """
+
+    touched.clear()
+
+def get_touched_records():
+    """Return path => record of the files generated since clear_touched"""
+
+    return {path: generated[path] for path in touched if path in generated}
+
+def flush():
+    """Count the files of the current stage as written or skipped"""
+
+    if not generated:
+        return
+
+    counters = get_stage_stats()
+
+    for record in generated.values():
+        if record['current'] == record['original']:
+            counters['skipped'] += 1
+        else:
+            counters['written'] += 1
+
+    generated.clear()
+    touched.clear()
@@ -0,0 +1,152 @@
+import json
+import os
+import jinja2
+from webassets import Environment as AssetsEnvironment
+from webassets.ext.jinja2 import AssetsExtension
+from . import config
+from . import outputwriter
+from . import pelicanrunner
+from . import sidenav
+
+# Module that writes the generated pages. By default a page is written as
+# markdown, a Pelican header followed by its data as JSON, for Pelican to
+# render. With --native-render the data is given straight to the theme
+# template and the html is written to the output directory, so the page
+# skips the JSON serialize/parse and markdown round trip. Pelican then only
+# renders the hand-written pages and the pages of the resources directory
+
+# Jinja environment and shared context of the native renderer, created the
+# first time a page is rendered
+renderer = {}
+
+# markdown path => output path of the pages rendered by this build. Pages
+# that share a markdown path replace each other, like their markdown would
+rendered_pages = {}
+
+def is_native():
+    """Return True if pages are rendered without Pelican"""
+
+    return bool(getattr(config.args, 'native_render', False))
+
+def from_json(data):
+    """Jinja filter that replaces the from_json filter of pelicanconf.py.
+       Data of natively rendered pages is already decoded
+    """
+
+    if isinstance(data, str):
+        return json.loads(data)
+    return data
+
+def side_nav(menu):
+    """Jinja filter that replaces the side_nav filter of pelicanconf.py with
+       the side navigations generated by this build
+    """
+
+    if isinstance(menu, str):
+        return sidenav.side_navs[menu]
+    return menu
+
+def get_renderer():
+    """Return the Jinja environment and the context shared by every page,
+       set up like the environment Pelican renders the theme with
+    """
+
+    if not renderer:
+        settings = pelicanrunner.get_settings()
+
+        jinja_environment = dict(settings['JINJA_ENVIRONMENT'])
+        jinja_environment['extensions'] = list(jinja_environment['extensions']) + [AssetsExtension]
+
+        env = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(os.path.join(settings['THEME'], 'templates')),
+            **jinja_environment
+        )
+        env.filters.update(settings['JINJA_FILTERS'])
+        env.filters['from_json'] = from_json
+        env.filters['side_nav'] = side_nav
+        # Same as Pelican, for the macros imported without context
+        env.globals['SITEURL'] = settings['SITEURL']
+
+        # Same assets environment as the assets plugin
+        env.assets_environment = AssetsEnvironment(os.path.join(settings['OUTPUT_PATH'], settings['THEME_STATIC_DIR']), settings['THEME_STATIC_DIR'])
+        for path in settings['THEME_STATIC_PATHS']:
+            env.assets_environment.append_path(os.path.join(settings['THEME'], path))
+
+        context = dict(settings)
+        context['localsiteurl'] = settings['SITEURL']
+        context['pages'] = []
+        context['articles'] = []
+
+        renderer['env'] = env
+        renderer['context'] = context
+        renderer['output_path'] = settings['OUTPUT_PATH']
+
+    return renderer
+
+def get_metadata(header):
+    """Given the Pelican header of a page, return its metadata with
+       lowercase keys, as Pelican reads it
+    """
+
+    metadata = {}
+    key = None
+
+    for line in header.splitlines():
+        if ":" in line:
+            key, value = line.split(":", 1)
+            key = key.strip().lower()
+            metadata[key] = value.strip()
+
+    return metadata, key
+
+def render_page(markdown_path, header, data=None):
+    """Given the markdown path of a page, its Pelican header and its data,
+       render its template and write the html
+    """
+
+    metadata, data_key = get_metadata(header)
+
+    # The data follows the last key of the header
+    if data is not None:
+        metadata[data_key] = data
+
+    renderer = get_renderer()
+
+    context = dict(renderer['context'])
+    context['page'] = metadata
+    context['output_file'] = metadata['save_as']
+
+    template = renderer['env'].get_template(metadata['template'] + ".html")
+
+    output_path = os.path.join(renderer['output_path'], metadata['save_as'])
+
+    previous_output_path = rendered_pages.get(markdown_path)
+    if previous_output_path and previous_output_path != output_path:
+        outputwriter.discard(previous_output_path)
+
+    rendered_pages[markdown_path] = output_path
+
+    outputwriter.write_file(output_path, template.render(context))
+
+def write_page(markdown_path, header, data=None):
+    """Given the markdown path of a page, its Pelican header and its data,
+       either a dict or an already serialized string, write the markdown of
+       the page or, with --native-render, its html
+    """
+
+    if not is_native():
+        if data is None:
+            subs = header
+        elif isinstance(data, str):
+            subs = header + data
+        else:
+            subs = header + json.dumps(data)
+
+        outputwriter.write_file(markdown_path, subs)
+        return
+
+    # Markdown of a previous build would be rendered again by Pelican
+    if os.path.isfile(markdown_path):
+        os.remove(markdown_path)
+
+    render_page(markdown_path, header, data)
@@ -0,0 +1,91 @@
+import multiprocessing
+from . import citationrewriter
+from . import config
+from . import incremental
+from . import markdownrenderer
+from . import outputwriter
+from . import search
+
+# Module that spreads the generation of pages over forked worker processes.
+# Workers inherit the loaded STIX data and shared page data from the parent
+# process, only the index of the object to generate is sent to them
+
+# Function, objects and extra arguments of the pages being generated. Set
+# before the workers are forked so they inherit it
+task = {}
+
+def get_jobs():
+    """Return the number of processes to generate pages with"""
+
+    jobs = getattr(config.args, 'jobs', 1) or 1
+
+    # Workers rely on inheriting the parent memory, only available with fork
+    if jobs > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+        return 1
+
+    return jobs
+
+def generate_page(index):
+    """Generate the page of the object at the given index of the task.
+       Return the unresolved citations and Markdown cache counters of the
+       page so the parent process can add them to its own, the records of
+       the files the page wrote and its search documents for the parent
+       process to keep
+    """
+
+    citationrewriter.unresolved_citations.clear()
+    markdownrenderer.stats['hits'] = 0
+    markdownrenderer.stats['misses'] = 0
+    outputwriter.clear_touched()
+    search.documents.clear()
+
+    task['function'](task['objects'][index], *task['args'])
+
+    return dict(citationrewriter.unresolved_citations), dict(markdownrenderer.stats), outputwriter.get_touched_records(), dict(search.documents)
+
+def generate_pages(function, objects, *args):
+    """Call function(obj, *args) for every object, with as many processes
+       as given with --jobs. Each call must only write its own pages
+    """
+
+    # Skip the pages of objects that did not change since the previous
+    # incremental build
+    objects = incremental.filter_pages(function, objects, args)
+
+    jobs = get_jobs()
+
+    if jobs <= 1 or len(objects) <= 1:
+        for obj in objects:
+            outputwriter.clear_touched()
+            function(obj, *args)
+            incremental.set_page_files(function, obj, args, outputwriter.touched)
+        return
+
+    task['function'] = function
+    task['objects'] = objects
+    task['args'] = args
+
+    # Keep the counters of the parent, workers start from a copy of them
+    unresolved_citations = dict(citationrewriter.unresolved_citations)
+    stats = dict(markdownrenderer.stats)
+
+    chunksize = max(1, len(objects) // (jobs * 4))
+
+    try:
+        with multiprocessing.get_context('fork').Pool(jobs) as pool:
+            results = pool.map(generate_page, range(len(objects)), chunksize)
+    finally:
+        task.clear()
+
+    for obj, (page_unresolved_citations, page_stats, page_files, page_documents) in zip(objects, results):
+        for source_name, count in page_unresolved_citations.items():
+            unresolved_citations[source_name] = unresolved_citations.get(source_name, 0) + count
+        stats['hits'] += page_stats['hits']
+        stats['misses'] += page_stats['misses']
+        outputwriter.generated.update(page_files)
+        incremental.set_page_files(function, obj, args, page_files)
+        search.documents.update(page_documents)
+
+    citationrewriter.unresolved_citations.clear()
+    citationrewriter.unresolved_citations.update(unresolved_citations)
+    markdownrenderer.stats.update(stats)
@@ -0,0 +1,109 @@
+import contextlib
+import io
+import logging
+import os
+import time
+from pelican import Pelican
+from pelican import signals
+from pelican.generators import ArticlesGenerator, PagesGenerator
+from pelican.settings import DEFAULT_CONFIG, read_settings
+from . import config
+from . import siteurl
+
+# Module that runs Pelican inside the build process instead of starting
+# the pelican command, so the build does not pay for a new interpreter and
+# the counts of the generated pages are available as data
+
+# Generators of the last Pelican run, collected once they are finalized
+generators = []
+
+def collect_generators(finalized_generators):
+    """Keep the generators of a run to count its pages afterwards"""
+
+    generators[:] = finalized_generators
+
+signals.all_generators_finalized.connect(collect_generators)
+
+def prefix_content_links(content):
+    """Prefix the links of a hand-written page with the site url while it is
+       read
+    """
+
+    if content._content:
+        content._content = siteurl.prefix_links(content._content)
+
+signals.content_object_init.connect(prefix_content_links)
+
+def set_site_url_global(generator):
+    """Make SITEURL a global of the templates, so that the macros imported
+       without context see it as well
+    """
+
+    generator.env.globals['SITEURL'] = generator.settings['SITEURL']
+
+signals.generator_init.connect(set_site_url_global)
+
+def get_settings():
+    """Return the Pelican settings of the build: pelicanconf.py with the
+       output directory and the site url of the subdirectory, if any
+    """
+
+    override = {}
+
+    if config.subdirectory:
+        override['OUTPUT_PATH'] = config.web_directory
+        override['SITEURL'] = siteurl.get_site_url()
+
+    # Nothing to reuse from a clean build, do not read the stale cache
+    if getattr(config.args, 'clean', False):
+        override['LOAD_CONTENT_CACHE'] = False
+
+    # The landing page is rendered natively, Pelican would replace it with
+    # the index of its articles
+    if getattr(config.args, 'native_render', False):
+        override['DIRECT_TEMPLATES'] = [template for template in DEFAULT_CONFIG['DIRECT_TEMPLATES'] if template != 'index']
+
+    settings = read_settings(config.pelican_settings_path, override=override)
+
+    # Cached pages were read with the links of their site url
+    if config.subdirectory:
+        settings['CACHE_PATH'] = os.path.join(settings['CACHE_PATH'], config.subdirectory)
+
+    return settings
+
+def get_generator(generator_class):
+    """Given a generator class, return the generator of the last run"""
+
+    return next(generator for generator in generators if isinstance(generator, generator_class))
+
+def run():
+    """Run Pelican on the content directory. Return the time it took and
+       the number of articles, drafts, pages and hidden pages it processed
+    """
+
+    start_time = time.time()
+
+    pelican = Pelican(get_settings())
+
+    # Same output as pelican -q: only critical messages, no summary
+    logging.disable(logging.ERROR)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            pelican.run()
+    finally:
+        logging.disable(logging.NOTSET)
+
+    articles_generator = get_generator(ArticlesGenerator)
+    pages_generator = get_generator(PagesGenerator)
+
+    stats = {
+        "time": time.time() - start_time,
+        "articles": len(articles_generator.articles) + len(articles_generator.translations),
+        "drafts": len(articles_generator.drafts) + len(articles_generator.drafts_translations),
+        "pages": len(pages_generator.pages) + len(pages_generator.translations),
+        "hidden_pages": len(pages_generator.hidden_pages) + len(pages_generator.hidden_translations)
+    }
+
+    generators.clear()
+
+    return stats
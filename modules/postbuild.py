@@ -0,0 +1,264 @@
+import fnmatch
+import multiprocessing
+import os
+import time
+from . import config
+from . import parallel
+
+# Module that runs the stages that work on the built site in one pass over
+# the output directory: search index, subdirectory links and the link,
+# citation and size tests. The output tree is walked once and every html
+# page is read once, its content is given to each stage visitor that
+# accepts the page. Each stage only visits the directories of its rules in
+# config.post_build_directories, directories no stage visits are pruned
+# from the walk. Pages are visited in a pool of forked workers, the
+# results of a visitor are given to its finish function in walk order once
+# every page is visited.
+#
+# A visitor is a dict with:
+#   name: name of the stage, its finish result is kept under it
+#   accepts: function(path) returning True if the file is visited
+#   visit: function(path, html) returning the result of the file. html is
+#          None for the files that are not html pages
+#   finish: function(results) given the list of (path, result) of the
+#           visited files, returning the result of the stage
+#   start: optional function called before the output tree is walked
+#   rewrite: optional, True if visit returns the new html of the page. The
+#            page is written back and the next visitors see the new html.
+#            Rewriting visitors go first
+
+# Files, paths (files and directories) and directory => visitor name =>
+# state of the directory, of the output tree found by the last walk. Files
+# written by a finish function are added with add_file so that the visitors
+# finishing after it see them
+tree = {
+    "files": [],
+    "paths": set(),
+    "states": {}
+}
+
+# States of a directory for a visitor
+INCLUDED = "included"
+PENDING = "pending"
+EXCLUDED = "excluded"
+
+# visitor name => result of its finish function
+results = {}
+
+# Visitors of the pass being run, set before the workers are forked so they
+# inherit it
+visitors = []
+
+def is_in_web_directory(path):
+    """Given a path of the output tree, return True if it is in the web
+       directory
+    """
+
+    return path.startswith(os.path.join(config.web_directory, ""))
+
+def get_directory_states(directory, parent_states):
+    """Given a directory and the states of its parent directory, return
+       visitor name => state of the directory: included if the visitor
+       visits it, pending if one of its subdirectories may be included and
+       excluded otherwise
+    """
+
+    relative_directory = os.path.relpath(directory, config.web_directory)
+
+    # Directories outside of the web directory are left to the visitors
+    if relative_directory.startswith(".."):
+        return {visitor['name']: INCLUDED for visitor in visitors}
+
+    states = {}
+
+    for visitor in visitors:
+        rules = config.post_build_directories.get(visitor['name'], {})
+
+        # The web directory is the root of the rules
+        parent_state = PENDING if relative_directory == "." else parent_states[visitor['name']]
+
+        if parent_state == EXCLUDED or any(fnmatch.fnmatch(relative_directory, pattern) for pattern in rules.get('exclude', [])):
+            states[visitor['name']] = EXCLUDED
+        elif parent_state == INCLUDED or any(fnmatch.fnmatch(relative_directory, pattern) for pattern in rules.get('include', ["*"])):
+            states[visitor['name']] = INCLUDED
+        else:
+            states[visitor['name']] = PENDING
+
+    return states
+
+def walk():
+    """Enumerate the files and directories of the output tree that a visitor
+       visits
+    """
+
+    tree['files'] = []
+    tree['paths'] = set()
+    tree['states'] = {}
+
+    root_directory = os.path.normpath(config.parent_web_directory)
+
+    states = {root_directory: get_directory_states(root_directory, None)}
+
+    for directory, directories, files in os.walk(root_directory):
+        directory_states = states.pop(directory)
+
+        tree['paths'].add(directory)
+        tree['states'][directory] = directory_states
+
+        # Prune the subdirectories every visitor excludes
+        walked_directories = []
+        for name in directories:
+            subdirectory_states = get_directory_states(os.path.join(directory, name), directory_states)
+            if any(state != EXCLUDED for state in subdirectory_states.values()):
+                states[os.path.join(directory, name)] = subdirectory_states
+                walked_directories.append(name)
+        directories[:] = walked_directories
+
+        for filename in files:
+            filepath = os.path.join(directory, filename)
+            tree['files'].append(filepath)
+            tree['paths'].add(filepath)
+
+def add_directory(directory):
+    """Given a directory created once the output tree was walked, add it to
+       the tree and return the states of the directory
+    """
+
+    parent_directory = os.path.dirname(directory)
+
+    if not parent_directory:
+        parent_states = None
+    elif parent_directory in tree['states']:
+        parent_states = tree['states'][parent_directory]
+    else:
+        parent_states = add_directory(parent_directory)
+
+    directory_states = get_directory_states(directory, parent_states)
+
+    tree['paths'].add(directory)
+    tree['states'][directory] = directory_states
+
+    return directory_states
+
+def add_file(path):
+    """Given the path of a file written once the output tree was walked, add
+       it to the tree
+    """
+
+    path = os.path.normpath(path)
+
+    if path not in tree['paths']:
+        if os.path.dirname(path) not in tree['states']:
+            add_directory(os.path.dirname(path))
+
+        tree['files'].append(path)
+        tree['paths'].add(path)
+
+def is_visited(name, path):
+    """Given the name of a visitor and a path of the output tree, return True
+       if the visitor visits the directory of the path
+    """
+
+    return tree['states'].get(os.path.dirname(path), {}).get(name) == INCLUDED
+
+def path_exists(path):
+    """Given a path, return True if it is in the output tree"""
+
+    return os.path.normpath(path) in tree['paths']
+
+def visit_file(filepath):
+    """Given the path of a file, read it once and give it to the visitors
+       that accept it. Return visitor name => result and visitor name =>
+       time spent. Called in the worker processes
+    """
+
+    file_results = {}
+    times = {}
+
+    page_html = None
+    if filepath.endswith(".html"):
+        with open(filepath, mode="r", encoding='utf8') as html:
+            page_html = html.read()
+
+    for visitor in visitors:
+        if not is_visited(visitor['name'], filepath) or not visitor['accepts'](filepath):
+            continue
+
+        start_time = time.time()
+
+        result = visitor['visit'](filepath, page_html)
+
+        if visitor.get('rewrite'):
+            rewritten = result is not None and result != page_html
+            if rewritten:
+                with open(filepath, mode="w", encoding='utf8') as html:
+                    html.write(result)
+                page_html = result
+            result = rewritten
+
+        file_results[visitor['name']] = result
+        times[visitor['name']] = time.time() - start_time
+
+    return file_results, times
+
+def run(run_visitors):
+    """Given a list of visitors, walk the output tree, visit the files and
+       finish the visitors. Keep the result of each visitor and return the
+       time spent walking and in every visitor
+    """
+
+    # Rewriting visitors go first, the others see the rewritten pages
+    visitors[:] = sorted(run_visitors, key=lambda visitor: not visitor.get('rewrite'))
+
+    stats = {
+        "walk": 0,
+        "visitors": {visitor['name']: 0 for visitor in visitors}
+    }
+
+    for visitor in visitors:
+        if visitor.get('start'):
+            visitor['start']()
+
+    start_time = time.time()
+    walk()
+    stats['walk'] = time.time() - start_time
+
+    files = [filepath for filepath in tree['files'] if any(is_visited(visitor['name'], filepath) and visitor['accepts'](filepath) for visitor in visitors)]
+
+    visitor_results = {visitor['name']: [] for visitor in visitors}
+
+    jobs = parallel.get_jobs()
+
+    if jobs > 1 and len(files) > 1:
+        pool = multiprocessing.get_context('fork').Pool(jobs)
+        file_results = pool.imap(visit_file, files, max(1, len(files) // (jobs * 4)))
+    else:
+        pool = None
+        file_results = map(visit_file, files)
+
+    try:
+        for filepath, (file_result, times) in zip(files, file_results):
+            for name, result in file_result.items():
+                visitor_results[name].append((filepath, result))
+                stats['visitors'][name] += times[name]
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    for visitor in visitors:
+        start_time = time.time()
+        results[visitor['name']] = visitor['finish'](visitor_results[visitor['name']])
+        stats['visitors'][visitor['name']] += time.time() - start_time
+
+    return stats
+
+def get_result(visitor):
+    """Given a visitor, return its result. Visitors that did not run in a
+       pass yet are run on their own
+    """
+
+    if visitor['name'] not in results:
+        run([visitor])
+
+    return results[visitor['name']]
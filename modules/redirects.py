@@ -1,5 +1,6 @@
 import os
 from . import config
+from . import pagerenderer
 from . import stixhelpers
 from . import util
 
@@ -76,8 +77,7 @@ def generate_image_redirects():
 
         subs = config.redirect_md.substitute(data)
 
-        with open(os.path.join(config.redirects_markdown_path, data['title'] + ".md"), "w", encoding='utf8') as md_file:
-            md_file.write(subs)
+        pagerenderer.write_page(os.path.join(config.redirects_markdown_path, data['title'] + ".md"), subs)
 
 def generate_training_redirects():
     """Responsible for generating training redirect markdowns"""
@@ -85,14 +85,12 @@ def generate_training_redirects():
     for training in config.training_redict_dict:
         subs = config.redirect_md.substitute(training)
 
-        with open(os.path.join(config.redirects_markdown_path, training['title'] + ".md"), "w", encoding='utf8') as md_file:
-            md_file.write(subs)
+        pagerenderer.write_page(os.path.join(config.redirects_markdown_path, training['title'] + ".md"), subs)
        
 def generate_contribute_redirect():
     """Responsible for generating contribute redirects markdown"""
 
-    with open(os.path.join(config.redirects_markdown_path, "Contributing_to_MITRE_ATTACK.md"), "w", encoding='utf8') as md_file:
-        md_file.write(config.contributing_md)
+    pagerenderer.write_page(os.path.join(config.redirects_markdown_path, "Contributing_to_MITRE_ATTACK.md"), config.contributing_md)
 
 def generate_tactic_redirects(domain):
     """Responsible for generating tactic redirects markdown"""
@@ -112,8 +110,7 @@ def generate_tactic_redirects(domain):
 
         subs = config.redirect_md.substitute(data)
 
-        with open(os.path.join(config.redirects_markdown_path, data['title'] + ".md"), "w", encoding='utf8') as md_file:
-            md_file.write(subs)
+        pagerenderer.write_page(os.path.join(config.redirects_markdown_path, data['title'] + ".md"), subs)
 
 def generate_other_redirects(domain):
     """Responsible for generation of redirects for old site's URLs that aren't
@@ -130,8 +127,7 @@ def generate_other_redirects(domain):
         subs = config.redirect_md.substitute(data)
 
         # Write redirect page for a single object
-        with open(os.path.join(config.redirects_markdown_path, data['title'] + ".md"), "w", encoding='utf8') as md_file:
-            md_file.write(subs)
+        pagerenderer.write_page(os.path.join(config.redirects_markdown_path, data['title'] + ".md"), subs)
 
 def generate_misc_redirects():
     """generate redirects not associated with any domain"""
@@ -143,8 +139,7 @@ def generate_misc_redirects():
 
         subs = config.redirect_md.substitute(data)
 
-        with open(os.path.join(config.redirects_markdown_path, data['title'] + ".md"), "w", encoding='utf8') as md_file:
-            md_file.write(subs)
+        pagerenderer.write_page(os.path.join(config.redirects_markdown_path, data['title'] + ".md"), subs)
 
 def generate_obj_redirect(redirect_link, new_attack_id, old_attack_id, domain):
     """Responsible for generating redirects markdown for given data"""
@@ -165,16 +160,14 @@ def generate_obj_redirect(redirect_link, new_attack_id, old_attack_id, domain):
 
     subs = config.redirect_md.substitute(data)
 
-    with open(os.path.join(config.redirects_markdown_path, data['title'] + ".md"), "w", encoding='utf8') as md_file:
-        md_file.write(subs)
+    pagerenderer.write_page(os.path.join(config.redirects_markdown_path, data['title'] + ".md"), subs)
 
     if new_attack_id != old_attack_id:
         data['path'] = redirect_link['new'] + "/" + old_attack_id
 
         subs = config.redirect_md.substitute(data)
 
-        with open(os.path.join("content/pages", redirect_link["new"], data['title'] + ".md"), "w", encoding='utf8') as md_file:
-            md_file.write(subs)
+        pagerenderer.write_page(os.path.join("content/pages", redirect_link["new"], data['title'] + ".md"), subs)
 
 
 def get_new_and_old_ids(obj):
@@ -0,0 +1,86 @@
+from . import config
+
+# Module that keeps track of the references cited on a page
+
+class ReferenceRegistry:
+    """References of a page by source name. References are numbered in
+       the order they are first cited on the page
+    """
+
+    def __init__(self):
+        # source name => reference, in the order references were added
+        self.references = {}
+        # cited references, in the order of their number
+        self.cited = []
+
+    def add_external_references(self, obj):
+        """Given an object, add the external references of the object
+           that are not in the registry yet
+        """
+
+        if obj.get('external_references'):
+
+            for ext_ref in obj['external_references']:
+
+                # Only add if reference has source name and a description
+                if ext_ref.get('source_name') and ext_ref.get("description"):
+
+                    # Do not add if to reference list if citation is in description
+                    if "(Citation:" in ext_ref['description']:
+                        continue
+
+                    if ext_ref['source_name'] not in self.references:
+                        new_ref = {}
+
+                        new_ref['description'] = ext_ref["description"]
+                        if ext_ref.get('url'):
+                            new_ref['url'] = ext_ref['url']
+                        new_ref['sname'] = ext_ref['source_name']
+                        new_ref['number'] = None
+
+                        self.references[new_ref['sname']] = new_ref
+
+    def cite(self, source_name):
+        """Given a source name, return its reference and number it if this
+           is the first citation. Return None if it is not in the registry
+        """
+
+        reference = self.references.get(source_name)
+
+        if reference is not None and not reference['number']:
+            self.cited.append(reference)
+            reference['number'] = len(self.cited)
+
+        return reference
+
+    def get_number(self, source_name):
+        """Given a source name, return the number of the reference, numbering
+           it if needed. Return NOT_FOUND if it is not in the registry
+        """
+
+        reference = self.cite(source_name)
+        if reference is None:
+            return config.NOT_FOUND
+        return reference['number']
+
+    def get_html(self, source_name):
+        """Given a source name, cite the reference and return its html
+           marker. Return an empty string if it is not in the registry
+        """
+
+        reference = self.cite(source_name)
+        if reference is None:
+            return ""
+
+        number = reference['number']
+
+        if not reference.get("url"):
+            return config.reference_marker_template_no_url.format(number, number, reference['sname'], number)
+        return config.reference_marker_template.format(number, number, reference['sname'], reference['url'], number - 1, number - 1, number)
+
+    def get_cited_references(self):
+        """Return the cited references sorted by number, used for the
+           bottom of the page
+        """
+
+        return list(self.cited)
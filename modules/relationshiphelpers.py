@@ -1,13 +1,121 @@
-from stix2 import MemoryStore, Filter
-import json
-from itertools import chain
+from collections.abc import Mapping
+from datetime import datetime
+from stix2.base import _STIXBase
+from stix2.utils import format_datetime
+from . import stixindex
 
-def query_all(srcs, filters):
-    """return the union of a query across multiple memorystores"""
-    
-    return list(chain.from_iterable(
-        src.query(filters) for src in srcs
-    ))
+# Module that builds the relationships between the objects of all domains in
+# a single pass. The mappings returned by the named helpers below are views
+# of that graph
+
+# tuple of memory stores => relationship graph
+graphs = {}
+
+def get_active_object(srcs, stix_id):
+    """Given a stix id, return the non revoked object from the last domain
+       that has it, or None if it is revoked or missing in every domain
+    """
+
+    for src in reversed(srcs):
+        obj = stixindex.get_object(src, stix_id, active_only=True)
+        if obj is not None:
+            return obj
+    return None
+
+def get_json_value(value):
+    """Given a property value of a stix object, return it as the plain JSON
+       type it serializes to. Nested stix objects such as external references
+       are returned as views
+    """
+
+    if isinstance(value, datetime):
+        return format_datetime(value)
+    if isinstance(value, _STIXBase):
+        return ObjectView(value)
+    if isinstance(value, list):
+        return [get_json_value(item) for item in value]
+    return value
+
+class ObjectView(Mapping):
+    """Read-only mapping of the properties of a stix object. Shares the data
+       of the stix object instead of copying it, values are converted to
+       plain JSON types when they are read
+    """
+
+    __slots__ = ("obj",)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __getitem__(self, key):
+        return get_json_value(self.obj[key])
+
+    def __iter__(self):
+        return iter(self.obj)
+
+    def __len__(self):
+        return len(self.obj)
+
+def build_relationship_graph(srcs):
+    """Build the forward and reverse adjacency lists of every
+       (source type, relationship type, target type) triple in one pass
+       over the relationships of all domains
+       params:
+         srcs: memorystores for enterprise, mobile and pre-attack, in an array
+    """
+
+    graph = {
+        # (src_type, rel_type, target_type) => source id => [{object, relationship}]
+        "forward": {},
+        # (src_type, rel_type, target_type) => target id => [{object, relationship}]
+        "reverse": {}
+    }
+
+    # object => read-only view of the object, shared by every mapping.
+    # Keyed by the python object since the same stix id can differ between
+    # domains
+    views = {}
+
+    def to_view(obj):
+        if id(obj) not in views:
+            views[id(obj)] = ObjectView(obj)
+        return views[id(obj)]
+
+    for src in srcs:
+        for relationship in stixindex.get_objects_of_type(src, 'relationship', active_only=True):
+            source_ref = relationship['source_ref']
+            target_ref = relationship['target_ref']
+            key = (source_ref.split('--')[0], relationship['relationship_type'], target_ref.split('--')[0])
+
+            forward = graph['forward'].setdefault(key, {}).setdefault(source_ref, [])
+            reverse = graph['reverse'].setdefault(key, {}).setdefault(target_ref, [])
+
+            # Skip relationships targeting a revoked object
+            target = get_active_object(srcs, target_ref)
+            if target is not None:
+                forward.append({
+                    "object": to_view(target),
+                    "relationship": to_view(relationship)
+                })
+
+            source = get_active_object(srcs, source_ref)
+            if source is not None:
+                reverse.append({
+                    "object": to_view(source),
+                    "relationship": to_view(relationship)
+                })
+
+    return graph
+
+def get_relationship_graph(srcs):
+    """Given the memorystores of all domains, return their relationship
+       graph. The graph is built the first time it is requested
+    """
+
+    key = tuple(srcs)
+    if key not in graphs:
+        graphs[key] = build_relationship_graph(srcs)
+    return graphs[key]
 
 def get_related(srcs, src_type, rel_type, target_type, reverse=False):
     """build relationship mappings
@@ -19,69 +127,8 @@ def get_related(srcs, src_type, rel_type, target_type, reverse=False):
          reverse: build reverse mapping of target to source
     """
 
-    relationships = query_all(srcs, [
-        Filter('type', '=', 'relationship'),
-        Filter('relationship_type', '=', rel_type),
-        Filter('revoked', '=', False)
-    ])
-
-    # stix_id => [ ids of objects with relationships with stix_id ]
-    id_to_related = {} 
-
-    # build the dict
-    for relationship in relationships:
-        if (src_type in relationship.source_ref and target_type in relationship.target_ref):
-            if (relationship.source_ref in id_to_related and not reverse) or (relationship.target_ref in id_to_related and reverse):
-                if not reverse: 
-                    id_to_related[relationship.source_ref].append({
-                        "relationship": relationship,
-                        "id": relationship.target_ref
-                    })
-                else: 
-                    id_to_related[relationship.target_ref].append({
-                        "relationship": relationship, 
-                        "id": relationship.source_ref
-                    })
-            else:
-                if not reverse: 
-                    id_to_related[relationship.source_ref] = [{
-                        "relationship": relationship, 
-                        "id": relationship.target_ref
-                    }]
-                else:
-                    id_to_related[relationship.target_ref] = [{
-                        "relationship": relationship, 
-                        "id": relationship.source_ref
-                    }]
-    # all objects of target type
-    if not reverse:
-        targets = query_all(srcs, [
-            Filter('type', '=', target_type),
-            Filter('revoked', '=', False)
-        ])
-    else:
-        targets = query_all(srcs, [
-            Filter('type', '=', src_type),
-            Filter('revoked', '=', False)
-        ])
-
-    id_to_target = {}
-    # build the dict
-    for target in targets:
-        id_to_target[target.id] = target
-
-    output = {}
-    for stix_id in id_to_related:
-        value = []
-        for related in id_to_related[stix_id]:
-            if not related["id"] in id_to_target:
-                continue # targetting a revoked object
-            value.append({
-                "object": json.loads(id_to_target[related["id"]].serialize()),
-                "relationship": json.loads(related["relationship"].serialize())
-            })
-        output[stix_id] = value
-    return output
+    direction = "reverse" if reverse else "forward"
+    return get_relationship_graph(srcs)[direction].get((src_type, rel_type, target_type), {})
 
 
 # tool:group
@@ -189,9 +236,3 @@ def parent_technique_of(srcs):
         mobile and pre
     """
     return get_related(srcs, "attack-pattern", "subtechnique-of", "attack-pattern")
-
-def load(url):
-    """Load stix data from file"""
-    src = MemoryStore()
-    src.load_from_file(url)
-    return src
@@ -1,6 +1,8 @@
 import json
 import os
 from . import config
+from . import outputwriter
+from . import siteurl
 from datetime import datetime
 
 def generate():
@@ -28,8 +30,7 @@ def generate_resources_page():
         "presentations": presentations
     })
     # write markdown to file
-    with open(os.path.join(config.resources_markdown_path, "resources.md"), "w", encoding='utf8') as md_file:
-        md_file.write(resources_content)
+    outputwriter.write_file(os.path.join(config.resources_markdown_path, "resources.md"), resources_content)
 
 def generate_faq_page():
     """Responsible for compiling faq json into faq markdown file
@@ -42,12 +43,12 @@ def generate_faq_page():
     for i,section in enumerate(faqdata["sections"]):
         for j,item in enumerate(section["questions"]):
             item["id"] = f"faq-{i}-{j}"
+            item["answer"] = siteurl.prefix_links(item["answer"])
     
     # get markdown
     faq_content = config.faq_md + json.dumps(faqdata)
     # write markdown to file
-    with open(os.path.join(config.resources_markdown_path, "faq.md"), "w", encoding='utf8') as md_file:
-        md_file.write(faq_content)
+    outputwriter.write_file(os.path.join(config.resources_markdown_path, "faq.md"), faq_content)
 
 def generate_changelog_page():
     """Responsible for compiling original changelog markdown into changelog markdown file
@@ -61,8 +62,7 @@ def generate_changelog_page():
     # Append changelog to mardown file
     changelog_md = config.changelog_md + changelog
 
-    with open(os.path.join(config.resources_markdown_path, "changelog.md"), "w", encoding='utf8') as md_file:
-        md_file.write(changelog_md)
+    outputwriter.write_file(os.path.join(config.resources_markdown_path, "changelog.md"), changelog_md)
 
 def generate_attackcon_page():
     """Responsible for compiling ATT&CKcon json into attackcon markdown file
@@ -76,8 +76,7 @@ def generate_attackcon_page():
 
     attackcon_content = config.attackcon_md + json.dumps(attackcon)
     # write markdown to file
-    with open(os.path.join(config.resources_markdown_path, "attackcon.md"), "w", encoding='utf8') as md_file:
-        md_file.write(attackcon_content)
+    outputwriter.write_file(os.path.join(config.resources_markdown_path, "attackcon.md"), attackcon_content)
     
 def generate_training_pages():
     """ Responsible for generating the markdown pages of the training pages """
@@ -91,14 +90,12 @@ def generate_training_pages():
     training_md = config.training_md + json.dumps(data)
 
     # write markdown to file
-    with open(os.path.join(config.resources_markdown_path, "training.md"), "w", encoding='utf8') as md_file:
-        md_file.write(training_md)
+    outputwriter.write_file(os.path.join(config.resources_markdown_path, "training.md"), training_md)
 
     # CTI training
     training_cti_md = config.training_cti_md + json.dumps(data)
 
     # write markdown to file
-    with open(os.path.join(config.resources_markdown_path, "training_cti.md"), "w", encoding='utf8') as md_file:
-        md_file.write(training_cti_md)
+    outputwriter.write_file(os.path.join(config.resources_markdown_path, "training_cti.md"), training_cti_md)
 
 
@@ -1,41 +1,353 @@
+import gzip
 import os
-import bleach, re
+import re
 import json
 import html
+import shutil
 from . import config
+from . import incremental
+from . import postbuild
+from . import util
 
-def generate_index():
-    index = []
-    for root, dirs, files in os.walk(config.web_directory):
-        # don't walk previous routes
-        skip = False
-        for versions_dir in ["previous", "versions"]:
-            if root.startswith(os.path.join(config.web_directory, versions_dir)): skip = True
-        if skip: continue
-        
-        for thefile in filter(lambda fname: fname.endswith(".html"), files):
-            thepath = os.path.join(root, thefile)
-            cleancontent, skipindex, title = clean(thepath)
-            if not skipindex:
-                # if title == "":
-                #     print(thepath, "has generic title")
-                #     title = "MITRE ATT&CK&reg;"
-
-                index.append({
-                    "id": len(index),
-                    "title": title,
-                    "path": thepath[6:], # strip output prefix
-                    "content": cleancontent
-                })
-    if not os.path.isdir(config.web_directory):
-        os.makedirs(config.web_directory)
-        
-    json.dump(index, open(os.path.join(config.web_directory, "index.json"), mode="w",  encoding="utf-8"), indent=2)
+# Module that builds the search index of the browser, output/search/. The
+# manifest holds the title and path of every page. The terms of the pages
+# are split in term shards by prefix, with the documents and scores of every
+# term, so a query only loads the term shards of its words. The content of
+# the pages is split in shards by section, loaded for the previews of the
+# results shown. The group, software, technique, mitigation, tactic and
+# matrix pages add their search document from their data while they are
+# generated, see config.search_data_keys. The other pages, hand-written or
+# left unchanged by an incremental build, are cleaned from their html by the
+# post-build pass. Records are written in the order the pages are found in
+# the web directory
+
+# Comments and tags, removed from the indexed content
+tag_regex = re.compile(r"<!--.*?-->|<[^>]*>", re.DOTALL)
+
+whitespace_regex = re.compile(r"[\n ]+")
+
+title_regex = re.compile(r"<title>(.*)\|.*</title>")
+
+# Terms of the term shards, same as the words of a query in search.js
+term_regex = re.compile(r"[a-z0-9]+")
+
+# Line of the Pelican header of a page with its output path
+save_as_regex = re.compile(r"^save_as:(.*)$", re.IGNORECASE | re.MULTILINE)
+
+# Keys of nested page data that are links and numbers, not shown as text
+hidden_data_keys = {"filename", "number", "path", "sname", "url"}
+
+# Keys of nested page data with a domain, shown with its display name
+domain_data_keys = {"domain"}
+
+# STIX ids of page data, only used to link the pages
+stix_id_regex = re.compile(r"^[a-z0-9-]+--[0-9a-f-]+$")
+
+# absolute output path => (content, skipindex, title) of the pages that
+# added their search document while they were generated, by this build or,
+# for the pages an incremental build skips, by the previous one
+documents = {}
+
+def get_documents_path():
+    """Return the path of the search documents of the generated pages of
+       the previous build, kept for the pages an incremental build skips
+    """
+
+    return os.path.join(config.incremental_cache_directory, "search.json")
+
+def is_enabled():
+    """Return True if the search index is built"""
+
+    return bool(config.args.build) and 'search' in config.args.build
+
+def get_data_text(value):
+    """Given a value of the data of a page, return the text of its strings
+       as the page shows them
+    """
+
+    if isinstance(value, str):
+        return "" if stix_id_regex.match(value) else value
+    if isinstance(value, dict):
+        return " ".join(get_data_text(util.get_domain_alias(item) if key in domain_data_keys else item) for key, item in value.items() if key not in hidden_data_keys)
+    if isinstance(value, list):
+        return " ".join(get_data_text(item) for item in value)
+
+    return ""
+
+def add_page(header, title, data, keys):
+    """Given the Pelican header of a generated page, its title, its data
+       and the keys of the data the page shows, add the search document of
+       the page. Deprecated pages are not indexed, like their robots meta
+       tag asks
+    """
+
+    if not is_enabled():
+        return
+
+    save_as = save_as_regex.search(header).group(1).strip()
+
+    content = strip_tags(clean_line(" ".join(get_data_text(data.get(key)) for key in keys)))
+
+    skipindex = bool(data.get('deprecated')) or content == "" or content == " "
+
+    documents[os.path.abspath(os.path.join(config.web_directory, save_as))] = (content, skipindex, title)
+
+def is_indexed(path):
+    """Given a path of the output tree, return True if it is a page of the
+       web directory the search index visits, see
+       config.post_build_directories
+    """
+
+    return path.endswith(".html") and postbuild.is_in_web_directory(path) and postbuild.is_visited("Search Index", path)
+
+def accepts_page(path):
+    """Given a path of the output tree, return True if the page has to be
+       cleaned
+    """
+
+    return is_indexed(path) and os.path.abspath(path) not in documents
+
+def visit_page(path, page_html):
+    """Return the search document of the page"""
+
+    return clean_lines(page_html.splitlines(True))
+
+def start():
+    """Remove the search index of a previous build and, for an incremental
+       build, add the search documents of the pages it did not generate
+    """
+
+    if incremental.is_enabled() and not config.args.clean and os.path.isfile(get_documents_path()):
+        with open(get_documents_path(), mode="r", encoding="utf-8") as documents_file:
+            for path, document in json.load(documents_file).items():
+                documents.setdefault(path, tuple(document))
+
+    search_path = os.path.join(config.web_directory, config.search_directory)
+
+    # Shards of a previous build may not exist anymore
+    if os.path.isdir(search_path):
+        shutil.rmtree(search_path)
+
+    # Monolithic index of previous builds, replaced by the shards
+    if os.path.isfile(os.path.join(config.web_directory, "index.json")):
+        os.remove(os.path.join(config.web_directory, "index.json"))
+
+def get_visitor():
+    """Return the post-build visitor that builds the search index"""
+
+    return {
+        "name": "Search Index",
+        "accepts": accepts_page,
+        "visit": visit_page,
+        "finish": generate_index,
+        "start": start
+    }
+
+def get_shard_section(path):
+    """Given the path of a page relative to the web directory, return the
+       section its search document is sharded under: the first directory of
+       the path
+    """
+
+    parts = path.replace(os.sep, "/").strip("/").split("/")
+
+    return parts[0] if len(parts) > 1 else "general"
+
+def open_shard(section, part):
+    """Given a section and the number of the part of the section, create
+       the shard file and return the shard
+    """
+
+    shard = {
+        "name": f"{section}-{part}",
+        "section": section,
+        "part": part,
+        "documents": 0
+    }
+    shard['file'] = open(os.path.join(config.web_directory, config.search_directory, shard['name'] + ".json"), mode="w", encoding="utf-8")
+    shard['file'].write("[")
+
+    return shard
+
+def add_search_file(filename):
+    """Given the filename of a file of the search index, write its
+       compressed copy if asked and add it to the output tree
+    """
+
+    path = os.path.join(config.web_directory, config.search_directory, filename)
+
+    postbuild.add_file(path)
+
+    if getattr(config.args, 'compress_search', False):
+        with open(path, "rb") as search_file:
+            data = search_file.read()
+        # mtime=0, rebuilding the same file gives the same file
+        with open(path + ".gz", "wb") as compressed_file:
+            with gzip.GzipFile(filename=filename, mode="wb", fileobj=compressed_file, mtime=0) as gzip_file:
+                gzip_file.write(data)
+        postbuild.add_file(path + ".gz")
+
+def close_shard(shard, manifest):
+    """Given a shard, finish its file, write its compressed copy if asked
+       and add it to the manifest
+    """
+
+    shard['file'].write("]")
+    shard['file'].close()
+
+    filename = shard['name'] + ".json"
+    add_search_file(filename)
+
+    manifest['shards'][shard['name']] = {
+        "file": filename,
+        "documents": shard['documents']
+    }
+
+def get_terms(content):
+    """Given the content of a page, return its terms, in order"""
+
+    # ATT&CK and attack are the same term, see FlexSearch.registerMatcher
+    return term_regex.findall(content.lower().replace("att&ck", "attack"))
+
+def add_terms(terms, document_id, content):
+    """Given term => postings, the id of a document and its content, add the
+       document to the postings of its terms with the score of the term: the
+       earlier it first occurs in the page, the higher
+    """
+
+    document_terms = get_terms(content)
+    first_positions = {}
+
+    for position, term in enumerate(document_terms):
+        first_positions.setdefault(term, position)
+
+    for term, position in first_positions.items():
+        score = config.search_term_resolution - (config.search_term_resolution * position) // len(document_terms)
+        terms.setdefault(term, []).extend((document_id, score))
+
+def write_term_shards(terms, manifest):
+    """Given term => postings, write the term shards, each with the terms of
+       a prefix, and add them to the manifest
+    """
+
+    prefixes = {}
+    for term, postings in terms.items():
+        prefixes.setdefault(term[:config.search_term_prefix_length], {})[term] = postings
+
+    for prefix in sorted(prefixes):
+        filename = f"terms-{prefix}.json"
+
+        with open(os.path.join(config.web_directory, config.search_directory, filename), mode="w", encoding="utf-8") as term_file:
+            json.dump(prefixes[prefix], term_file, separators=(",", ":"), sort_keys=True)
+
+        add_search_file(filename)
+
+        manifest['terms'][prefix] = filename
+
+def generate_index(pages):
+    """Given the list of (path, search document) of the pages cleaned by the
+       post-build pass, write the search index of the pages of the web
+       directory: a manifest with the title and path of every page, term
+       shards with the documents of the terms, split by prefix, and shards
+       with the content of the pages, split by section. Return the number of
+       pages indexed and skipped, how many documents were added while the
+       pages were generated and the number of shards and term shards
+    """
+
+    stats = {
+        "indexed": 0,
+        "skipped": 0,
+        "documents": 0,
+        "shards": 0,
+        "term_shards": 0
+    }
+
+    search_path = os.path.join(config.web_directory, config.search_directory)
+
+    if not os.path.isdir(search_path):
+        os.makedirs(search_path)
+
+    cleaned = dict(pages)
+
+    manifest = {
+        "shards": {},
+        "terms": {},
+        "term_prefix_length": config.search_term_prefix_length,
+        "documents": []
+    }
+
+    # term => flat list of document id, score of the documents of the term
+    terms = {}
+
+    # section => shard being written
+    shards = {}
+
+    for thepath in filter(is_indexed, postbuild.tree['files']):
+        document = documents.get(os.path.abspath(thepath))
+        if document is not None:
+            stats['documents'] += 1
+        else:
+            document = cleaned[thepath]
+
+        cleancontent, skipindex, title = document
+
+        if skipindex:
+            stats['skipped'] += 1
+            continue
+
+        path = thepath[6:] # strip output prefix
+        section = get_shard_section(os.path.relpath(thepath, config.web_directory))
+
+        shard = shards.get(section)
+        if shard and shard['documents'] == config.search_shard_size:
+            close_shard(shard, manifest)
+            shard = shards[section] = open_shard(section, shard['part'] + 1)
+        elif not shard:
+            shard = shards[section] = open_shard(section, 1)
+
+        if shard['documents']:
+            shard['file'].write(",")
+
+        json.dump({
+            "id": stats['indexed'],
+            "content": cleancontent
+        }, shard['file'], separators=(",", ":"))
+
+        manifest['documents'].append({
+            "id": stats['indexed'],
+            "title": title,
+            "path": path,
+            "shard": shard['name']
+        })
+
+        add_terms(terms, stats['indexed'], cleancontent)
+
+        shard['documents'] += 1
+        stats['indexed'] += 1
+
+    for shard in shards.values():
+        close_shard(shard, manifest)
+
+    write_term_shards(terms, manifest)
+
+    with open(os.path.join(search_path, "manifest.json"), mode="w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, separators=(",", ":"))
+
+    postbuild.add_file(os.path.join(search_path, "manifest.json"))
+
+    stats['shards'] = len(manifest['shards'])
+    stats['term_shards'] = len(manifest['terms'])
+
+    # Documents of the pages on disk, for the next incremental build
+    if not os.path.isdir(config.incremental_cache_directory):
+        os.makedirs(config.incremental_cache_directory)
+    with open(get_documents_path(), mode="w", encoding="utf-8") as documents_file:
+        json.dump({path: document for path, document in documents.items() if os.path.isfile(path)}, documents_file)
 
     # if (config.subdirectory):
     #     # update search base url to subdirectory
     #     search_file_path = os.path.join(config.web_directory, "theme", "scripts", "search_babelized.js")
-        
+
     #     if os.path.exists(search_file_path):
     #         search_contents = ""
 
@@ -46,7 +358,9 @@ def generate_index():
     #         with open(search_file_path, mode="w", encoding='utf8') as search_file:
     #             search_file.write(search_contents)
 
-    
+    return stats
+
+
 skiplines = ["breadcrumb-item", "nav-link"]
 def skipline(line):
     for skip in skiplines:
@@ -63,33 +377,45 @@ def clean_line(line):
 
     return line
 
-def clean(filepath):
-    """clean the file of all HTML tags and unnecessary data"""
-    f = open(filepath, mode="r", encoding="utf-8")
-    lines = f.readlines()
-    f.close()
+def strip_tags(content):
+    """Given html, return its text: without comments and tags, on one line
+       and with character references decoded
+    """
+
+    out = tag_regex.sub("", content) #remove tags
+    out = whitespace_regex.sub(" ", out) # remove extra newlines, smush to 1 line
+    return html.unescape(out) # fix &amp and &#nnn unicode escaping
 
-    content = ""
+def clean_lines(lines):
+    """clean the lines of a page of all HTML tags and unnecessary data"""
+
+    content = []
     title = ""
     skipindex = False
     indexing = False
+
     for line in lines:
         if (not skipline(line)) and indexing:
-            content += clean_line(line) + "\n"
-        if "<!--start-indexing-for-search-->" in line: 
+            content.append(clean_line(line) + "\n")
+        if "<!--start-indexing-for-search-->" in line:
             indexing = True
-        if "<!--stop-indexing-for-search-->" in line: 
+        if "<!--stop-indexing-for-search-->" in line:
             indexing = False
         if "<title>" in line:
             # e.g [Credential Access - Enterprise | MITRE ATT&CK&reg;] becomes [Credential Access - Enterprise]
-            match = re.search(r"<title>(.*)\|.*</title>", line)
+            match = title_regex.search(line)
             if match: title = match.group(1).strip()
         if 'http-equiv="refresh"' in line: skipindex = True
         if '<meta name="robots" content="noindex, nofollow">' in line: skipindex = True
 
-    out = bleach.clean(content, tags=[], strip=True) #remove tags
-    out = re.sub(r"[\n ]+", " ", out) # remove extra newlines, smush to 1 line
-    out = html.unescape(out) # fix &amp and &#nnn unicode escaping
+    out = strip_tags("".join(content))
 
     skipindex = skipindex or out == "" or out == " "
     return out, skipindex, title
+
+def clean(filepath):
+    """clean the file of all HTML tags and unnecessary data"""
+
+    # Read line by line, only the indexed lines are kept
+    with open(filepath, mode="r", encoding="utf-8") as f:
+        return clean_lines(f)
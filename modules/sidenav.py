@@ -0,0 +1,38 @@
+import json
+import os
+from . import config
+from . import outputwriter
+from . import pagerenderer
+
+# Module that writes the side navigation of every section once. Pages only
+# carry the key of their side navigation. The tree is rendered once into a
+# fragment, sidenav/<key>.html, that navigation.js loads into the pages of
+# the section and marks the active path of
+
+# key => tree of the side navigations of this build, read by the native
+# renderer
+side_navs = {}
+
+def get_side_nav_path(key):
+    """Given the key of a side navigation, return the path of its file"""
+
+    return os.path.join(config.side_nav_directory, key + ".json")
+
+def add_side_nav(key, side_nav_data):
+    """Given a key and the tree of a side navigation, write the tree and the
+       markdown of its fragment and return the key pages refer to it with
+    """
+
+    for directory in [config.side_nav_directory, config.side_nav_markdown_path]:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    side_navs[key] = side_nav_data
+
+    outputwriter.write_file(get_side_nav_path(key), json.dumps(side_nav_data))
+
+    subs = config.side_nav_md.substitute({"key": key})
+
+    pagerenderer.write_page(os.path.join(config.side_nav_markdown_path, key + ".md"), subs, {"menu": key})
+
+    return key
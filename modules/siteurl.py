@@ -0,0 +1,48 @@
+import re
+from . import config
+
+# Module that prefixes the links of the site with the url the site is hosted
+# under, so that a site hosted in a subdirectory gets its links while the
+# pages are rendered. Templates use SITEURL and the url filter of
+# pelicanconf.py, the html of the page data and of the hand-written pages
+# goes through prefix_links
+
+# Site absolute links of html: href and src attributes and redirections
+link_regex = re.compile(r"""((?:href|src)=["']|content="0; url=)/(?!/)""")
+
+def get_site_url():
+    """Return the url the site is hosted under, e.g /subdirectory. Empty if
+       the site is hosted at the root
+    """
+
+    if config.subdirectory:
+        return "/" + config.subdirectory.replace("\\", "/")
+
+    return ""
+
+def url(link, site_url=None):
+    """Given a link, return it prefixed with the site url if it is site
+       absolute, e.g /x/y => /subdirectory/x/y. The site url of the build is
+       used if none is given
+    """
+
+    if site_url is None:
+        site_url = get_site_url()
+
+    if link.startswith("/") and not link.startswith("//"):
+        return site_url + link
+
+    return link
+
+def prefix_links(html, site_url=None):
+    """Given html, return it with its site absolute links prefixed with the
+       site url. The site url of the build is used if none is given
+    """
+
+    if site_url is None:
+        site_url = get_site_url()
+
+    if not site_url:
+        return html
+
+    return link_regex.sub(lambda match: match.group(1) + site_url + "/", html)
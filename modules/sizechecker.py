@@ -1,15 +1,22 @@
 import os
 from . import config
+from . import postbuild
 
-def check_output_size():
+def accepts_file(path):
+    """Sizes are read from the file system once every file is written, no
+       file is visited
+    """
+
+    return False
+
+def finish(files):
     """Check output folder size"""
 
     # In base 10
     MB_CONVERSION = 1000000
     total_sum = 0
-    for root, _, files in os.walk("output"):
-        for name in files:
-            total_sum = total_sum + os.path.getsize(os.path.join(root, name))
+    for name in postbuild.tree['files']:
+        total_sum = total_sum + os.path.getsize(name)
     
     size_in_megabytes = total_sum/MB_CONVERSION
 
@@ -22,4 +29,19 @@ def check_output_size():
     else:
         exit_code = config.SUCCESS
     
-    return exit_code, size_in_megabytes
\ No newline at end of file
+    return exit_code, size_in_megabytes
+
+def get_visitor():
+    """Return the post-build visitor that checks the output folder size"""
+
+    return {
+        "name": "Size",
+        "accepts": accepts_file,
+        "visit": None,
+        "finish": finish
+    }
+
+def check_output_size():
+    """Check output folder size"""
+
+    return postbuild.get_result(get_visitor())
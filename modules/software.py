@@ -1,11 +1,15 @@
 import os
-import json
 import collections
-import re
 import time
-import markdown
+from . import citationrewriter
 from . import config
+from . import markdownrenderer
+from . import pagerenderer
+from . import parallel
+from . import search
+from . import sidenav
 from . import stixhelpers
+from . import referenceregistry
 from . import util
 
 def generate():
@@ -32,22 +36,19 @@ def generate_markdown_files():
     
     data['software_list_len'] = str(len(config.software_list))
 
-    side_menu_data = util.get_side_menu_data("software", "/software/", config.software_list)
+    side_menu_data = sidenav.add_side_nav("software", util.get_side_menu_data("software", "/software/", config.software_list))
     data['side_menu_data'] = side_menu_data
 
-    side_menu_mobile_view_data = util.get_side_menu_mobile_view_data("software", "/software/", config.software_list, group_by)
+    side_menu_mobile_view_data = sidenav.add_side_nav("software-mobile", util.get_side_menu_mobile_view_data("software", "/software/", config.software_list, group_by))
     data['side_menu_mobile_view_data'] = side_menu_mobile_view_data
 
     data['software_table'] = get_software_table_data()
     
-    subs = config.software_index_md + json.dumps(data)
-
-    with open(os.path.join(config.software_markdown_path, "overview.md"), "w", encoding='utf8') as md_file:
-        md_file.write(subs)
+    pagerenderer.write_page(os.path.join(config.software_markdown_path, "overview.md"), config.software_index_md, data)
+    search.add_page(config.software_index_md, "Software", data, config.search_data_keys['software_index'])
 
     # Create the markdown for the enterprise groups in the stix
-    for software in config.software_list:
-        generate_software_md(software, side_menu_data, side_menu_mobile_view_data)
+    parallel.generate_pages(generate_software_md, config.software_list, side_menu_data, side_menu_mobile_view_data)
     
 def generate_software_md(software,side_menu_data,side_menu_mobile_view_data):
     """Responsible for generating given software markdown"""
@@ -86,25 +87,22 @@ def generate_software_md(software,side_menu_data,side_menu_mobile_view_data):
         
         ext_ref = software["external_references"]
         
-        # Get initial reference list
-        reference_list = []
-        # Decleared as an object to be able to pass by reference
-        next_reference_number = {}
-        next_reference_number['value'] = 1
-        reference_list = util.update_reference_list(reference_list, software)
+        # Get initial references
+        references = referenceregistry.ReferenceRegistry()
+        references.add_external_references(software)
                          
         # Get description
         if software.get("description"):
             citations_from_descr = util.get_citations_from_descr(software['description'])
-            data['descr'] = markdown.markdown(software["description"])
+            data['descr'] = markdownrenderer.render(software["description"])
             data['descr'] = util.filter_urls(data['descr'])
-            data['descr'] = util.get_descr_reference_sect(citations_from_descr, reference_list, next_reference_number, data['descr'])
+            data['descr'] = util.get_descr_reference_sect(citations_from_descr, references, data['descr'])
 
             if 'x_mitre_deprecated' in software:
                 data['deprecated'] = True
 
         # Get techniques used by software
-        data['technique_table_data'] = get_techniques_used_by_software_data(software, reference_list, next_reference_number)
+        data['technique_table_data'] = get_techniques_used_by_software_data(software, references)
 
         # Get navigator layers for this sofftware
         layers = util.get_navigator_layers(
@@ -117,14 +115,12 @@ def generate_software_md(software,side_menu_data,side_menu_mobile_view_data):
 
         data["layers"] = []
         for layer in layers:
-            with open(os.path.join(config.software_markdown_path, "-".join([data['attack_id'], "techniques", layer["domain"]]) + ".md"), "w", encoding='utf8') as layer_json:
-                subs = config.layer_md.substitute({
-                    "attack_id": data["attack_id"],
-                    "path": "software/" + data["attack_id"],
-                    "domain": layer["domain"]
-                })
-                subs = subs + layer["layer"]
-                layer_json.write(subs)
+            subs = config.layer_md.substitute({
+                "attack_id": data["attack_id"],
+                "path": "software/" + data["attack_id"],
+                "domain": layer["domain"]
+            })
+            pagerenderer.write_page(os.path.join(config.software_markdown_path, "-".join([data['attack_id'], "techniques", layer["domain"]]) + ".md"), subs, layer["layer"])
             data["layers"].append({
                 "domain": layer["domain"],
                 "filename": "-".join([data["attack_id"], layer["domain"], "layer"]) + ".json",
@@ -133,12 +129,12 @@ def generate_software_md(software,side_menu_data,side_menu_mobile_view_data):
             })
         
         # Get aliases descriptions
-        data['alias_descriptions'] = util.get_alias_data(software.get("x_mitre_aliases")[1:], ext_ref, reference_list, next_reference_number)
+        data['alias_descriptions'] = util.get_alias_data(software.get("x_mitre_aliases")[1:], ext_ref, references)
 
         # Get group data of groups that use software
-        data['groups'] = get_groups_using_software(software, reference_list, next_reference_number)
+        data['groups'] = get_groups_using_software(software, references)
 
-        data['bottom_ref'] = util.sort_reference_list(reference_list)
+        data['bottom_ref'] = references.get_cited_references()
 
         # Get aliases list
         if isinstance(software.get("x_mitre_aliases"), collections.Iterable):
@@ -153,11 +149,10 @@ def generate_software_md(software,side_menu_data,side_menu_mobile_view_data):
             data['platform_list'] = software["x_mitre_platforms"]
 
         subs = config.software_md.substitute(data)
-        subs = subs + json.dumps(data)
 
-        # Write out the markdown file
-        with open(os.path.join(config.software_markdown_path, data['attack_id'] + ".md"), "w", encoding='utf8') as md_file:
-            md_file.write(subs)
+        # Write out the page
+        pagerenderer.write_page(os.path.join(config.software_markdown_path, data['attack_id'] + ".md"), subs, data)
+        search.add_page(subs, data['name'] + ", Software " + data['attack_id'], data, config.search_data_keys['software'])
 
 def get_software_table_data():
     """Responsible for generating software table data for the software 
@@ -174,15 +169,9 @@ def get_software_table_data():
             row['name'] = software["name"]
 
             if software.get("description"):
-                row['descr'] = software["description"]
-                citation_temp = "(Citation: {})"
-                p = re.compile('\(Citation: (.*?)\)')
-                found_citations = p.findall(row['descr'])
-
-                for citation in found_citations:
-                    row['descr'] = row['descr'].replace(citation_temp.format(citation), "")
+                row['descr'] = citationrewriter.strip_citations(software["description"])
 
-                row['descr'] = markdown.markdown(row['descr'])
+                row['descr'] = markdownrenderer.render(row['descr'])
                 row['descr'] = util.filter_urls(row['descr'])
                 if software.get('x_mitre_deprecated'):
                     row['deprecated'] = True
@@ -199,7 +188,7 @@ def get_software_table_data():
     
     return software_table_data
 
-def get_groups_using_software(software, reference_list, next_reference_number):
+def get_groups_using_software(software, references):
     """Given a software object, return group list with id and name of
        groups
     """
@@ -223,11 +212,11 @@ def get_groups_using_software(software, reference_list, next_reference_number):
 
                 if group['relationship'].get('description'):
                     # Get filtered description
-                    row['descr'] = util.get_filtered_description(reference_list, next_reference_number, group)
+                    row['descr'] = util.get_filtered_description(references, group)
                 elif group['relationship'].get('external_references'):
 
-                    # Update reference list
-                    reference_list = util.update_reference_list(reference_list, group['relationship'])
+                    # Update references
+                    references.add_external_references(group['relationship'])
 
                     row['refs'] = []
 
@@ -235,7 +224,7 @@ def get_groups_using_software(software, reference_list, next_reference_number):
                         if ext_ref.get('source_name'):
                             ref = {}
                             ref['url'] = ext_ref.get('url')
-                            ref['number'] = util.find_reference_number(reference_list, next_reference_number, ext_ref['source_name'])                          
+                            ref['number'] = references.get_number(ext_ref['source_name'])                          
 
                         row['refs'].append(ref) 
     
@@ -243,7 +232,7 @@ def get_groups_using_software(software, reference_list, next_reference_number):
             
     return groups
 
-def get_techniques_used_by_software_data(software, reference_list, next_reference_number):
+def get_techniques_used_by_software_data(software, references):
     """Given a software and its reference list, get the techniques used by the
        software. Check the reference list for citations, if not found
        in list, add it.
@@ -260,7 +249,7 @@ def get_techniques_used_by_software_data(software, reference_list, next_referenc
         for technique in techniques_used_by_software:
             # Do not add if technique is deprecated
             if not technique['object'].get('x_mitre_deprecated'):
-                technique_list = util.technique_used_helper(technique_list, technique, reference_list, next_reference_number)
+                technique_list = util.technique_used_helper(technique_list, technique, references)
             
     technique_data = []
     for item in technique_list:
@@ -0,0 +1,165 @@
+import copyreg
+import hashlib
+import os
+import pickle
+import stix2
+from stix2.base import _STIXBase
+from . import config
+
+# Module that keeps parsed STIX bundles on disk so that builds with unchanged
+# bundles do not need to parse the JSON and construct the stix2 objects again
+
+# Bump this whenever the format of the cached data changes
+CACHE_FORMAT_VERSION = 1
+
+def get_bundle_hash(bundle_path):
+    """Given the path of a STIX bundle, return the SHA-256 of its content"""
+
+    sha256 = hashlib.sha256()
+
+    with open(bundle_path, "rb") as bundle:
+        for chunk in iter(lambda: bundle.read(1024 * 1024), b""):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+def get_cache_path(bundle_hash):
+    """Given a bundle hash, return the path of its cache file"""
+
+    return os.path.join(config.stix_cache_directory, bundle_hash + ".pickle")
+
+def restore_stix_object(cls, state):
+    """Rebuild a stix2 object from its attributes without running the
+       stix2 constructor and its validation again
+    """
+
+    obj = cls.__new__(cls)
+    obj.__dict__.update(state)
+    return obj
+
+def reduce_stix_object(obj):
+    """Pickle stix2 objects by their attributes. stix2 objects can not be
+       pickled by default because their __getattr__ recurses while the
+       object is being restored
+    """
+
+    return restore_stix_object, (type(obj), obj.__dict__)
+
+def get_stix_classes(cls=_STIXBase):
+    """Return all the stix2 object classes"""
+
+    classes = []
+    for subclass in cls.__subclasses__():
+        classes.append(subclass)
+        classes += get_stix_classes(subclass)
+    return classes
+
+def get_dispatch_table():
+    """Return pickle dispatch table that can handle stix2 objects"""
+
+    dispatch_table = copyreg.dispatch_table.copy()
+    for cls in get_stix_classes():
+        dispatch_table[cls] = reduce_stix_object
+    return dispatch_table
+
+def read_cache(bundle_hash):
+    """Given a bundle hash, return the cached STIX objects of the bundle.
+       Return None if the bundle is not cached or the cache is not usable
+    """
+
+    cache_path = get_cache_path(bundle_hash)
+
+    if not os.path.isfile(cache_path):
+        return None
+
+    try:
+        with open(cache_path, "rb") as cache_file:
+            cached = pickle.load(cache_file)
+    except Exception:
+        # Unreadable cache, remove it so it gets written again
+        os.remove(cache_path)
+        return None
+
+    if cached.get('format_version') != CACHE_FORMAT_VERSION or \
+            cached.get('stix2_version') != stix2.__version__:
+        return None
+
+    # Update access time, used to evict least recently used entries
+    os.utime(cache_path, None)
+
+    return cached['objects']
+
+def write_cache(bundle_hash, stix_objects):
+    """Given a bundle hash and its parsed STIX objects, write them to cache"""
+
+    if not os.path.isdir(config.stix_cache_directory):
+        os.makedirs(config.stix_cache_directory)
+
+    cache_path = get_cache_path(bundle_hash)
+    tmp_path = cache_path + ".tmp"
+
+    with open(tmp_path, "wb") as cache_file:
+        pickler = pickle.Pickler(cache_file, pickle.HIGHEST_PROTOCOL)
+        pickler.dispatch_table = get_dispatch_table()
+        pickler.dump({
+            'format_version': CACHE_FORMAT_VERSION,
+            'stix2_version': stix2.__version__,
+            'objects': stix_objects
+        })
+
+    # Rename so that an interrupted build never leaves a partial cache file
+    os.replace(tmp_path, cache_path)
+
+    evict_cache(keep=cache_path)
+
+def evict_cache(keep=None):
+    """Remove least recently used cache files until the cache is under the
+       size limit. The file given in keep is never removed
+    """
+
+    if not os.path.isdir(config.stix_cache_directory):
+        return
+
+    cache_files = []
+    total_size = 0
+    for filename in os.listdir(config.stix_cache_directory):
+        if filename.endswith(".pickle"):
+            filepath = os.path.join(config.stix_cache_directory, filename)
+            file_stat = os.stat(filepath)
+            cache_files.append((file_stat.st_mtime, file_stat.st_size, filepath))
+            total_size += file_stat.st_size
+
+    max_size = config.stix_cache_max_size * 1000000
+
+    # Oldest first
+    for _, size, filepath in sorted(cache_files):
+        if total_size <= max_size:
+            break
+        if filepath == keep:
+            continue
+        os.remove(filepath)
+        total_size -= size
+
+def load_memory_store(bundle_path, use_cache=True):
+    """Given the path of a STIX bundle, return a memory store with its
+       content. Uses the cached objects if the bundle did not change since
+       it was cached, otherwise parses the bundle and caches the result
+    """
+
+    if not use_cache:
+        src = stix2.MemoryStore()
+        src.load_from_file(bundle_path)
+        return src
+
+    bundle_hash = get_bundle_hash(bundle_path)
+
+    stix_objects = read_cache(bundle_hash)
+    if stix_objects is not None:
+        return stix2.MemoryStore(stix_data=stix_objects)
+
+    src = stix2.MemoryStore()
+    src.load_from_file(bundle_path)
+
+    write_cache(bundle_hash, src.query())
+
+    return src
@@ -1,16 +1,16 @@
 import json
 import stix2
 import stix2.utils
+import time
 from . import config
+from . import stixcache
+from . import stixindex
 from . import util
 
 def get_mitigation_list(src):
     """Reads the STIX and returns a list of all mitigations in the STIX"""
 
-    mitigations = src.query([
-        stix2.Filter('type', '=', 'course-of-action'),
-        stix2.Filter('revoked', '=', False)
-    ])
+    mitigations = stixindex.get_objects_of_type(src, 'course-of-action', active_only=True)
 
     #Filter out deprecated objects for mitigation pages
     mitigations = [x for x in mitigations if not hasattr(x, 'x_mitre_deprecated') or x.x_mitre_deprecated == False]
@@ -20,9 +20,7 @@ def get_mitigation_list(src):
 def get_matrices(src):
     """Reads the STIX and returns a list of all matrices in the STIX"""
 
-    matrices = src.query([
-        stix2.Filter('type', '=', 'x-mitre-matrix'),
-    ])
+    matrices = stixindex.get_objects_of_type(src, 'x-mitre-matrix')
 
     return matrices
 
@@ -30,19 +28,17 @@ def get_tactic_list(src, matrix_id=None):
     """Reads the STIX and returns a list of all tactics in the STIX"""
 
     tactics = []
-    matrix = src.query([
-        stix2.Filter('type', '=', 'x-mitre-matrix'),
-    ])
+    matrix = stixindex.get_objects_of_type(src, 'x-mitre-matrix')
 
     if matrix_id:
         for curr_matrix in matrix:
             if curr_matrix['id'] == matrix_id:
                 for tactic_id in curr_matrix['tactic_refs']:
-                    tactics.append(src.query([stix2.Filter('id', '=', tactic_id)])[0])    
+                    tactics.append(stixindex.get_object(src, tactic_id))
     else:
         for i in range(len(matrix)):
             for tactic_id in matrix[i]['tactic_refs']:
-                tactics.append(src.query([stix2.Filter('id', '=', tactic_id)])[0])    
+                tactics.append(stixindex.get_object(src, tactic_id))
     
     return tactics
 
@@ -51,15 +47,12 @@ def get_all_of_type(src, obj_type):
        type of object in the STIX
     """
 
-    return src.query([stix2.Filter('type', '=', obj_type)])
+    return stixindex.get_objects_of_type(src, obj_type)
 
 def get_techniques(src):
     """Reads the STIX and returns a list of all techniques in the STIX"""
 
-    tech_list = src.query([
-        stix2.Filter('type', '=', 'attack-pattern'),
-        stix2.Filter('revoked', '=', False)
-    ])
+    tech_list = stixindex.get_objects_of_type(src, 'attack-pattern', active_only=True)
 
     tech_list = sorted(tech_list, key=lambda k: k['name'].lower())
     return tech_list
@@ -69,11 +62,10 @@ def get_revoked_by(stix_id, src):
        if no object is found, return None
     """
 
-    relations = src.relationships(stix_id, 'revoked-by', source_only=True)
-    revoked_by = src.query([
-        stix2.Filter('id', 'in', [r.target_ref for r in relations]),
-        stix2.Filter('revoked', '=', False)
-    ])
+    relations = stixindex.get_relationships(src, stix_id, 'revoked-by', source_only=True)
+    target_ids = set(r.target_ref for r in relations)
+    revoked_by = [stixindex.get_object(src, target_id, active_only=True) for target_id in target_ids]
+    revoked_by = stixindex.sort_by_position(src, [x for x in revoked_by if x is not None])
     if revoked_by:
         try:
             revoked_by = revoked_by[0]
@@ -90,16 +82,16 @@ def get_examples(tech_stix_id, src):
 
     examples = []
     ext_refs = []
-    for r in src.relationships(tech_stix_id, 'uses', target_only=True):
+    for r in stixindex.get_relationships(src, tech_stix_id, 'uses', target_only=True):
         if stix2.utils.get_type_from_id(r.source_ref) in ['intrusion-set', 'tool', 'malware']:
             curr_refs = None
             attack_id = None
             if 'external_references' in r:
                 curr_refs = r.external_references
-            example = src.query([
-                stix2.Filter('id', '=', r.source_ref), 
-                stix2.Filter('revoked', '=', False)
-            ])[0]
+            example = stixindex.get_object(src, r.source_ref, active_only=True)
+            # Same failure as the query of the store for revoked examples
+            if example is None:
+                raise IndexError(f"{r.source_ref} is revoked or not in the store")
             attack_id = util.get_attack_id(example)
             examples.append({'name': example.name, 
                              'id': attack_id, 
@@ -113,115 +105,149 @@ def get_examples(tech_stix_id, src):
 
     return examples, ext_refs
 
-def get_technique_id_domain_map(ms):
+def get_technique_id_domain_map(attack_id_index):
     """Create map from technique_id to domain"""
     
     tech_list = {}
 
-    for domain in config.domains:
-        curr_list = ms[domain].query([
-            stix2.Filter('type', '=', 'attack-pattern'),
-            stix2.Filter('revoked', '=', False)
-        ])
-        for val in curr_list:
-            technique_id = util.get_attack_id(val)
-            if technique_id:
-                tech_list[technique_id] = domain
+    for attack_id, stix_id in attack_id_index['attack_to_stix'].items():
+        if stix_id.startswith('attack-pattern--'):
+            tech_list[attack_id] = util.get_attack_id_domain(attack_id)
     
     return tech_list
 
+def get_attack_id_index(ms):
+    """Build the index between stix ids and ATT&CK IDs of all domains.
+       stix ids of every object, revoked or not, map to their ATT&CK ID.
+       The ATT&CK IDs of non revoked objects map to their stix id, name and,
+       for sub-techniques, the ATT&CK ID of the parent technique
+    """
+
+    attack_id_index = {
+        # stix id => ATT&CK ID
+        "stix_to_attack": {},
+        # ATT&CK ID => stix id
+        "attack_to_stix": {},
+        # ATT&CK ID => name
+        "name": {},
+        # sub-technique ATT&CK ID => parent technique ATT&CK ID
+        "parent": {}
+    }
+
+    for domain in config.domains:
+        for obj in stixindex.get_all_objects(ms[domain]):
+            attack_id = util.get_attack_id(obj)
+            if not attack_id:
+                continue
+
+            attack_id_index['stix_to_attack'][obj['id']] = attack_id
+
+            if not stixindex.is_not_revoked(obj):
+                continue
+
+            if attack_id not in attack_id_index['attack_to_stix']:
+                attack_id_index['attack_to_stix'][attack_id] = obj['id']
+                attack_id_index['name'][attack_id] = obj.get('name')
+
+            if obj.get('x_mitre_is_subtechnique'):
+                for relationship in stixindex.get_relationships(ms[domain], obj['id'], 'subtechnique-of', source_only=True):
+                    parent = stixindex.get_object(ms[domain], relationship['target_ref'])
+                    if parent is not None and util.get_attack_id(parent):
+                        attack_id_index['parent'][attack_id] = util.get_attack_id(parent)
+
+    return attack_id_index
+
+def merge_domains(ms, obj_types, domain_membership):
+    """Given the memory stores and a list of stix types, return the non
+       revoked objects of those types in all domains without duplicates.
+       The domains that contain each object are added to domain_membership
+    """
+
+    # stix id => object, keeps the first object found for each stix id
+    merged = {}
+
+    for domain in config.domains:
+        for obj_type in obj_types:
+            for val in stixindex.get_objects_of_type(ms[domain], obj_type, active_only=True):
+                if val['id'] not in merged:
+                    merged[val['id']] = val
+                domain_membership[val['id']] = domain_membership.get(val['id'], frozenset()) | {domain}
+
+    return list(merged.values())
+
 def grab_resources(ms):
     """Returns a dict that contains lists for the software, group,
-       technique and mitigation objects.
+       technique and mitigation objects. Objects found in more than one
+       domain are only listed once, the domains that contain each object
+       are returned in a stix id => frozenset of domains dict.
     """
 
+    # stix id => domains that contain the object
+    domain_membership = {}
+
     #Generates the list of techniques
-    tech_list = []
-    for domain in config.domains:
-        curr_list = ms[domain].query([
-            stix2.Filter('type', '=', 'attack-pattern'),
-            stix2.Filter('revoked', '=', False)
-        ])
-        for val in curr_list:
-            if next((x for x in tech_list if x.id == val.id), None) is None:
-                tech_list.append(val)   
+    tech_list = merge_domains(ms, ['attack-pattern'], domain_membership)
     tech_list = sorted(tech_list, key=lambda k: k['name'].lower())
 
     #Generates list of software
-    software_list = []
-    for domain in config.domains:
-        curr_list = ms[domain].query([
-            stix2.Filter('type', '=', 'malware'),
-            stix2.Filter('revoked', '=', False)
-        ])
-        # Remove duplicates from different domains
-        for val in curr_list:
-            if next((x for x in software_list if x.id == val.id), None) is None:
-                software_list.append(val)
-        curr_list = ms[domain].query([
-            stix2.Filter('type', '=', 'tool'),
-            stix2.Filter('revoked', '=', False)
-        ])
-        # Remove duplicates from different domains
-        for val in curr_list:
-            if next((x for x in software_list if x.id == val.id), None) is None:
-                software_list.append(val)   
+    software_list = merge_domains(ms, ['malware', 'tool'], domain_membership)
     software_list = sorted(software_list, key=lambda k: k["name"].lower() )
 
     #Generates list of groups
-    group_list = []
-    for domain in config.domains:
-        curr_list = ms[domain].query([
-            stix2.Filter('type', '=', 'intrusion-set'),
-            stix2.Filter('revoked', '=', False)
-        ])
-        # Remove duplicates from different domains
-        for val in curr_list:
-            if next((x for x in group_list if x.id == val.id), None) is None:
-                group_list.append(val)
+    group_list = merge_domains(ms, ['intrusion-set'], domain_membership)
     group_list = sorted(group_list, key=lambda k: k["name"].lower())
 
     #Generates a list of CoA
-    coa_list = []
-    for domain in config.domains:
-        curr_list = ms[domain].query([
-            stix2.Filter("type", "=", "course-of-action"),
-            stix2.Filter('revoked', '=', False)
-        ])
-        #remove duplicates from different domains
-        for val in curr_list:
-            if next((x for x in coa_list if x.id == val.id), None) is None:
-                coa_list.append(val)
+    coa_list = merge_domains(ms, ['course-of-action'], domain_membership)
     coa_list = sorted(coa_list, key=lambda k: k["name"].lower() )
 
     #Generates list of relationships
     rel_list = []
     for domain in config.domains:
-        curr_list = ms[domain].query([
-            stix2.Filter('type', '=', 'relationship'),
-        ])
+        curr_list = stixindex.get_objects_of_type(ms[domain], 'relationship')
         rel_list = rel_list + curr_list
     resources = {
         "relationships": rel_list, 
         "groups": group_list, 
         "software": software_list, 
         "techniques": tech_list, 
-        "mitigations": coa_list
+        "mitigations": coa_list,
+        "domains": domain_membership
     }
     return resources
 
 def get_stix_memory_stores():
     """This function reads the json files for each domain and creates a dict
-       that contains the memory stores for each domain.
+       that contains the memory stores for each domain. Each bundle is only
+       loaded once, the returned stores are shared by every module. Bundles
+       that did not change since the last build are read from the STIX
+       cache. Returns the stores and a dict with the time and memory used
+       to load them.
     """
 
     src = {}
 
+    start_time = time.time()
+    start_memory = util.get_peak_memory_usage()
+
+    use_cache = not config.args.no_stix_cache
+
     for domain in config.domains:
-        src[domain] = stix2.MemoryStore()
-        src[domain].load_from_file(config.attack_path[domain])
+        src[domain] = stixcache.load_memory_store(config.attack_path[domain], use_cache)
+        # Build lookup maps used instead of querying the store
+        stixindex.get_index(src[domain])
+
+    end_time = time.time()
+    end_memory = util.get_peak_memory_usage()
+
+    load_stats = {
+        'time': end_time - start_time,
+        'memory': None
+    }
+    if start_memory is not None and end_memory is not None:
+        load_stats['memory'] = end_memory - start_memory
 
-    return src
+    return src, load_stats
 
 def get_contributors(ms):
     """Gets all contributors in the STIX content"""
@@ -237,9 +263,7 @@ def get_contributors(ms):
         src = ms[domain]
         obj_list = []
         for curr_type in obj_types:
-            obj_list += src.query([
-                stix2.Filter('type', '=', curr_type)
-            ])
+            obj_list += stixindex.get_objects_of_type(src, curr_type)
 
         for obj in obj_list:
             if 'x_mitre_contributors' in obj:
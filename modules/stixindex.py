@@ -0,0 +1,126 @@
+import weakref
+
+# Module that indexes the objects of a memory store so lookups by id, type,
+# kill chain phase and relationship do not need to scan the store
+
+# Memory store => index, entries go away with their memory store
+indexes = weakref.WeakKeyDictionary()
+
+def is_not_revoked(obj):
+    """Return True if the object matches the Filter('revoked', '=', False)
+       used in queries. Objects without a revoked property do not match
+    """
+
+    return 'revoked' in obj.keys() and obj['revoked'] == False
+
+def build_index(src):
+    """Given a memory store, build the lookup maps of its objects in a
+       single pass. Lists keep the order in which the store returns objects
+    """
+
+    index = {
+        # stix id => position of object in store
+        "position": {},
+        # stix id => object
+        "id": {},
+        # type => [objects]
+        "type": {},
+        # type => [objects with revoked set to False]
+        "active_type": {},
+        # kill chain phase name => [objects]
+        "kill_chain_phase": {},
+        # (source_ref, relationship_type) => [relationships]
+        "relationships_from": {},
+        # (target_ref, relationship_type) => [relationships]
+        "relationships_to": {},
+        # stix id => [relationships with the object as source or target]
+        "relationships_of": {}
+    }
+
+    for position, obj in enumerate(src.query()):
+        stix_id = obj['id']
+        obj_type = obj['type']
+
+        index['position'][stix_id] = position
+        index['id'][stix_id] = obj
+        index['type'].setdefault(obj_type, []).append(obj)
+
+        if is_not_revoked(obj):
+            index['active_type'].setdefault(obj_type, []).append(obj)
+
+        for phase in obj.get('kill_chain_phases', []):
+            index['kill_chain_phase'].setdefault(phase['phase_name'], []).append(obj)
+
+        if obj_type == 'relationship':
+            index['relationships_from'].setdefault((obj['source_ref'], obj['relationship_type']), []).append(obj)
+            index['relationships_to'].setdefault((obj['target_ref'], obj['relationship_type']), []).append(obj)
+            index['relationships_of'].setdefault(obj['source_ref'], []).append(obj)
+            if obj['target_ref'] != obj['source_ref']:
+                index['relationships_of'].setdefault(obj['target_ref'], []).append(obj)
+
+    return index
+
+def get_index(src):
+    """Given a memory store, return its index. The index is built the first
+       time it is requested, the store must not be modified afterwards
+    """
+
+    if src not in indexes:
+        indexes[src] = build_index(src)
+    return indexes[src]
+
+def get_object(src, stix_id, active_only=False):
+    """Given a stix id, return its object or None if it is not in the store.
+       If active_only is set, revoked objects are not returned
+    """
+
+    obj = get_index(src)['id'].get(stix_id)
+    if obj is not None and active_only and not is_not_revoked(obj):
+        return None
+    return obj
+
+def get_all_objects(src):
+    """Return a list of all the objects in the store"""
+
+    return list(get_index(src)['id'].values())
+
+def get_objects_of_type(src, obj_type, active_only=False):
+    """Given a type, return a list of its objects. If active_only is set,
+       revoked objects are not returned
+    """
+
+    if active_only:
+        return list(get_index(src)['active_type'].get(obj_type, []))
+    return list(get_index(src)['type'].get(obj_type, []))
+
+def get_objects_in_kill_chain_phase(src, phase_name):
+    """Given a kill chain phase name, return a list of objects in it"""
+
+    return list(get_index(src)['kill_chain_phase'].get(phase_name, []))
+
+def get_relationships(src, stix_id, relationship_type, source_only=False, target_only=False):
+    """Given a stix id and a relationship type, return the relationships
+       involving the object in the same order as src.relationships()
+    """
+
+    index = get_index(src)
+
+    relationships = []
+    if not target_only:
+        relationships += index['relationships_from'].get((stix_id, relationship_type), [])
+    if not source_only:
+        relationships += index['relationships_to'].get((stix_id, relationship_type), [])
+    return relationships
+
+def get_all_relationships(src, stix_id):
+    """Given a stix id, return every relationship that has the object as
+       source or target
+    """
+
+    return list(get_index(src)['relationships_of'].get(stix_id, []))
+
+def sort_by_position(src, objs):
+    """Given a list of objects, sort them in the order of the store"""
+
+    position = get_index(src)['position']
+    return sorted(objs, key=lambda obj: position[obj['id']])
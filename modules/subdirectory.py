@@ -1,13 +1,6 @@
-import collections
-import json
-import markdown
-import os
-import tqdm
 import re
 from . import config
-from . import stixhelpers
-from . import relationshiphelpers
-from . import util
+from . import postbuild
 
 allowed_in_link = "".join(list(map(lambda s: s.strip(), [
     "   -   ",
@@ -26,13 +19,10 @@ allowed_in_link = "".join(list(map(lambda s: s.strip(), [
     "   =    "
 ]))) 
 
-def replace_links(filepath):
-    """In the given file, replace the in-site links to reference 
-       the correct previous version
+def replace_links(html_str):
+    """In the given html, replace the in-site links to reference 
+       the subdirectory
     """
-    # read file contents
-    with open(filepath, mode="r", encoding='utf8') as html:
-        html_str = html.read()
 
     # subdirectory link format
     dest_link_format = f"/{config.subdirectory}\g<1>"
@@ -51,12 +41,37 @@ def replace_links(filepath):
     html_str = substitute("href", html_str)
     html_str = substitute_redirection('content="0; url', html_str)
 
-    with open(filepath, mode="w", encoding='utf8') as updated_html:
-        updated_html.write(html_str)
+    return html_str
+
+def accepts_page(path):
+    """Given a path of the output tree, return True if it is a page of the
+       web directory
+    """
+
+    return path.endswith(".html") and postbuild.is_in_web_directory(path)
+
+def visit_page(path, html_str):
+    """Return the html of the page with the subdirectory links"""
+
+    return replace_links(html_str)
+
+def finish(pages):
+    """Return the number of pages rewritten"""
+
+    return len([path for path, rewritten in pages if rewritten])
+
+def get_visitor():
+    """Return the post-build visitor that replaces the local hyperlinks"""
+
+    return {
+        "name": "Subdirectory",
+        "accepts": accepts_page,
+        "visit": visit_page,
+        "finish": finish,
+        "rewrite": True
+    }
 
 def replace():
     """ Replace local hyperlinks with subdirectory """
-    for directory, _, files in os.walk(config.web_directory):
-        for filename in filter(lambda f: f.endswith(".html"), files):
-            filepath = os.path.join(directory, filename)
-            replace_links(filepath)
\ No newline at end of file
+
+    postbuild.run([get_visitor()])
@@ -1,12 +1,15 @@
-import json
 import os
 import requests
 import collections
 import urllib3
 import re
-import markdown
 import stix2
 from . import config
+from . import markdownrenderer
+from . import pagerenderer
+from . import parallel
+from . import search
+from . import sidenav
 from . import stixhelpers
 from . import util
 
@@ -30,7 +33,7 @@ def generate():
 
         tactics[domain] = stixhelpers.get_tactic_list(config.ms[domain])
 
-    side_nav_data = util.get_side_nav_domains_data("tactics", tactics)
+    side_nav_data = sidenav.add_side_nav("tactics", util.get_side_nav_domains_data("tactics", tactics))
 
     for domain in config.domains:
         generate_domain_markdown(domain, techniques_no_sub, tactics, side_nav_data)
@@ -52,18 +55,15 @@ def generate_domain_markdown(domain, techniques_no_sub, tactics, side_nav_data):
     data['tactics_table'] = get_domain_table_data(tactics[domain])
 
     subs = config.tactic_domain_md.substitute(data)
-    subs = subs + json.dumps(data)
 
-    with open(os.path.join(config.tactics_markdown_path, data['domain'] + "-tactics.md"), "w", encoding='utf8') as md_file:
-        md_file.write(subs)
+    pagerenderer.write_page(os.path.join(config.tactics_markdown_path, data['domain'] + "-tactics.md"), subs, data)
+    search.add_page(subs, "Tactics - " + util.get_domain_alias(data['domain']), data, config.search_data_keys['tactic_domain'])
 
     # Write the tactic index.html page
-    with open(os.path.join(config.tactics_markdown_path, "overview.md"), "w", encoding='utf8') as i_md_file:
-        i_md_file.write(config.tactic_overview_md)
+    pagerenderer.write_page(os.path.join(config.tactics_markdown_path, "overview.md"), config.tactic_overview_md)
 
     # Create the markdown for the enterprise groups in the STIX
-    for tactic in tactics[domain]:
-        generate_tactic_md(tactic, domain, tactics[domain], techniques_no_sub[domain], side_nav_data)
+    parallel.generate_pages(generate_tactic_md, tactics[domain], domain, tactics[domain], techniques_no_sub[domain], side_nav_data)
 
 def generate_tactic_md(tactic, domain, tactic_list, techniques, side_nav_data):
     """Generate markdown for given tactic"""
@@ -80,7 +80,7 @@ def generate_tactic_md(tactic, domain, tactic_list, techniques, side_nav_data):
         data['attack_id'] = attack_id
         data['name'] = tactic['name']
         data['name_lower'] = tactic['name'].lower()
-        data['descr'] = markdown.markdown(tactic['description'])
+        data['descr'] = markdownrenderer.render(tactic['description'])
         data['side_menu_data'] = side_nav_data
         data['domain'] = domain.split("-")[0]
 
@@ -99,10 +99,9 @@ def generate_tactic_md(tactic, domain, tactic_list, techniques, side_nav_data):
         data['techniques_table_len'] = str(len(techniques_list))
 
         subs = config.tactic_md.substitute(data)
-        subs = subs + json.dumps(data)
 
-        with open(os.path.join(config.tactics_markdown_path, data['attack_id'] + ".md"), "w", encoding='utf8') as md_file:
-            md_file.write(subs)
+        pagerenderer.write_page(os.path.join(config.tactics_markdown_path, data['attack_id'] + ".md"), subs, data)
+        search.add_page(subs, data['name'] + ", Tactic " + data['attack_id'] + " - " + util.get_domain_alias(data['domain']), data, config.search_data_keys['tactic'])
 
 def get_domain_table_data(tactic_list):
     """Given a tactic list, returns an array of jsons with tactic name, id 
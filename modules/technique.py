@@ -1,13 +1,17 @@
-import json
 import os
 import requests
 import collections
 import urllib3
 import re
-import markdown
 import stix2
 from . import config
+from . import markdownrenderer
+from . import pagerenderer
+from . import parallel
+from . import search
+from . import sidenav
 from . import stixhelpers
+from . import referenceregistry
 from . import util
 
 def generate():
@@ -20,8 +24,7 @@ def generate():
         os.mkdir(config.techniques_markdown_path)
 
     #Write the technique index.html page
-    with open(os.path.join(config.techniques_markdown_path, "overview.md"), "w", encoding='utf8') as md_file:
-        md_file.write(config.technique_overview_md)
+    pagerenderer.write_page(os.path.join(config.techniques_markdown_path, "overview.md"), config.technique_overview_md)
 
     techniques = {}
     techniques_no_sub = {}
@@ -35,7 +38,7 @@ def generate():
         tactics[domain] = stixhelpers.get_tactic_list(config.ms[domain])
 
 
-    side_nav_data = get_technique_side_nav_data(techniques_no_sub, tactics)
+    side_nav_data = sidenav.add_side_nav("techniques", get_technique_side_nav_data(techniques_no_sub, tactics))
 
     for domain in config.domains:
         generate_domain_markdown(domain, techniques, tactics, side_nav_data)
@@ -64,16 +67,14 @@ def generate_domain_markdown(domain, techniques, tactics, side_nav_data):
     data['menu'] = side_nav_data
 
     subs = config.technique_domain_md.substitute(data)
-    subs = subs + json.dumps(data)
 
-    with open(os.path.join(config.techniques_markdown_path, data['domain'] + "-techniques.md"), "w", encoding='utf8') as md_file:
-        md_file.write(subs)
+    pagerenderer.write_page(os.path.join(config.techniques_markdown_path, data['domain'] + "-techniques.md"), subs, data)
+    search.add_page(subs, "Techniques - " + util.get_domain_alias(data['domain']), data, config.search_data_keys['technique_domain'])
 
     # Create the markdown for the enterprise groups in the STIX
 
-    for technique in technique_list_no_sub:
-        if 'revoked' not in technique or technique['revoked'] is False:
-            generate_technique_md(technique, domain, side_nav_data, tactics[domain])
+    technique_list_no_sub_no_revoked = [technique for technique in technique_list_no_sub if 'revoked' not in technique or technique['revoked'] is False]
+    parallel.generate_pages(generate_technique_md, technique_list_no_sub_no_revoked, domain, side_nav_data, tactics[domain])
 
 def generate_technique_md(technique, domain, side_nav_data, tactic_list):
     """Generetes markdown data for given technique"""
@@ -99,11 +100,10 @@ def generate_technique_md(technique, domain, side_nav_data, tactic_list):
         subs = config.technique_md.substitute(technique_dict)
         path = technique_dict['attack_id']
 
-        subs = subs + json.dumps(technique_dict)
 
         #Write out the technique markdown file
-        with open(os.path.join(config.techniques_markdown_path, path + ".md"), "w", encoding='utf8') as md_file:
-            md_file.write(subs)
+        pagerenderer.write_page(os.path.join(config.techniques_markdown_path, path + ".md"), subs, technique_dict)
+        search.add_page(subs, get_search_title(technique_dict), technique_dict, config.search_data_keys['technique'])
 
         # Generate data for sub-techniques
         if technique_dict['subtechniques']:
@@ -124,13 +124,24 @@ def generate_technique_md(technique, domain, side_nav_data, tactic_list):
                 subs = config.sub_technique_md.substitute(sub_tech_dict)
                 path = sub_tech_dict['parent_id'] + "-" + sub_tech_dict['sub_number']
 
-                subs = subs + json.dumps(sub_tech_dict)
 
                 #Write out the technique markdown file
-                with open(os.path.join(config.techniques_markdown_path, path + ".md"), "w", encoding='utf8') as md_file:
-                    md_file.write(subs)
+                pagerenderer.write_page(os.path.join(config.techniques_markdown_path, path + ".md"), subs, sub_tech_dict)
+                search.add_page(subs, get_search_title(sub_tech_dict), sub_tech_dict, config.search_data_keys['technique'])
         
 
+def get_search_title(technique_dict):
+    """Given the data of a technique or sub-technique page, return its title
+       in the search results, the title of technique.html
+    """
+
+    if technique_dict.get('is_subtechnique'):
+        title = technique_dict['parent_name'] + ": " + technique_dict['name'] + ", Sub-technique "
+    else:
+        title = technique_dict['name'] + ", Technique "
+
+    return title + technique_dict['attack_id'] + " - " + util.get_domain_alias(technique_dict['domain'])
+
 def generate_data_for_md(technique_dict, technique, tactic_list, is_sub_technique = False):
     """Given a technique or subtechnique, fill technique dictionary to create
        markdown file
@@ -166,12 +177,9 @@ def generate_data_for_md(technique_dict, technique, tactic_list, is_sub_techniqu
                     }
                     technique_dict['mtcs'].append(mtcs_dict)
 
-        # Get initial reference list
-        reference_list = []
-        # Decleared as an object to be able to pass by reference
-        next_reference_number = {}
-        next_reference_number['value'] = 1
-        reference_list = util.update_reference_list(reference_list, technique)
+        # Get initial references
+        references = referenceregistry.ReferenceRegistry()
+        references.add_external_references(technique)
 
         dates = util.get_created_and_modified_dates(technique)
         
@@ -191,23 +199,23 @@ def generate_data_for_md(technique_dict, technique, tactic_list, is_sub_techniqu
         if technique.get("description"):
 
             if technique_dict['deprecated']:
-                technique_dict['descr'] = util.replace_html_chars(markdown.markdown(technique['description'].split("\n")[0]))
+                technique_dict['descr'] = util.replace_html_chars(markdownrenderer.render(technique['description'].split("\n")[0]))
                 technique_dict['descr'] = util.filter_urls(technique_dict['descr'])
                 return technique_dict
 
             citations_from_descr = util.get_citations_from_descr(technique['description'])
-            technique_dict['descr'] = util.replace_html_chars(markdown.markdown(technique['description']))
+            technique_dict['descr'] = util.replace_html_chars(markdownrenderer.render(technique['description']))
             technique_dict['descr'] = util.filter_urls(technique_dict['descr'])
-            technique_dict['descr'] = util.get_descr_reference_sect(citations_from_descr, reference_list, next_reference_number, technique_dict['descr'])
+            technique_dict['descr'] = util.get_descr_reference_sect(citations_from_descr, references, technique_dict['descr'])
         
         # Get mitigation table
-        technique_dict['mitigation_table'] = get_mitigations_table_data(technique, reference_list, next_reference_number)
+        technique_dict['mitigation_table'] = get_mitigations_table_data(technique, references)
         
         # Get related techniques
         technique_dict['rel_techniques_table'] = get_related_techniques_data(technique, tactic_list)
 
         # Get examples
-        technique_dict['examples_table'] = get_examples_table_data(technique, reference_list, next_reference_number)
+        technique_dict['examples_table'] = get_examples_table_data(technique, references)
 
         # Get technique version
         if technique.get("x_mitre_version"):
@@ -221,29 +229,24 @@ def generate_data_for_md(technique_dict, technique, tactic_list, is_sub_techniqu
 
         # Get platforms that technique uses
         if technique.get('x_mitre_platforms'):
-            technique['x_mitre_platforms'].sort()
-            technique_dict['platforms'] = ", ".join(technique['x_mitre_platforms'])
+            technique_dict['platforms'] = ", ".join(sorted(technique['x_mitre_platforms']))
 
         # Get system requirements
         if technique.get('x_mitre_system_requirements'):
-            technique['x_mitre_system_requirements'].sort()
-            technique_dict['sysreqs'] = ", ".join(technique['x_mitre_system_requirements'])
+            technique_dict['sysreqs'] = ", ".join(sorted(technique['x_mitre_system_requirements']))
             technique_dict['sysreqs'] = re.sub("\.?\\n+", "; ", technique_dict['sysreqs'])
 
         # Get permissions required
         if technique.get('x_mitre_permissions_required'):
-            technique['x_mitre_permissions_required'].sort()
-            technique_dict['perms'] = ", ".join(technique['x_mitre_permissions_required'])
+            technique_dict['perms'] = ", ".join(sorted(technique['x_mitre_permissions_required']))
 
         # Get effective permissions
         if technique.get('x_mitre_effective_permissions'):
-            technique['x_mitre_effective_permissions'].sort()
-            technique_dict['eff_perms'] = ", ".join(technique['x_mitre_effective_permissions'])
+            technique_dict['eff_perms'] = ", ".join(sorted(technique['x_mitre_effective_permissions']))
 
         # Get data sources
         if technique.get('x_mitre_data_sources'):
-            technique['x_mitre_data_sources'].sort()
-            technique_dict['data_sources'] = ", ".join(technique['x_mitre_data_sources'])
+            technique_dict['data_sources'] = ", ".join(sorted(technique['x_mitre_data_sources']))
 
         # Get if technique supports remote
         if technique.get('x_mitre_remote_support'):
@@ -261,27 +264,23 @@ def generate_data_for_md(technique_dict, technique, tactic_list, is_sub_techniqu
 
         # Get list of impacts
         if technique.get('x_mitre_impact_type'):
-            technique['x_mitre_impact_type'].sort()
-            technique_dict['impact_type'] = ", ".join(technique['x_mitre_impact_type'])
+            technique_dict['impact_type'] = ", ".join(sorted(technique['x_mitre_impact_type']))
 
         # Get list of defenses bypassed
         if technique.get('x_mitre_defense_bypassed'):
-            technique['x_mitre_defense_bypassed'].sort()
-            technique_dict['def_bypass'] = ", ".join(technique['x_mitre_defense_bypassed'])
+            technique_dict['def_bypass'] = ", ".join(sorted(technique['x_mitre_defense_bypassed']))
 
         # Get list of contributors        
         if technique.get('x_mitre_contributors'):
-            technique['x_mitre_contributors'].sort()
-            technique_dict['contributors'] = "; ".join(technique['x_mitre_contributors'])
+            technique_dict['contributors'] = "; ".join(sorted(technique['x_mitre_contributors']))
 
         # Get list of tactic types
         if technique.get('x_mitre_tactic_type'):
-            technique['x_mitre_tactic_type'].sort()
-            technique_dict['tactic_type'] = ", ".join(technique['x_mitre_tactic_type'])
+            technique_dict['tactic_type'] = ", ".join(sorted(technique['x_mitre_tactic_type']))
 
         # Get detection data
         if technique.get('x_mitre_detection'):
-            technique_dict['detection'] = get_detection_string(technique['x_mitre_detection'], reference_list, next_reference_number)
+            technique_dict['detection'] = get_detection_string(technique['x_mitre_detection'], references)
 
         # Get if technique is detectable by common defenses
         if technique.get('x_mitre_detectable_by_common_defenses'):
@@ -300,8 +299,8 @@ def generate_data_for_md(technique_dict, technique, tactic_list, is_sub_techniqu
             technique_dict['diff_for_adv_exp'] = util.replace_html_chars(technique['x_mitre_difficulty_for_adversary_explanation'])            
         
         # Add reference for bottom part of technique page
-        if reference_list:
-            technique_dict['bottom_ref'] = util.sort_reference_list(reference_list)
+        if references.references:
+            technique_dict['bottom_ref'] = references.get_cited_references()
         
     return technique_dict
 
@@ -334,7 +333,7 @@ def get_related_techniques_data(technique, tactic_list):
         technique_data = sorted(technique_data, key=lambda k: k['tactic_name'].lower())
     return technique_data
 
-def get_mitigations_table_data(technique, reference_list, next_reference_number):
+def get_mitigations_table_data(technique, references):
     """Given a technique a reference list, find mitigations that mitigate
        technique and return list with mitigation data. Also modifies the 
        reference list if it finds a reference that is not on the list
@@ -360,7 +359,7 @@ def get_mitigations_table_data(technique, reference_list, next_reference_number)
                     row['name'] = mitigation['object']['name']
                     if mitigation['relationship'].get('description'):
                         # Get filtered description
-                        row['descr'] = util.get_filtered_description(reference_list, next_reference_number, mitigation)
+                        row['descr'] = util.get_filtered_description(references, mitigation)
              
                     mitigation_data.append(row)
     
@@ -368,7 +367,7 @@ def get_mitigations_table_data(technique, reference_list, next_reference_number)
         mitigation_data = sorted(mitigation_data, key=lambda k: k['name'].lower())
     return mitigation_data
     
-def get_examples_table_data(technique, reference_list, next_reference_number):
+def get_examples_table_data(technique, references):
     """Given a technique object, find examples in malware using technique,
        tools using technique and groups using technique. Return list with
        example data
@@ -405,7 +404,7 @@ def get_examples_table_data(technique, reference_list, next_reference_number):
 
                     if example['relationship'].get('description'):
                         # Get filtered description
-                        row['descr'] = util.get_filtered_description(reference_list, next_reference_number, example)
+                        row['descr'] = util.get_filtered_description(references, example)
 
                     example_data.append(row)
         
@@ -513,17 +512,17 @@ def get_techniques_list(techniques):
     return technique_list
 
 
-def get_detection_string(detection, reference_list, next_reference_number):
+def get_detection_string(detection, references):
     """Given the technique's detection string, replace the citations and
-       add them to the reference_list is they are not found. Return
+       add them to the references if they are not found. Return
        modified detection string
     """
 
     citations_from_descr = util.get_citations_from_descr(detection)
 
-    filtered_detection = util.replace_html_chars(markdown.markdown(detection))
+    filtered_detection = util.replace_html_chars(markdownrenderer.render(detection))
     filtered_detection = util.filter_urls(filtered_detection)
-    filtered_detection = util.get_descr_reference_sect(citations_from_descr, reference_list, next_reference_number, filtered_detection)
+    filtered_detection = util.get_descr_reference_sect(citations_from_descr, references, filtered_detection)
     
     return filtered_detection
 
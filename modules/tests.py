@@ -1,11 +1,42 @@
 import shutil
 from . import citationchecker
+from . import citationrewriter
 from . import config
 from . import linkchecker
 from . import sizechecker
 from . import util
 import os 
 
+def are_enabled(args):
+    """Return True if tests are run"""
+
+    return bool((args.build and (sorted(args.build) == sorted(config.build_defaults))) or args.tests)
+
+def get_visitors(args):
+    """Return the post-build visitors of the tests that run_tests will run,
+       for the pass that builds the site to gather their data
+    """
+
+    visitors = []
+
+    if not are_enabled(args):
+        return visitors
+
+    if (config.build_defaults == args.build) or \
+       ('links' in args.tests or 'external_links' in args.tests):
+        visitors.append(linkchecker.get_visitor("external_links" in args.tests))
+
+    if (config.build_defaults == args.build) or \
+       ('citations' in args.tests):
+        visitors.append(citationchecker.get_visitor())
+
+    # Output size is read once every other visitor wrote its files
+    if (config.build_defaults == args.build) or \
+       ('size' in args.tests):
+        visitors.append(sizechecker.get_visitor())
+
+    return visitors
+
 def run_tests(args):
     """Run tests"""
 
@@ -190,6 +221,13 @@ def check_citations():
 
     util.print_test_output(STATUS,TEST,MSG)
 
+    # Warn about citations that could not be resolved while generating
+    # the pages, see the unresolved citations report for the list
+    unresolved_count = citationrewriter.write_unresolved_report()
+    if unresolved_count:
+        MSG = "{} cited source(s) not found".format(unresolved_count)
+        util.print_test_output(config.WARNING_STATUS, "Unresolved Citations", MSG)
+
     return exit_code, pages[1]
 
 def check_size():
@@ -1,6 +1,5 @@
 import argparse
 import datetime
-import markdown
 import json
 import re
 import collections
@@ -10,7 +9,16 @@ import math
 import uuid
 import sys
 import bleach
+from . import citationrewriter
 from . import config
+from . import markdownrenderer
+from . import siteurl
+
+try:
+    import resource
+except ImportError:
+    # resource module is not available on Windows
+    resource = None
 
 def timestamp():
     """This method is here to return a timestamp"""
@@ -57,6 +65,11 @@ def find_index_id(ext_ref):
 def get_attack_id(object):
     """Given an object, return attack_id"""
 
+    # Objects from the STIX data are found in the ATT&CK ID index
+    stix_to_attack = config.attack_id_index.get('stix_to_attack', {})
+    if object.get('id') in stix_to_attack:
+        return stix_to_attack[object['id']]
+
     if object.get('external_references'):
         index = find_index_id(object['external_references'])
 
@@ -66,21 +79,23 @@ def get_attack_id(object):
     return None
 
 def filter_urls(descr):
-    """Filters out URLs to return path and not domain"""
+    """Filters out URLs to return path and not domain. The path is under the
+       site url, filter the html once it is rendered
+    """
 
     if not config.args.no_stix_link_replacement:
         if "https://attack.mitre.org/groups/" in descr:
             descr = descr.replace(
-                "https://attack.mitre.org/groups/", "/groups/")
+                "https://attack.mitre.org/groups/", siteurl.url("/groups/"))
         if "https://attack.mitre.org/software/" in descr:
             descr = descr.replace(
-                "https://attack.mitre.org/software/", "/software/")
+                "https://attack.mitre.org/software/", siteurl.url("/software/"))
         if "https://attack.mitre.org/techniques/" in descr:
             descr = descr.replace(
-                "https://attack.mitre.org/techniques/", "/techniques/")
+                "https://attack.mitre.org/techniques/", siteurl.url("/techniques/"))
         if "https://attack.mitre.org/technique/" in descr:
             descr = descr.replace(
-                "https://attack.mitre.org/technique/", "/techniques/")
+                "https://attack.mitre.org/technique/", siteurl.url("/techniques/"))
 
     return descr
 
@@ -103,53 +118,14 @@ def format_description_markdown_link(descr):
 
     return descr
 
-def get_descr_reference_sect(citations, reference_list, next_reference_number, description):
+def get_descr_reference_sect(citations, references, description):
     """This method is responsible for properly formatting the 
        description citation area on Software, Groups pages
     """
 
-    citation_temp = "(Citation: {})"
-
-    # Find citations in description
-    for citation in citations:     
-        reference_str = find_reference_html(reference_list, next_reference_number, citation)
-        if reference_str:
-            description = description.replace(citation_temp.format(citation), reference_str)
-
-    return description
-
-def find_reference_number(reference_list, next_reference_number, source_name):
-    """ Given a reference list and a source name, find the number of the source name
-    """
-
-    for reference in reference_list:
-        if reference['sname'] == source_name:
-            if not reference['number']:
-                reference['number'] = next_reference_number['value']
-                next_reference_number['value'] += 1
-            return reference['number']
-    return config.NOT_FOUND
-
-def find_reference_html(reference_list, next_reference_number, source_name):
-    """ Given a reference list and a source name, find source name and 
-        create html string
-    """
+    return citationrewriter.replace_citations(description, citations, references)
 
-    for reference in reference_list:
-        if reference['sname'] == source_name:
-            if not reference['number']:
-                reference['number'] = next_reference_number['value']
-                next_reference_number['value'] += 1
-
-            if not reference.get("url"):
-                reference_html = config.reference_marker_template_no_url.format(reference['number'],reference['number'],reference['sname'],reference['number'])
-            else:
-                reference_html = config.reference_marker_template.format(reference['number'],reference['number'],reference['sname'],reference['url'],reference['number'] - 1, reference['number'] - 1, reference['number'])
-            
-            return reference_html
-    return ""
-
-def add_external_references_not_in_descr(description, reference_list, next_reference_number, obj, citations_from_descr):
+def add_external_references_not_in_descr(description, references, obj, citations_from_descr):
     """Given an object, find external references that are not referenced on the description.
        If it not referenced, append reference to description
     """
@@ -157,7 +133,7 @@ def add_external_references_not_in_descr(description, reference_list, next_refer
     if obj.get('external_references'):
         for ext_ref in obj['external_references']:
             if not ext_ref.get('source_name') in citations_from_descr:
-                reference_str = find_reference_html(reference_list, next_reference_number, ext_ref.get('source_name'))
+                reference_str = references.get_html(ext_ref.get('source_name'))
                 description += reference_str
 
     return description                  
@@ -166,9 +142,7 @@ def add_external_references_not_in_descr(description, reference_list, next_refer
 def get_citations_from_descr(description):
     """Given a description, find all of the citations"""
 
-    citation_temp = "(Citation: {})"
-    p = re.compile('\(Citation: (.*?)\)')
-    return p.findall(description)
+    return citationrewriter.find_citations(description)
 
 def citations_versus_references(obj, citations_from_descr):
     """Given an object an a list of citations found in the description,
@@ -181,20 +155,19 @@ def citations_versus_references(obj, citations_from_descr):
         ext_references_len = len(obj.get('external_references'))
     return ext_references_len - citations_len
 
-def get_filtered_description(reference_list, next_reference_number, obj):
+def get_filtered_description(references, obj):
     """Given an object, filter the description by changing citations, 
        eliminating unwanted HTML and add external references not in description
     """
 
-    # Update reference list
-    reference_list = update_reference_list(reference_list, obj['relationship'])
+    # Update references
+    references.add_external_references(obj['relationship'])
 
     # Get citations from description
     citations_from_descr = get_citations_from_descr(obj['relationship']['description'])
     
     # Add in-place citations to relationship description
-    description = filter_urls(obj['relationship']['description'])
-    description = get_descr_reference_sect(citations_from_descr, reference_list, next_reference_number,description) 
+    description = get_descr_reference_sect(citations_from_descr, references, obj['relationship']['description'])
 
     # Check if description had all references
     # Returns 0 if description has the same amount of 
@@ -203,55 +176,13 @@ def get_filtered_description(reference_list, next_reference_number, obj):
 
     if citations_references_diff > 0:
         # Add external references not in description
-        description = add_external_references_not_in_descr(description, reference_list, next_reference_number, obj['relationship'], citations_from_descr)
+        description = add_external_references_not_in_descr(description, references, obj['relationship'], citations_from_descr)
 
-    description = replace_html_chars(markdown.markdown(description))
+    description = replace_html_chars(markdownrenderer.render(description))
+    description = filter_urls(description)
 
     return description
 
-def update_reference_list(reference_list, obj):
-    """Given a reference list and an object, update the reference list
-       with the external references found in the object
-    """
-
-    if obj.get('external_references'):
-
-        # Add external reference to reference list if not found
-        for ext_ref in obj['external_references']:
-
-            # Only add if reference has source name and a description
-            if ext_ref.get('source_name') and ext_ref.get("description"):
-
-                # Do not add if to reference list if citation is in description 
-                if "(Citation:" in ext_ref['description']:
-                    continue
-
-                in_list = find_in_reference_list(reference_list, ext_ref['source_name'])
-
-                if not in_list:
-                    new_ref = {}
-
-                    new_ref['description'] = ext_ref["description"]
-                    if ext_ref.get('url'):
-                        new_ref['url'] = ext_ref['url']
-                    new_ref['sname'] = ext_ref['source_name']
-                    new_ref['number'] = None
-
-                    reference_list.append(new_ref)
-    
-    return reference_list
-
-def sort_reference_list(reference_list):
-    """Given a reference_list, sort it by number"""
-
-    used_reference_list = []
-    # Remove unused references from list
-    for reference in reference_list:
-        if reference.get('number'):
-            used_reference_list.append(reference)
-        
-    return sorted(used_reference_list, key=lambda k: k['number'])
-
 def remove_html_paragraph(description):
     """Given a description, remove <p> tags from the beginning and end"""
 
@@ -259,7 +190,7 @@ def remove_html_paragraph(description):
         return description[3:-4]
     return description
 
-def get_alias_data(alias_list, ext_refs, reference_list, next_reference_number):
+def get_alias_data(alias_list, ext_refs, references):
     """This function generates the Alias Description section for the pages"""
 
     if not alias_list:
@@ -280,9 +211,9 @@ def get_alias_data(alias_list, ext_refs, reference_list, next_reference_number):
                 citations_from_descr = get_citations_from_descr(ext['description'])
                 row = {}
                 row['name'] = alias
-                row['descr'] = markdown.markdown(ext['description'])
+                row['descr'] = markdownrenderer.render(ext['description'])
                 row['descr'] = filter_urls(row['descr'])
-                row['descr'] = get_descr_reference_sect(citations_from_descr, reference_list, next_reference_number, row['descr'])
+                row['descr'] = get_descr_reference_sect(citations_from_descr, references, row['descr'])
                 row['descr'] = remove_html_paragraph(row['descr'])
                 
                 alias_data.append(row)
@@ -320,9 +251,9 @@ def get_technique_table_data(tactic, techniques_list):
             row['descr'] = remove_citations(tech['description'], tech['external_references'])
 
             if row['descr'].split("\n")[0] == '### Windows':
-                row['descr'] = markdown.markdown(row['descr'].split("\n")[2])
+                row['descr'] = markdownrenderer.render(row['descr'].split("\n")[2])
             else:
-                row['descr'] = markdown.markdown(row['descr'].split("\n")[0])
+                row['descr'] = markdownrenderer.render(row['descr'].split("\n")[0])
 
             row['descr'] = filter_urls(row['descr'])
             row['descr'] = remove_html_paragraph(row['descr'])
@@ -346,7 +277,7 @@ def get_technique_table_data(tactic, techniques_list):
                     sub_data['descr'] = remove_citations(subtechnique['object']['description'], subtechnique['object']['external_references'])
                     # Replace html characters from first paragraph
                     sub_data['descr'] = replace_html_chars(sub_data['descr'].split("\n")[0])
-                    sub_data['descr'] = markdown.markdown(sub_data['descr'])
+                    sub_data['descr'] = markdownrenderer.render(sub_data['descr'])
                     sub_data['descr'] = filter_urls(sub_data['descr'])
                     sub_data['descr'] = remove_html_paragraph(sub_data['descr'])
                     row['subtechniques'].append(sub_data)
@@ -369,10 +300,7 @@ def remove_citations(descr, citations):
        with a link leading to the resource
     """
 
-    for citation in citations:
-        descr = descr.replace("(Citation: " + citation['source_name'] + ")","")
-
-    return descr
+    return citationrewriter.strip_citations(descr, [citation['source_name'] for citation in citations])
 
 def get_side_nav_domains_data(side_nav_title, elements_list):
     """Responsible for generating the links that are located on the
@@ -416,6 +344,14 @@ def get_side_nav_domains_data(side_nav_title, elements_list):
         "children": elements_data
     }  
 
+def get_side_menu_element_id(*parts):
+    """Given the parts that identify an element of a side menu, return its
+       id. The same parts always give the same id, so side menus are the
+       same from one build to the next
+    """
+
+    return uuid.uuid5(uuid.NAMESPACE_URL, "/".join(parts)).hex
+
 def get_side_nav_domains_mobile_view_data(side_nav_title, elements_list, amount_per_row):
     """ Given a title, an elements list and the amount of elements per row,
         get the data for the side navigation on a mobile view.
@@ -426,7 +362,7 @@ def get_side_nav_domains_mobile_view_data(side_nav_title, elements_list, amount_
         
         return {
             "name": element['name'],
-            "id": uuid.uuid4().hex,
+            "id": get_side_menu_element_id(side_nav_title, attack_id),
             "path": "/{}/{}/".format(side_nav_title, attack_id),
             "children": []
         }
@@ -455,14 +391,14 @@ def get_side_nav_domains_mobile_view_data(side_nav_title, elements_list, amount_
         
         return domain_data
     
-    def get_category_list():
+    def get_category_list(domain):
         """ Get an empty category list """
 
         caterogories_content = []
         for cat in categories:
             pane = {
                 "name" : cat,
-                "id" : uuid.uuid4().hex,
+                "id" : get_side_menu_element_id(side_nav_title, domain, cat),
                 "path" : None,
                 "children" : []
             }
@@ -483,7 +419,7 @@ def get_side_nav_domains_mobile_view_data(side_nav_title, elements_list, amount_
 
         if elements_list[domain]:
 
-            caterogy_list = get_category_list()
+            caterogy_list = get_category_list(domain)
 
             # Get alias for domain
             domain_alias = get_domain_alias(domain.split("-")[0])
@@ -573,7 +509,7 @@ def get_side_menu_mobile_view_data(side_nav_title, path_prefix, elements_list, a
     for cat in categories:
         pane = {
             "name" : cat,
-            "id" : uuid.uuid4().hex,
+            "id" : get_side_menu_element_id(side_nav_title, path_prefix, cat),
             "path" : None,
             "children" : []
         }
@@ -586,7 +522,7 @@ def get_side_menu_mobile_view_data(side_nav_title, path_prefix, elements_list, a
         if attack_id:
             child = {
                 "name": element['name'],
-                "id": uuid.uuid4().hex,
+                "id": get_side_menu_element_id(side_nav_title, path_prefix, attack_id),
                 "path": path_prefix + attack_id + "/",
                 "children": []
             }
@@ -653,7 +589,14 @@ def redirection_subtechnique(sub_tid):
     return get_parent_technique_id(sub_tid) + "/" + get_sub_technique_id(sub_tid)
 
 def get_parent_technique_id(sub_tid):
-    """Given a sub-technique id, return parent"""
+    """Given a sub-technique id, return parent. Sub-techniques that are not
+       in the ATT&CK ID index, such as revoked ones, fall back to the
+       technique part of their id
+    """
+
+    parent_id = get_parent_technique_attack_id(sub_tid)
+    if parent_id:
+        return parent_id
 
     return sub_tid.split(".")[0]
 
@@ -665,14 +608,13 @@ def get_sub_technique_id(sub_tid):
 def get_technique_name(tid):
     """ Given a technique id, return the technique name """
 
-    for technique in config.technique_list:
-        attack_id = get_attack_id(technique)
-        if attack_id == tid:
-            return technique['name']
+    stix_id = config.attack_id_index['attack_to_stix'].get(tid)
+    if stix_id and stix_id.startswith('attack-pattern--'):
+        return config.attack_id_index['name'][tid]
     
     return config.NOT_FOUND
 
-def technique_used_helper(technique_list, technique, reference_list, next_reference_number):
+def technique_used_helper(technique_list, technique, references):
     """ Add technique to technique list and make distinction between techniques
         subtechniques
     """
@@ -692,13 +634,13 @@ def technique_used_helper(technique_list, technique, reference_list, next_refere
                     technique_list[parent_id] = {}
                     technique_list[parent_id] = parent_technique_used_helper(parent_id)
 
-                technique_list[parent_id]['subtechniques'].append(get_technique_data_helper(attack_id, technique, reference_list, next_reference_number))
+                technique_list[parent_id]['subtechniques'].append(get_technique_data_helper(attack_id, technique, references))
             
             # Attack id is regular technique
             else:
                 # Add technique to list
                 technique_list[attack_id] = {}
-                technique_list[attack_id] = get_technique_data_helper(attack_id, technique, reference_list, next_reference_number)
+                technique_list[attack_id] = get_technique_data_helper(attack_id, technique, references)
 
         # Check if parent ID was added by sub-technique
         # parent ID will not have description
@@ -706,19 +648,19 @@ def technique_used_helper(technique_list, technique, reference_list, next_refere
             # Check if it has external references
             if technique['relationship'].get('description'):
                 # Get filtered description
-                technique_list[attack_id]['descr'] = get_filtered_description(reference_list, next_reference_number, technique)
+                technique_list[attack_id]['descr'] = get_filtered_description(references, technique)
     
     return technique_list
 
 
-def get_technique_data_helper(attack_id, technique, reference_list, next_reference_number):
+def get_technique_data_helper(attack_id, technique, references):
     """ Given an attack id, technique object and reference information, 
         return dictionary with technique data
     """
 
     technique_data = {}
 
-    technique_data['domain'] = config.technique_to_domain[attack_id].split('-')[0]
+    technique_data['domain'] = get_attack_id_domain(attack_id).split('-')[0]
 
     if is_sub_tid(attack_id):
         technique_data['id'] = get_sub_technique_id(attack_id)
@@ -730,7 +672,7 @@ def get_technique_data_helper(attack_id, technique, reference_list, next_referen
     # Check if it has external references
     if technique['relationship'].get('description'):
         # Get filtered description
-        technique_data['descr'] = get_filtered_description(reference_list, next_reference_number, technique)
+        technique_data['descr'] = get_filtered_description(references, technique)
     
     technique_data['subtechniques'] = []
     
@@ -743,31 +685,13 @@ def parent_technique_used_helper(parent_id):
 
     parent_data = {}
 
-    parent_data['domain'] = config.technique_to_domain[parent_id].split('-')[0]
+    parent_data['domain'] = get_attack_id_domain(parent_id).split('-')[0]
     parent_data['id'] = parent_id
     parent_data['name'] = get_technique_name(parent_id)
     parent_data['subtechniques'] = []
 
     return parent_data
 
-def find_num_of_ref_in_list(reference_list, ref_sname):
-    """Given a reference list and a reference, search for reference
-       in list. Return number if found, else return NOT_FOUND
-    """
-
-    for reference in reference_list:
-        if reference['sname'] == ref_sname:
-            return reference['number']
-    return config.NOT_FOUND
-
-def find_in_reference_list(reference_list, source_name):
-    """Check if it is already in reference list"""
-
-    for reference in reference_list:
-        if reference['sname'] == source_name:
-            return True
-    return False
-
 def get_domain_alias(domain):
     """ Given a domain name, return its alias.
         If not found return the same domain
@@ -779,6 +703,33 @@ def get_domain_alias(domain):
     
     return domain
 
+def get_parent_technique_attack_id(sub_tid):
+    """ Given a sub-technique ATT&CK ID, return the ATT&CK ID of its
+        parent technique from the subtechnique-of relationships
+    """
+
+    return config.attack_id_index['parent'].get(sub_tid)
+
+def get_object_domains(stix_id):
+    """ Given a stix id of a technique, software, group or mitigation,
+        return the set of domains that contain it
+    """
+
+    return config.object_domains.get(stix_id, frozenset())
+
+def get_attack_id_domain(attack_id):
+    """ Given the ATT&CK ID of a technique, software, group or mitigation,
+        return the last domain that contains the object. Raise a KeyError
+        if no object has the ATT&CK ID
+    """
+
+    domains = get_object_domains(config.attack_id_index['attack_to_stix'][attack_id])
+    for domain in reversed(config.domains):
+        if domain in domains:
+            return domain
+
+    raise KeyError(attack_id)
+
 def replace_html_chars(to_be_replaced):
     return to_be_replaced.replace("\n", "")\
                          .replace("{", "{{")\
@@ -786,16 +737,6 @@ def replace_html_chars(to_be_replaced):
                          .replace("”","\"")\
                          .replace("“","\"")
 
-def get_index_of_ref(reference_list, ref_sname):
-    """Given a reference source name, return reference list index if found"""
-
-    index = 0
-    for reference in reference_list:
-        if reference['sname'] == ref_sname:
-            return index
-        index += 1
-    return config.NOT_FOUND
-
 def get_navigator_layers(name, attack_id, obj_type, version, techniques_used):
     """Given a list of techniques used, return the navigator json objects
        for enterprise and mobile"""
@@ -938,22 +879,52 @@ def add_platform_path(platforms):
 
     return platforms
 
-def progress_bar(name, time = None):
-    """Given a name and a time, display current progress"""
+# Layout of the lines of progress_bar and progress_message
+progress_bar_hyphens = 40
+progress_bar_name_space = 22
 
-    number_of_hyphens = 40
-    name_space = 22
+def progress_bar(name, time = None, memory = None):
+    """Given a name and a time, display current progress. If memory (in MB)
+       is given, display it next to the time
+    """
 
-    hyphens = '-' * number_of_hyphens
+    hyphens = '-' * progress_bar_hyphens
 
-    if time:
+    if time and memory is not None:
+        sys.stdout.write(f"\r{name: <{progress_bar_name_space}} : {hyphens} {time:.2f}s {memory:.2f}MB      \n")
+    elif time:
         # spaces here because we need to overwrite the word "running"
-        sys.stdout.write(f"\r{name: <{name_space}} : {hyphens} {time:.2f}s      \n")
+        sys.stdout.write(f"\r{name: <{progress_bar_name_space}} : {hyphens} {time:.2f}s      \n")
     else:
-        sys.stdout.write(f"\r{name: <{name_space}} : {hyphens} Running...")
+        sys.stdout.write(f"\r{name: <{progress_bar_name_space}} : {hyphens} Running...")
 
     sys.stdout.flush()
 
+def progress_message(name, message):
+    """Given a name and a message, display the message on a line laid out
+       like the lines of progress_bar
+    """
+
+    hyphens = '-' * progress_bar_hyphens
+
+    sys.stdout.write(f"{name: <{progress_bar_name_space}} : {hyphens} {message}\n")
+    sys.stdout.flush()
+
+def get_peak_memory_usage():
+    """Return the peak resident memory of the build process in MB,
+       None if it can not be measured on this platform
+    """
+
+    if not resource:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+    if sys.platform == "darwin":
+        return max_rss / (1024 * 1024)
+    return max_rss / 1024
+
 def filter_techniques_by_platform(tech_list, platforms):
     """Given a technique list and a platforms list, filter out techniques
        that are not part of the platforms"""
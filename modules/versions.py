@@ -7,6 +7,8 @@ import stat
 from datetime import datetime
 import re
 from . import config
+from . import outputwriter
+from . import postbuild
 
 # Error handler for windows by:
 # https://stackoverflow.com/questions/2656322/shutil-rmtree-fails-on-windows-with-access-is-denied
@@ -78,8 +80,7 @@ def deploy():
     build_markdown(versions)
     
     # write robots.txt to disallow crawlers
-    with open(os.path.join(config.web_directory, "robots.txt"), "w", encoding='utf8') as robots:
-        robots.write(f"User-agent: *\nDisallow: {config.subdirectory}/previous/\nDisallow: {config.subdirectory}/{prev_versions_path}/")
+    outputwriter.write_file(os.path.join(config.web_directory, "robots.txt"), f"User-agent: *\nDisallow: {config.subdirectory}/previous/\nDisallow: {config.subdirectory}/{prev_versions_path}/")
 
 def deploy_current_version():
     """build a permalink of the current version"""
@@ -104,6 +105,50 @@ def deploy_current_version():
     archive(version, is_current=True)
 
 
+def get_current_version_search_path():
+    """Return the path of the search index of the current version permalink"""
+
+    with open("data/versions.json", "r") as f:
+        version = json.load(f)["current"]
+
+    search_path = os.path.relpath(os.path.join(config.web_directory, config.search_directory), config.parent_web_directory)
+
+    return os.path.join(prev_versions_deploy_folder, versionPath(version), search_path)
+
+def remove_current_version_search_index():
+    """Remove the search index copied with the current version, it is copied
+       again once the search index is built
+    """
+
+    search_path = get_current_version_search_path()
+    if os.path.isdir(search_path):
+        shutil.rmtree(search_path, onerror=onerror)
+
+def deploy_current_version_search_index(results):
+    """Copy the search index built by the post-build pass into the current
+       version permalink
+    """
+
+    search_path = get_current_version_search_path()
+    shutil.copytree(os.path.join(config.web_directory, config.search_directory), search_path)
+
+    for filename in os.listdir(search_path):
+        postbuild.add_file(os.path.join(search_path, filename))
+
+def get_search_index_visitor():
+    """Return the post-build visitor that adds the search index to the
+       current version permalink. The permalink is deployed before the search
+       index is built
+    """
+
+    return {
+        "name": "Version Search Index",
+        "accepts": lambda path: False,
+        "visit": None,
+        "finish": deploy_current_version_search_index,
+        "start": remove_current_version_search_index
+    }
+
 def deploy_previous_version(version, repo):
     """build a version of the site to /prev_versions_path. version is a version from versions.json, repo is a reference to the attack-website Repo object"""
     # check out the commit for that version
@@ -284,7 +329,6 @@ def build_markdown(versions):
     
     # build previous-versions page markdown
     subs = config.versions_md + json.dumps(versions_data)
-    with open(os.path.join(config.versions_markdown_path, "versions.md"), "w", encoding='utf8') as md_file:
-        md_file.write(subs)
+    outputwriter.write_file(os.path.join(config.versions_markdown_path, "versions.md"), subs)
 
 
@@ -5,6 +5,8 @@ import json
 import uuid
 import sys
 import os
+from jinja2 import FileSystemBytecodeCache, contextfilter
+from modules import siteurl
 
 # import plugins
 PLUGIN_PATHS = ['plugins']
@@ -33,6 +35,23 @@ DEFAULT_PAGINATION = False
 STATIC_PATHS = ['docs']
 ARTICLE_PATHS = ['pages/updates']
 
+# Keep the content read from the markdown files between builds, only
+# files with a new mtime are read again
+CACHE_CONTENT = True
+LOAD_CONTENT_CACHE = True
+CACHE_PATH = os.path.join('cache', 'pelican')
+
+# Keep the compiled theme templates between builds
+jinja_bytecode_cache_path = os.path.join('cache', 'jinja')
+os.makedirs(jinja_bytecode_cache_path, exist_ok=True)
+
+JINJA_ENVIRONMENT = {
+    'trim_blocks': True,
+    'lstrip_blocks': True,
+    'extensions': [],
+    'bytecode_cache': FileSystemBytecodeCache(jinja_bytecode_cache_path)
+}
+
 # Uncomment following line if you want document-relative URLs when developing
 RELATIVE_URLS = False
 
@@ -71,9 +90,41 @@ def permalink(link):
     return current_version_permalink + "/" + link
 
 
+# prefix a site absolute link with SITEURL, e.g /x/y => /subdirectory/x/y
+# when the site is hosted in a subdirectory
+@contextfilter
+def url(context, link):
+    return siteurl.url(link, context.get('SITEURL', ''))
+
+
+# prefix the site absolute links of html with SITEURL
+@contextfilter
+def prefix_links(context, html):
+    return siteurl.prefix_links(html, context.get('SITEURL', ''))
+
+
+# side navigation trees shared by the pages of a section, written by the
+# ATT&CK build
+side_nav_directory = os.path.join('content', 'nav')
+side_navs = {}
+def side_nav(menu):
+    """given the key of a side navigation, return its tree. Trees embedded in
+       the page data are returned as is
+    """
+
+    if not isinstance(menu, str):
+        return menu
+    if menu not in side_navs:
+        with open(os.path.join(side_nav_directory, menu + ".json"), "r", encoding='utf8') as f:
+            side_navs[menu] = json.load(f)
+    return side_navs[menu]
+
 JINJA_FILTERS = {
     'from_json':json.loads,
     'flatten_tree': flatten_tree,
     'clean_path': clean_path,
-    'permalink': permalink
+    'permalink': permalink,
+    'url': url,
+    'prefix_links': prefix_links,
+    'side_nav': side_nav
 }
\ No newline at end of file
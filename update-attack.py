@@ -136,48 +136,49 @@ def update(args):
         if 'redirects' in args.build:
             generate.redirects_md_gen()
 
-    # Set website path with subdirectory
-    if args.subdirectory:
-        config.set_subdirectory(args.subdirectory)
+    # Report how much Markdown rendering was reused
+    if args.build:
+        generate.markdown_cache_stats()
+        generate.save_incremental_state()
 
     # Deploy versions
     if args.build:
         if 'versions' in args.build:
     	    generate.previous_versions_gen()
 
+    # Report how many generated files were left unchanged
+    if args.build:
+        generate.output_writer_stats()
+
     # Pelican update
     if args.build:
         generate.pelican_content()
         # Remove unwanted files created by pelican
         generate.remove_unwanted_output()
 
-    # Generate search index
-    # note: this should come basically last in the build process
-    # because it parses the content of the output directory to build the index
-    if args.build:
-        if 'search' in args.build:
-    	    generate.generate_search_index()
-    
     # Preserve current version
     if args.build:
         if 'versions' in args.build:
             generate.deploy_current_version()
 
-    # Replace output directory links with subdirectory
-    if args.subdirectory:
-        generate.subdirectory_gen()
+    # Generate search index, replace the links of archived versions with
+    # subdirectory and gather the data of the tests
+    # note: this should come basically last in the build process
+    # because it parses the content of the output directory
+    # The time the tests spent in the pass counts as test time
+    post_build_test_time = generate.post_build_gen(args)
 
     if args.build:
         build_end = time.time()
-        build_time = build_end - update_start
+        build_time = build_end - update_start - post_build_test_time
     
     # Tests
-    if (args.build and (sorted(args.build) == sorted(config.build_defaults))) or args.tests:
+    if tests.are_enabled(args):
         # Start time of tests update
         test_start = time.time()
         exit_codes = tests.run_tests(args)
         test_end = time.time()
-        test_time = test_end - test_start
+        test_time = test_end - test_start + post_build_test_time
     
     if args.build and ((sorted(args.build) == sorted(config.build_defaults)) or args.tests):
         util.progress_bar("TOTAL Build Time", build_time)
@@ -214,6 +215,8 @@ def get_parsed_args():
                         help='Pull down the current STIX data from the MITRE/CTI GitHub respository')
     parser.add_argument('--no-stix-link-replacement', action='store_true',
                         help="If this flag is absent, links to attack.mitre.org/[page] in the STIX data will be replaced with /[page]. Add this flag to preserve links to attack.mitre.org.")
+    parser.add_argument('--no-stix-cache', action='store_true',
+                        help="Parse the STIX bundles without reading or writing the cache of parsed bundles in {}.".format(config.stix_cache_directory))
     
     parser.add_argument('--build', '-b', nargs='*',
                         type=str,
@@ -240,6 +243,18 @@ def get_parsed_args():
     
     parser.add_argument('--proxy', help="set proxy")
 
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only generate the pages of objects that changed since the previous incremental build, state is kept in {}. Every page is generated when combined with --clean.".format(config.incremental_cache_directory))
+
+    parser.add_argument('--jobs', '-j', type=int, default=1,
+                        help="Number of processes used to generate the group, software, technique and mitigation pages and the pass over the output that builds the search index and checks links. Defaults to 1.")
+
+    parser.add_argument('--compress-search', action='store_true',
+                        help="Also write gzip compressed copies (.gz) of the search index shards, for web servers that serve precompressed files.")
+
+    parser.add_argument('--native-render', action='store_true',
+                        help="Render the group, software, technique, mitigation, tactic and matrix pages straight from their data with the theme templates instead of writing markdown for Pelican. Pelican only builds the resources and updates pages.")
+
     parser.add_argument('--subdirectory', 
                         help="If you intend to host the site from a sub-directory, specify the directory using this flag.",
                         type=validate_subdirectory_string)